@@ -0,0 +1,300 @@
+"""Benchmark of the DataLoader, the ExcelGeoDataFrameLoader and the matchers on
+synthetic data sets, without Google API key nor CAL FIRE downloads.
+
+Run from the repository root, so the matchers of config/default.yaml are benchmarked:
+python -m disaster_damage_assessment_lookup.benchmark.benchmark --scale 1000 \
+    --scale 100000 --output benchmark.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+from importlib.metadata import PackageNotFoundError, version
+from typing import Any, Dict, List, Optional
+
+from disaster_damage_assessment_lookup.benchmark.fake_geocoder import FakeGeocoder
+from disaster_damage_assessment_lookup.benchmark.synthetic_data import (
+    DINS_FILE_NAME,
+    GEOCODE_RESPONSES_FILE_NAME,
+    INTAKE_FILE_NAME,
+    PERIMETERS_FILE_NAME,
+    generate_dataset,
+    write_dataset,
+)
+from disaster_damage_assessment_lookup.data_loader.data_loader import (
+    DataLoader,
+    get_labels,
+)
+from disaster_damage_assessment_lookup.data_loader.schema.data_loader import (
+    DataLoaderConfig,
+)
+from disaster_damage_assessment_lookup.matcher.column_usage import get_required_columns
+from disaster_damage_assessment_lookup.matcher.matcher import Matcher
+from disaster_damage_assessment_lookup.matcher.schema.matcher import (
+    MatcherConfigWrapper,
+)
+from disaster_damage_assessment_lookup.result_writer.result_writer import ResultWriter
+from disaster_damage_assessment_lookup.result_writer.schema.result_writer import (
+    ResultWriterConfig,
+)
+from disaster_damage_assessment_lookup.utils import metrics
+from disaster_damage_assessment_lookup.utils.config_loader import load_himl_config
+from disaster_damage_assessment_lookup.utils.metrics import MetricsRecorder
+
+logger = logging.getLogger(__name__)
+
+# packages whose version affects the results
+BENCHMARKED_PACKAGES = [
+    "pandas",
+    "geopandas",
+    "shapely",
+    "pyogrio",
+    "pyproj",
+    "numpy",
+    "pyarrow",
+    "openpyxl",
+    "xlsxwriter",
+]
+
+
+def get_environment() -> Dict[str, Any]:
+    """Returns the description of the machine and package versions of the run."""
+    packages = {}
+    for package in BENCHMARKED_PACKAGES:
+        try:
+            packages[package] = version(package)
+        except PackageNotFoundError:
+            packages[package] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": packages,
+    }
+
+
+def get_benchmark_config(
+    config: Dict[str, Any], args: argparse.Namespace, work_path: str
+) -> Dict[str, Any]:
+    """Returns the configuration pointing the data sources of config/default.yaml to
+    the synthetic data set and the outputs to the work_path."""
+    input_file_path = os.path.join(work_path, "input_data")
+    output_file_path = os.path.join(work_path, "output_data")
+    config = json.loads(json.dumps(config))
+    data_loader = config["data_loader"]
+    data_loader["input_file_path"] = input_file_path
+    data_loader["output_file_path"] = output_file_path
+
+    excel_configs = data_loader.get("excel") or {}
+    if len(excel_configs) != 1:
+        raise ValueError("The benchmark needs exactly one Excel file configured")
+    excel_config = next(iter(excel_configs.values()))
+    excel_config["file_name"] = INTAKE_FILE_NAME
+    for label, file_name in (
+        (args.dins_label, DINS_FILE_NAME),
+        (args.perimeters_label, PERIMETERS_FILE_NAME),
+    ):
+        if label not in (data_loader.get("geojson") or {}):
+            raise ValueError(f"geojson label '{label}' is not configured")
+        data_loader["geojson"][label]["file_name"] = file_name
+
+    geodataframe_loader = data_loader["geodataframe_loader"]
+    geodataframe_loader["google_server_api_key"] = "benchmark"
+    geodataframe_loader["min_delay_between_requests_in_seconds"] = 0
+    if args.geocoder_type:
+        geodataframe_loader["geocoder_type"] = args.geocoder_type
+    if geodataframe_loader.get("geocode_cache"):
+        geodataframe_loader["geocode_cache"]["file_path"] = os.path.join(
+            output_file_path, "geocode_cache.sqlite"
+        )
+    if geodataframe_loader.get("geocode_checkpoint"):
+        # Never read, append to or remove the checkpoint of a real run
+        geodataframe_loader["geocode_checkpoint"]["file_path"] = os.path.join(
+            output_file_path, "geocode_checkpoint"
+        )
+
+    options = config.setdefault("matcher_options", {})
+    if options.get("spatial_index_path"):
+        options["spatial_index_path"] = os.path.join(output_file_path, "spatial_index")
+    return config
+
+
+def run_scale(
+    config: Dict[str, Any], args: argparse.Namespace, intake_row_count: int
+) -> Dict[str, Any]:
+    """Benchmark every stage on a synthetic data set of the given number of intake
+    rows."""
+    work_path = os.path.join(args.work_path, str(intake_row_count))
+    shutil.rmtree(work_path, ignore_errors=True)
+    config = get_benchmark_config(config, args, work_path)
+    dins_row_count = int(intake_row_count * args.dins_ratio)
+    recorder = MetricsRecorder(enabled=True)
+    previous_recorder = metrics.set_recorder(recorder)
+    try:
+        geocoder_stats = run_stages(config, args, intake_row_count, dins_row_count)
+    finally:
+        metrics.set_recorder(previous_recorder)
+        recorder.close()
+
+    if not args.keep_data:
+        shutil.rmtree(work_path, ignore_errors=True)
+    run_metrics = recorder.to_dict()
+    return {
+        "intake_rows": intake_row_count,
+        "dins_rows": dins_row_count,
+        "perimeters": args.perimeters,
+        "geocoder": geocoder_stats,
+        "peak_rss_mb": run_metrics["peak_rss_mb"],
+        "counters": run_metrics["counters"],
+        "stages": run_metrics["stages"],
+    }
+
+
+def run_stages(
+    config: Dict[str, Any],
+    args: argparse.Namespace,
+    intake_row_count: int,
+    dins_row_count: int,
+) -> Dict[str, int]:
+    """Run every benchmarked stage with the recorder of the current run.
+
+    Returns:
+        Statistics of the fake geocoder.
+    """
+    data_loader_config = config["data_loader"]
+    excel_config = next(iter(data_loader_config["excel"].values()))
+    with metrics.stage("generate", rows_in=intake_row_count + dins_row_count):
+        dataset = generate_dataset(
+            intake_row_count=intake_row_count,
+            dins_row_count=dins_row_count,
+            perimeter_count=args.perimeters,
+            perimeter_vertex_count=args.perimeter_vertices,
+            seed=args.seed,
+        )
+        file_paths = write_dataset(
+            dataset, data_loader_config["input_file_path"], excel_config["sheet_name"]
+        )
+        del dataset
+
+    geocoder = FakeGeocoder.from_file(
+        file_paths[GEOCODE_RESPONSES_FILE_NAME],
+        latency_in_seconds=args.latency,
+        latency_jitter_in_seconds=args.latency_jitter,
+        failure_rate=args.failure_rate,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed,
+    )
+    # pylint: disable=E1101 # Suppress no member error for dynamic member
+    matcher_config = MatcherConfigWrapper.Schema().load(
+        {"matcher": config["matcher"], "options": config.get("matcher_options", {})}
+    )
+    # pylint: disable=E1101 # Suppress no member error for dynamic member
+    loaded_data_loader_config = DataLoaderConfig.Schema().load(data_loader_config)
+    data_loader = DataLoader(
+        config=loaded_data_loader_config,
+        geolocator=geocoder,
+        required_columns=get_required_columns(
+            matcher_config.matcher, get_labels(loaded_data_loader_config)
+        ),
+    )
+    # The first load geocodes and parses everything, the second one reads the caches
+    for stage_name in ("data_loader_cold", "data_loader_cached"):
+        with metrics.stage(stage_name) as stage:
+            gdf_databases = data_loader.load()
+            stage.rows_out = sum(len(gdf) for gdf in gdf_databases.values())
+
+    # pylint: disable=E1101 # Suppress no member error for dynamic member
+    result_writer_config = ResultWriterConfig.Schema().load(
+        {
+            **config.get("result_writer", {}),
+            "output_file_path": data_loader_config["output_file_path"],
+        }
+    )
+    # Matcher.run records a matcher.<name> stage per matcher, running them with the
+    # max_workers threads and process_workers tiles of the matcher_options
+    result_writer = ResultWriter(config=result_writer_config)
+    try:
+        with metrics.stage("matcher", rows_in=stage.rows_out):
+            Matcher(config=matcher_config).run(gdf_databases, result_writer)
+    finally:
+        # Waits for the results still queued once the matchers are done
+        with metrics.stage("result_writer"):
+            result_writer.close()
+    return geocoder.get_stats()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line arguments of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scale",
+        type=int,
+        action="append",
+        help="Number of intake rows, repeat to benchmark several scales. Default 1000.",
+    )
+    parser.add_argument(
+        "--dins-ratio",
+        type=float,
+        default=2.0,
+        help="Number of DINS points per intake row. Default 2.",
+    )
+    parser.add_argument("--perimeters", type=int, default=20)
+    parser.add_argument("--perimeter-vertices", type=int, default=1000)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds per geocode request."
+    )
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--geocoder-type",
+        choices=["rate_limiter", "concurrent"],
+        help="Override the geocoder_type of the configuration.",
+    )
+    parser.add_argument("--dins-label", default="postfire_master_data")
+    parser.add_argument("--perimeters-label", default="fire_perimeters")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-path", default="benchmark_data")
+    parser.add_argument(
+        "--keep-data",
+        action="store_true",
+        help="Keep the synthetic data and outputs of each scale.",
+    )
+    parser.add_argument("--output", help="JSON file to write. Default to stdout.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for the benchmark."""
+    logging.basicConfig()
+    logging.getLogger().setLevel(logging.INFO)
+    args = parse_args(argv)
+    # The fake geocoder never calls the API, the key only has to be set for the config
+    os.environ.setdefault("GOOGLE_SERVER_API_KEY", "benchmark")
+    config = load_himl_config(print_result=False)
+
+    report = {
+        "environment": get_environment(),
+        "parameters": {
+            key: value for key, value in vars(args).items() if key != "output"
+        },
+        "runs": [],
+    }
+    for intake_row_count in args.scale or [1000]:
+        logger.info(f"Benchmarking {intake_row_count} intake rows")
+        report["runs"].append(run_scale(config, args, intake_row_count))
+
+    content = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(content)
+        logger.info(f"Saved benchmark report to {args.output}")
+    else:
+        print(content)
+
+
+if __name__ == "__main__":
+    main()
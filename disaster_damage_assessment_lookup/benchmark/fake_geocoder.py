@@ -0,0 +1,101 @@
+"""Local stand-in for the GoogleV3 geocoder, answering from precomputed responses with
+an injectable latency and failure rate."""
+
+import json
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from geopy.exc import GeocoderQuotaExceeded, GeocoderUnavailable
+from geopy.location import Location
+
+
+class FakeGeocoder:
+    """Geocoder with the same geocode method as GoogleV3, answering from the responses
+    generated along with the synthetic data set instead of calling the API.
+
+    Each request waits latency_in_seconds plus a random jitter, then fails with
+    GeocoderUnavailable with probability failure_rate, or GeocoderQuotaExceeded like an
+    OVER_QUERY_LIMIT status with probability throttle_rate. The draws come from a
+    seeded generator, so a single threaded run fails on the same requests every time.
+    """
+
+    def __init__(
+        self,
+        responses: Dict[str, Optional[dict]],
+        latency_in_seconds: float = 0.0,
+        latency_jitter_in_seconds: float = 0.0,
+        failure_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            responses: Raw GoogleV3 response for each address, None when the address
+                is not found. Unknown addresses are not found either.
+            latency_in_seconds: Time each request takes.
+            latency_jitter_in_seconds: Maximum random time added to each request.
+            failure_rate: Probability of a request failing with GeocoderUnavailable.
+            throttle_rate: Probability of a request failing with
+                GeocoderQuotaExceeded.
+            seed: Seed of the random generator.
+        """
+        if failure_rate + throttle_rate > 1:
+            raise ValueError("failure_rate and throttle_rate must not add up over 1")
+        self.responses = responses
+        self.latency_in_seconds = latency_in_seconds
+        self.latency_jitter_in_seconds = latency_jitter_in_seconds
+        self.failure_rate = failure_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.failure_count = 0
+        self.throttle_count = 0
+
+    @classmethod
+    def from_file(cls, file_path: str, **kwargs) -> "FakeGeocoder":
+        """Create the geocoder from the responses saved with the synthetic data set."""
+        with open(file_path, encoding="utf-8") as file:
+            return cls(json.load(file), **kwargs)
+
+    def geocode(self, query: str, **kwargs) -> Optional[Location]:
+        """Geocode the address like GoogleV3.geocode with exactly_one.
+
+        Returns:
+            geopy Location with the raw GoogleV3 response, or None if not found.
+        """
+        with self.lock:
+            self.request_count += 1
+            draw = self.random.random()
+            latency = self.latency_in_seconds + self.random.uniform(
+                0, self.latency_jitter_in_seconds
+            )
+            if draw < self.failure_rate:
+                self.failure_count += 1
+            elif draw < self.failure_rate + self.throttle_rate:
+                self.throttle_count += 1
+        if latency > 0:
+            time.sleep(latency)
+        if draw < self.failure_rate:
+            raise GeocoderUnavailable("Simulated geocoder failure")
+        if draw < self.failure_rate + self.throttle_rate:
+            raise GeocoderQuotaExceeded("Simulated OVER_QUERY_LIMIT")
+
+        raw = self.responses.get(query)
+        if raw is None:
+            return None
+        location = raw["geometry"]["location"]
+        return Location(
+            raw["formatted_address"], (location["lat"], location["lng"]), raw
+        )
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the number of requests, failures and throttled requests."""
+        with self.lock:
+            return {
+                "requests": self.request_count,
+                "failures": self.failure_count,
+                "throttled": self.throttle_count,
+            }
@@ -0,0 +1,400 @@
+"""Generator of synthetic data sets shaped like the real data sources, i.e. the CAL FIRE
+DINS damage inspection points, the WFIGS fire perimeters and the intake form, along with
+the GoogleV3 response for every address of the intake form."""
+
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy
+import pandas as pd
+import shapely
+from geopandas import GeoDataFrame
+from pandas import DataFrame
+from unidecode import unidecode
+
+from disaster_damage_assessment_lookup.result_writer.result_writer import (
+    open_xlsxwriter_workbook,
+    write_excel_worksheet,
+)
+
+logger = logging.getLogger(__name__)
+
+INTAKE_FILE_NAME = "intake.xlsx"
+DINS_FILE_NAME = "dins.geojson"
+PERIMETERS_FILE_NAME = "perimeters.geojson"
+GEOCODE_RESPONSES_FILE_NAME = "geocode_responses.json"
+
+# meters per degree of latitude
+METERS_PER_DEGREE = 111_320
+
+# incident name, city, zip code, longitude and latitude of the center of the fires
+INCIDENTS = [
+    ("Eaton", "ALTADENA", "91001", -118.13, 34.19),
+    ("PALISADES", "PACIFIC PALISADES", "90272", -118.55, 34.07),
+]
+
+# radius in meters of the perimeters of the fires and of the area of their structures
+PERIMETER_RADIUS_METER = 6_000
+STRUCTURE_RADIUS_METER = 7_000
+
+STREET_NAMES = [
+    "OAK", "PINE", "MAPLE", "CEDAR", "ELM", "WALNUT", "SYCAMORE", "LAKE", "HILL",
+    "PARK", "VISTA", "CANYON", "RIDGE", "SUNSET", "MESA", "VALLEY", "LOMA", "ALTA",
+    "MARIPOSA", "MONTEREY", "SIERRA", "FAIR OAKS", "LINCOLN", "WASHINGTON", "MAIN",
+    "CHAPEA", "VÍA DE LA PAZ", "BOLLINGER", "LAS LOMAS", "EL MEDIO",
+]  # fmt: skip
+STREET_SUFFIXES = ["ST", "AVE", "DR", "RD", "LN", "WAY"]
+STREET_SUFFIX_NAMES = {
+    "ST": "Street",
+    "AVE": "Avenue",
+    "DR": "Drive",
+    "RD": "Road",
+    "LN": "Lane",
+    "WAY": "Way",
+}
+
+STRUCTURE_TYPES = [
+    "Single Family Residence Single Story",
+    "Single Family Residence Multi Story",
+    "Multi Family Residence Multi Story",
+    "Mobile Home Double Wide",
+    "Commercial Building Single Story",
+]
+DAMAGE_LEVELS = [
+    "Destroyed (>50%)",
+    "Major (26-50%)",
+    "Minor (10-25%)",
+    "Affected (1-9%)",
+    "No Damage",
+]
+
+
+@dataclass
+class SyntheticDataset:
+    """Synthetic data sources and the GoogleV3 responses of the intake addresses."""
+
+    intake: DataFrame
+    """Intake form with the columns of the Damage sheet."""
+
+    dins: GeoDataFrame
+    """Damage inspection points with the DINS columns."""
+
+    perimeters: GeoDataFrame
+    """Fire perimeter polygons with the WFIGS columns."""
+
+    geocode_responses: Dict[str, Optional[dict]]
+    """Raw GoogleV3 response of each intake address, None when it is not found."""
+
+
+def offset_coordinates(
+    longitude: float, latitude: float, dx: numpy.ndarray, dy: numpy.ndarray
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Returns the coordinates dx and dy meters east and north of the given point."""
+    return (
+        longitude + dx / (METERS_PER_DEGREE * numpy.cos(numpy.radians(latitude))),
+        latitude + dy / METERS_PER_DEGREE,
+    )
+
+
+def random_disc(
+    rng: numpy.random.Generator, count: int, radius: float
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Returns count offsets in meters uniformly distributed in a disc."""
+    distance = radius * numpy.sqrt(rng.random(count))
+    angle = rng.uniform(0, 2 * numpy.pi, count)
+    return distance * numpy.cos(angle), distance * numpy.sin(angle)
+
+
+def generate_dins(row_count: int, rng: numpy.random.Generator) -> GeoDataFrame:
+    """Generate damage inspection points spread around the fires, each with a unique
+    site address. Street numbers are even, so odd numbers are never in DINS."""
+    positions = numpy.arange(row_count)
+    incident = rng.integers(0, len(INCIDENTS), row_count)
+    streets = [
+        f"{name} {suffix}" for name in STREET_NAMES for suffix in STREET_SUFFIXES
+    ]
+    street = positions % len(streets)
+    number = 100 + 2 * (positions // len(streets))
+
+    dx, dy = random_disc(rng, row_count, STRUCTURE_RADIUS_METER)
+    longitude = numpy.empty(row_count)
+    latitude = numpy.empty(row_count)
+    for position, (_, _, _, center_longitude, center_latitude) in enumerate(INCIDENTS):
+        selected = incident == position
+        longitude[selected], latitude[selected] = offset_coordinates(
+            center_longitude, center_latitude, dx[selected], dy[selected]
+        )
+
+    # DINS spells the street names without accents
+    streets = [unidecode(street) for street in streets]
+    incident_names = numpy.array([name.upper() for name, *_ in INCIDENTS])[incident]
+    site_addresses = [
+        f"{number[i]} {streets[street[i]]}, {INCIDENTS[incident[i]][1]}, "
+        f"CA {INCIDENTS[incident[i]][2]}"
+        for i in range(row_count)
+    ]
+    return GeoDataFrame(
+        {
+            "OBJECTID": positions + 1,
+            "DAMAGE": rng.choice(DAMAGE_LEVELS, row_count),
+            "STREETNUMBER": number.astype(str),
+            "STREETNAME": [streets[i].rsplit(" ", 1)[0] for i in street],
+            "STREETSUFFIX": [streets[i].rsplit(" ", 1)[1] for i in street],
+            "CITY": [INCIDENTS[i][1] for i in incident],
+            "STATE": "CA",
+            "ZIPCODE": [INCIDENTS[i][2] for i in incident],
+            "SITEADDRESS": site_addresses,
+            "STRUCTURETYPE": rng.choice(STRUCTURE_TYPES, row_count),
+            "APN": [
+                f"{5800 + i % 100:04d}-{i % 1000:03d}-{i % 997:03d}" for i in positions
+            ],
+            "INCIDENTNAME": incident_names,
+            "INCIDENTNUM": [f"CALAC-0000{i + 1}" for i in incident],
+            "INCIDENTSTARTDATE": "2025-01-07",
+            "YEARBUILT": rng.integers(1920, 2020, row_count),
+        },
+        geometry=shapely.points(longitude, latitude),
+        crs="EPSG:4326",
+    )
+
+
+def generate_perimeter(
+    rng: numpy.random.Generator,
+    longitude: float,
+    latitude: float,
+    radius: float,
+    vertex_count: int,
+) -> shapely.Polygon:
+    """Generate an irregular, star shaped perimeter polygon around the given point."""
+    angle = numpy.linspace(0, 2 * numpy.pi, vertex_count, endpoint=False)
+    # Smooth noise so the outline looks like a fire front rather than a saw blade
+    noise = numpy.convolve(
+        numpy.tile(rng.normal(0, 1, vertex_count), 3), numpy.ones(15) / 15, "same"
+    )[vertex_count : 2 * vertex_count]
+    distance = radius * (1 + 0.2 * noise)
+    x, y = offset_coordinates(
+        longitude, latitude, distance * numpy.cos(angle), distance * numpy.sin(angle)
+    )
+    return shapely.Polygon(numpy.column_stack([x, y]))
+
+
+def generate_perimeters(
+    perimeter_count: int, vertex_count: int, rng: numpy.random.Generator
+) -> GeoDataFrame:
+    """Generate the perimeters of the fires, followed by the perimeters of other
+    incidents elsewhere in California."""
+    names, geometries = [], []
+    for position in range(perimeter_count):
+        if position < len(INCIDENTS):
+            name, _, _, longitude, latitude = INCIDENTS[position]
+            radius = PERIMETER_RADIUS_METER
+        else:
+            name = f"INCIDENT {position}"
+            longitude, latitude = rng.uniform(-122, -116), rng.uniform(33, 38)
+            radius = rng.uniform(500, 5_000)
+        names.append(name)
+        geometries.append(
+            generate_perimeter(rng, longitude, latitude, radius, vertex_count)
+        )
+    return GeoDataFrame(
+        {
+            "OBJECTID": numpy.arange(1, perimeter_count + 1),
+            "poly_IncidentName": names,
+            "poly_GISAcres": [geometry.area * 2.5e4 for geometry in geometries],
+            "attr_IncidentTypeCategory": "WF",
+            "attr_POOState": "US-CA",
+        },
+        geometry=geometries,
+        crs="EPSG:4326",
+    )
+
+
+def to_geocode_response(
+    address: str, longitude: float, latitude: float, place_id: str
+) -> dict:
+    """Returns a raw GoogleV3 response for the given formatted address."""
+    return {
+        "formatted_address": f"{address}, USA",
+        "place_id": place_id,
+        "geometry": {
+            "location": {"lat": latitude, "lng": longitude},
+            "location_type": "ROOFTOP",
+        },
+    }
+
+
+def generate_intake(
+    dins: GeoDataFrame,
+    row_count: int,
+    rng: numpy.random.Generator,
+    exact_fraction: float = 0.6,
+    near_fraction: float = 0.25,
+    not_found_fraction: float = 0.02,
+    duplicate_fraction: float = 0.05,
+) -> Tuple[DataFrame, Dict[str, Optional[dict]]]:
+    """Generate the intake form and the GoogleV3 responses of its addresses.
+
+    Args:
+        dins: Damage inspection points the addresses are drawn from.
+        row_count: Number of rows of the intake form.
+        rng: Random generator.
+        exact_fraction: Fraction of the rows geocoded to the site address of a DINS
+            point, matched by the by_address matcher.
+        near_fraction: Fraction of the rows geocoded to a spelling of the address
+            that differs from DINS a few meters away from the DINS point, matched by
+            the by_coordinate matcher.
+        not_found_fraction: Fraction of the rows whose address is not found.
+        duplicate_fraction: Fraction of the rows repeating the address of another
+            row, e.g. a household submitting the form twice.
+            The other rows get an address missing from DINS.
+
+    Returns:
+        Intake form DataFrame, dictionary of address to raw GoogleV3 response.
+    """
+    kind = rng.choice(
+        ["exact", "near", "not_found", "other"],
+        row_count,
+        p=[
+            exact_fraction,
+            near_fraction,
+            not_found_fraction,
+            1 - exact_fraction - near_fraction - not_found_fraction,
+        ],
+    )
+    dins_position = rng.integers(0, len(dins), row_count)
+    dins_longitude = dins.geometry.x.to_numpy()[dins_position]
+    dins_latitude = dins.geometry.y.to_numpy()[dins_position]
+    dx, dy = random_disc(rng, row_count, 3)
+    near_dx, near_dy = random_disc(rng, row_count, 10)
+    # GoogleV3 keeps the accents of the street names
+    street_names = {unidecode(name): name for name in STREET_NAMES}
+    streets = dins["STREETNAME"].map(street_names).to_numpy()[dins_position]
+    suffixes = dins["STREETSUFFIX"].to_numpy()[dins_position]
+    numbers = dins["STREETNUMBER"].to_numpy()[dins_position]
+    cities = dins["CITY"].to_numpy()[dins_position]
+    zip_codes = dins["ZIPCODE"].to_numpy()[dins_position]
+
+    addresses: List[str] = []
+    geocode_responses: Dict[str, Optional[dict]] = {}
+    for i in range(row_count):
+        street = f"{streets[i].title()} {suffixes[i].title()}"
+        city = cities[i].title()
+        if kind[i] == "other":
+            # odd street numbers are never in DINS
+            number = int(numbers[i]) + 1
+        else:
+            number = numbers[i]
+        address = f"{number} {street}, {city} CA"
+        if kind[i] == "not_found":
+            address = f"{address} (unit {i})"
+            geocode_responses[address] = None
+        elif kind[i] == "near":
+            longitude, latitude = offset_coordinates(
+                dins_longitude[i], dins_latitude[i], near_dx[i], near_dy[i]
+            )
+            geocode_responses[address] = to_geocode_response(
+                f"{number} {streets[i].title()} {STREET_SUFFIX_NAMES[suffixes[i]]}, "
+                f"{city}, CA {zip_codes[i]}",
+                longitude,
+                latitude,
+                f"near-{dins_position[i]}",
+            )
+        else:
+            longitude, latitude = offset_coordinates(
+                dins_longitude[i], dins_latitude[i], dx[i], dy[i]
+            )
+            geocode_responses[address] = to_geocode_response(
+                f"{number} {street}, {city}, CA {zip_codes[i]}",
+                longitude,
+                latitude,
+                f"{kind[i]}-{dins_position[i]}",
+            )
+        addresses.append(address)
+
+    duplicated = rng.random(row_count) < duplicate_fraction
+    duplicated[0] = False
+    for i in numpy.flatnonzero(duplicated):
+        addresses[i] = addresses[rng.integers(0, i)]
+
+    intake_numbers = numpy.arange(1, row_count + 1).astype(object)
+    # Rows without intake number are dropped by the preprocessing
+    intake_numbers[rng.random(row_count) < 0.005] = None
+    remarks = numpy.where(
+        rng.random(row_count) < 0.5,
+        rng.integers(1, 100, row_count).astype(object),
+        rng.choice(["Call back", "Renter", "Owner", "Needs translator"], row_count),
+    )
+    intake = DataFrame(
+        {
+            "Intake #": intake_numbers,
+            "Date": pd.Timestamp("2025-02-01")
+            + pd.to_timedelta(rng.integers(0, 120, row_count), unit="D"),
+            "Full Addr": addresses,
+            "Type of Affected Structure": rng.choice(STRUCTURE_TYPES, row_count),
+            "Level of damage": rng.choice(DAMAGE_LEVELS, row_count),
+            "Damage according to Clients": rng.choice(DAMAGE_LEVELS, row_count),
+            "County": "Los Angeles",
+            "Reviewer\nName & Date": None,
+            "Remarks": remarks,
+        }
+    )
+    return intake, geocode_responses
+
+
+def generate_dataset(
+    intake_row_count: int,
+    dins_row_count: int,
+    perimeter_count: int = 20,
+    perimeter_vertex_count: int = 1_000,
+    seed: int = 0,
+) -> SyntheticDataset:
+    """Generate a synthetic data set, identical for the same arguments."""
+    rng = numpy.random.default_rng(seed)
+    dins = generate_dins(dins_row_count, rng)
+    perimeters = generate_perimeters(
+        max(perimeter_count, len(INCIDENTS)), perimeter_vertex_count, rng
+    )
+    intake, geocode_responses = generate_intake(dins, intake_row_count, rng)
+    return SyntheticDataset(
+        intake=intake,
+        dins=dins,
+        perimeters=perimeters,
+        geocode_responses=geocode_responses,
+    )
+
+
+def write_dataset(
+    dataset: SyntheticDataset, input_file_path: str, intake_sheet_name: str
+) -> Dict[str, str]:
+    """Write the synthetic data set to input_file_path.
+
+    Returns:
+        Dictionary of INTAKE_FILE_NAME, DINS_FILE_NAME, PERIMETERS_FILE_NAME and
+        GEOCODE_RESPONSES_FILE_NAME as key and the path of the written file as value.
+    """
+    Path(input_file_path).mkdir(parents=True, exist_ok=True)
+    file_paths = {
+        file_name: os.path.join(input_file_path, file_name)
+        for file_name in (
+            INTAKE_FILE_NAME,
+            DINS_FILE_NAME,
+            PERIMETERS_FILE_NAME,
+            GEOCODE_RESPONSES_FILE_NAME,
+        )
+    }
+    workbook = open_xlsxwriter_workbook(file_paths[INTAKE_FILE_NAME])
+    write_excel_worksheet(workbook, intake_sheet_name, dataset.intake, False)
+    workbook.close()
+    dataset.dins.to_file(file_paths[DINS_FILE_NAME], driver="GeoJSON")
+    dataset.perimeters.to_file(file_paths[PERIMETERS_FILE_NAME], driver="GeoJSON")
+    with open(file_paths[GEOCODE_RESPONSES_FILE_NAME], "w", encoding="utf-8") as file:
+        json.dump(dataset.geocode_responses, file)
+    logger.info(
+        f"Wrote {len(dataset.intake)} intake rows, {len(dataset.dins)} DINS points and "
+        f"{len(dataset.perimeters)} perimeters to {input_file_path}"
+    )
+    return file_paths
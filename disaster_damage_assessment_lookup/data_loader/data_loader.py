@@ -2,37 +2,240 @@
 
 import logging
 import os
-from typing import Dict
+import time
+from dataclasses import replace
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Set
 
-import geopandas as gpd
 from geopandas import GeoDataFrame
 
 from disaster_damage_assessment_lookup.data_loader.excel import ExcelGeoDataFrameLoader
+from disaster_damage_assessment_lookup.data_loader.geojson import (
+    GeoJSONGeoDataFrameLoader,
+    get_read_options,
+)
 from disaster_damage_assessment_lookup.data_loader.schema.data_loader import (
     DataLoaderConfig,
 )
+from disaster_damage_assessment_lookup.data_loader.schema.excel import (
+    ExcelGeoDataFrameConfig,
+    LocalGeocoderConfig,
+)
+from disaster_damage_assessment_lookup.data_loader.schema.geojson import (
+    GeoJSONGeoDataFrameConfig,
+)
+from disaster_damage_assessment_lookup.matcher.scheduler import (
+    get_execution_order,
+    run_in_dependency_order,
+)
+from disaster_damage_assessment_lookup.utils import metrics
 
 logger = logging.getLogger(__name__)
 
 
+def get_labels(config: DataLoaderConfig) -> List[str]:
+    """Returns the labels of the data sources loaded by the DataLoader."""
+    return [*(config.excel or {}), *(config.geojson or {})]
+
+
 class DataLoader:
     """Helper class for loading all of the data needed to fetch the
     damage assessment information."""
 
-    def __init__(self, config: DataLoaderConfig):
+    def __init__(
+        self,
+        config: DataLoaderConfig,
+        geolocator=None,
+        required_columns: Optional[Dict[str, Optional[List[str]]]] = None,
+    ):
+        """
+        Args:
+            config: Configuration for the Data Loader component.
+            geolocator: Geocoder used instead of GoogleV3 by the
+                ExcelGeoDataFrameLoader. Optional and will use GoogleV3 if omitted.
+            required_columns: Columns used from each label, as returned by
+                get_required_columns, to load when prune_columns is enabled.
+                Optional and will load every column if omitted.
+        """
         self.config = config
+        self.geolocator = geolocator
+        self.required_columns = required_columns or {}
+
+    def get_local_geocoder_config(self) -> Optional[LocalGeocoderConfig]:
+        """Returns the configuration of the local geocoder if any."""
+        if self.config.geodataframe_loader is None:
+            return None
+        return self.config.geodataframe_loader.local_geocoder
+
+    def get_geojson_config(
+        self, label: str, gdf_config: GeoJSONGeoDataFrameConfig
+    ) -> GeoJSONGeoDataFrameConfig:
+        """Returns the configuration of the geojson file restricted to the required
+        columns when prune_columns is enabled and no columns are configured."""
+        required_columns = self.required_columns.get(label)
+        if (
+            not self.config.prune_columns
+            or gdf_config.columns is not None
+            or required_columns is None
+        ):
+            return gdf_config
+        local_geocoder = self.get_local_geocoder_config()
+        if local_geocoder is not None and local_geocoder.label == label:
+            required_columns = sorted(
+                {*required_columns, local_geocoder.address_column_name}
+            )
+        logger.info(
+            f"Loading the columns used by the matchers from {gdf_config.file_name}: "
+            f"{required_columns}"
+        )
+        return replace(gdf_config, columns=required_columns)
+
+    def load_excel(
+        self,
+        excel_geodataframe_loader: ExcelGeoDataFrameLoader,
+        gdf_config: ExcelGeoDataFrameConfig,
+    ) -> Optional[GeoDataFrame]:
+        """Load a single Excel File into GeoDataFrame, geocoding from the data source
+        of the local geocoder first if configured."""
+        logger.info(f"Loading Excel Files {gdf_config.file_name} into GeoDataFrame")
+        start_time = time.perf_counter()
+        with metrics.stage(f"data_loader.excel.{gdf_config.label}") as stage:
+            gdf = excel_geodataframe_loader.load(
+                config=gdf_config,
+                input_file_path=self.config.input_file_path,
+                output_file_path=self.config.output_file_path,
+            )
+            stage.rows_out = None if gdf is None else len(gdf)
+        if gdf is not None:
+            logger.info(
+                f"Successfully loaded Excel Files {gdf_config.file_name} into GeoDataFrame "
+                f"in {time.perf_counter() - start_time:.2f} seconds"
+            )
+        return gdf
+
+    def load_geojson(
+        self,
+        geojson_geodataframe_loader: GeoJSONGeoDataFrameLoader,
+        gdf_config: GeoJSONGeoDataFrameConfig,
+        loaded: Optional[Dict[str, GeoDataFrame]] = None,
+    ) -> Optional[GeoDataFrame]:
+        """Load a single geojson File into GeoDataFrame, filtered on its region of
+        interest, using the extent of the data sources already loaded."""
+        file_name = os.path.join(self.config.input_file_path, gdf_config.file_name)
+        logger.info(f"Loading geojson Files {file_name} into GeoDataFrame")
+        start_time = time.perf_counter()
+        read_options = None
+        region = gdf_config.region_of_interest
+        if region is not None:
+            read_options = get_read_options(
+                region, (loaded or {}).get(region.extent_of_label)
+            )
+            logger.info(
+                f"Reading {file_name} filtered on "
+                f"{', '.join(read_options) or 'no region of interest'}"
+            )
+        with metrics.stage(f"data_loader.geojson.{gdf_config.label}") as stage:
+            gdf = geojson_geodataframe_loader.load(
+                config=gdf_config,
+                input_file_path=self.config.input_file_path,
+                output_file_path=self.config.output_file_path,
+                read_options=read_options,
+            )
+            stage.rows_out = None if gdf is None else len(gdf)
+        if gdf is not None:
+            logger.info(
+                f"Successfully loaded geojson Files {file_name} into GeoDataFrame "
+                f"in {time.perf_counter() - start_time:.2f} seconds"
+            )
+        return gdf
+
+    def get_dependencies(self, labels: Iterable[str]) -> Dict[str, Set[str]]:
+        """Returns the labels each data source waits for, the extent_of_label of the
+        region of interest of the geojson files, and the label of the local geocoder
+        for the Excel files unless is_local_geocoder_overlapped.
+
+        Raises:
+            ValueError: If the data sources depend on each other in a cycle.
+        """
+        labels = list(labels)
+        dependencies = {label: set() for label in labels}
+        for label, gdf_config in (self.config.geojson or {}).items():
+            region = gdf_config.region_of_interest
+            if region is None or not region.extent_of_label:
+                continue
+            if region.extent_of_label in labels:
+                dependencies[label].add(region.extent_of_label)
+            else:
+                logger.warning(
+                    f"extent_of_label '{region.extent_of_label}' of {label} is not "
+                    "loaded, not filtering on its extent"
+                )
+        local_geocoder_dependencies = {label: set() for label in labels}
+        local_geocoder = self.get_local_geocoder_config()
+        if local_geocoder is not None and self.config.excel:
+            if local_geocoder.label in labels:
+                for label in self.config.excel:
+                    if label != local_geocoder.label:
+                        local_geocoder_dependencies[label].add(local_geocoder.label)
+            else:
+                logger.warning(
+                    f"label '{local_geocoder.label}' of the local_geocoder is not "
+                    "loaded, not geocoding locally"
+                )
+        try:
+            get_execution_order(
+                {
+                    label: dependencies[label] | local_geocoder_dependencies[label]
+                    for label in labels
+                },
+                step_noun="Data sources",
+            )
+        except ValueError as e:
+            raise ValueError(
+                "The extent_of_label of the region_of_interest of the geojson files "
+                "and the label of the local_geocoder depend on each other in a "
+                f"cycle, e: {e}"
+            ) from e
+        if self.is_local_geocoder_overlapped(labels):
+            return dependencies
+        return {
+            label: dependencies[label] | local_geocoder_dependencies[label]
+            for label in labels
+        }
+
+    def is_local_geocoder_overlapped(self, labels: Iterable[str]) -> bool:
+        """Whether the Excel files start loading while the geojson file of the local
+        geocoder is still loading, only waiting for the local geocoder right before
+        geocoding. This needs a worker for the geojson file besides one per Excel
+        file, otherwise the Excel files wait for the geojson file to be loaded."""
+        local_geocoder = self.get_local_geocoder_config()
+        return (
+            local_geocoder is not None
+            and local_geocoder.label in labels
+            and local_geocoder.label in (self.config.geojson or {})
+            and local_geocoder.label not in (self.config.excel or {})
+            and self.config.max_workers > len(self.config.excel or {})
+        )
 
     def load(self) -> Dict[str, GeoDataFrame]:
         """Load all of the data needed to fetch the damage assessment information.
 
+        When max_workers is greater than 1, the data sources are loaded concurrently,
+        e.g. parsing the geojson files while the Excel Files are being geocoded.
+        A geojson file whose region of interest is the extent of another data source
+        is loaded once that data source is. With the local geocoder, the Excel files
+        are read while its geojson file is loading and only wait for it right before
+        geocoding, when there are more max_workers than Excel files. Otherwise they
+        start once it is loaded. Label conflicts and cycles are checked before loading
+        anything.
+
         Returns:
             Dictionary of a string label as key and GeoDataFrame as value.
         """
-        result = {}
         excel_geodataframe_loader = None
         if self.config.geodataframe_loader:
             excel_geodataframe_loader = ExcelGeoDataFrameLoader(
-                self.config.geodataframe_loader
+                self.config.geodataframe_loader, geolocator=self.geolocator
             )
             logger.info("Initialized ExcelGeoDataFrameLoader")
 
@@ -41,44 +244,76 @@ class DataLoader:
                 "geodataframe_loader must be configured in default.yaml in "
                 "order to import excel file into GeoDataFrame!"
             )
+        geojson_geodataframe_loader = GeoJSONGeoDataFrameLoader()
 
-        if self.config.excel:
-            for label, gdf_config in self.config.excel.items():
-                logger.info(
-                    f"Loading Excel Files {gdf_config.file_name} into GeoDataFrame"
-                )
-                if label in result:
-                    raise ValueError(
-                        f"Conflicting label '{label}' "
-                        "found when trying to load GeoDataFrame during the DataLoader step"
-                    )
-
-                gdf = excel_geodataframe_loader.load(
-                    config=gdf_config,
-                    input_file_path=self.config.input_file_path,
-                    output_file_path=self.config.output_file_path,
+        result: Dict[str, GeoDataFrame] = {}
+        tasks: Dict[str, Callable[[], Optional[GeoDataFrame]]] = {}
+        sources = [
+            (
+                label,
+                partial(self.load_excel, excel_geodataframe_loader, gdf_config),
+            )
+            for label, gdf_config in (self.config.excel or {}).items()
+        ] + [
+            (
+                label,
+                partial(
+                    self.load_geojson,
+                    geojson_geodataframe_loader,
+                    self.get_geojson_config(label, gdf_config),
+                    result,
+                ),
+            )
+            for label, gdf_config in (self.config.geojson or {}).items()
+        ]
+        for label, task in sources:
+            if label in tasks:
+                raise ValueError(
+                    f"Conflicting label '{label}' "
+                    "found when trying to load GeoDataFrame during the DataLoader step"
                 )
-                if gdf is not None:
-                    logger.info(
-                        f"Successfully loaded Excel Files {gdf_config.file_name} into GeoDataFrame"
-                    )
-                    result[label] = gdf
-        if self.config.geojson:
-            for label, gdf_config in self.config.geojson.items():
-                file_name = os.path.join(
-                    self.config.input_file_path, gdf_config.file_name
+            tasks[label] = task
+        dependencies = self.get_dependencies(tasks)
+        local_geocoder = self.get_local_geocoder_config()
+        if excel_geodataframe_loader and self.is_local_geocoder_overlapped(tasks):
+            excel_geodataframe_loader.expect_local_geocoder()
+
+        def run_step(label: str) -> Optional[GeoDataFrame]:
+            try:
+                gdf = tasks[label]()
+            except BaseException:
+                if excel_geodataframe_loader:
+                    # The local geocoder may never be built, e.g. a source failing
+                    # cancels the others, so the Excel files must not wait for it
+                    excel_geodataframe_loader.abandon_local_geocoder()
+                raise
+            if (
+                excel_geodataframe_loader
+                and local_geocoder is not None
+                and label == local_geocoder.label
+            ):
+                excel_geodataframe_loader.load_local_geocoder(
+                    {} if gdf is None else {label: gdf}
                 )
-                logger.info(f"Loading geojson Files {file_name} into GeoDataFrame")
-                if label in result:
-                    raise ValueError(
-                        f"Conflicting label '{label}' "
-                        "found when trying to load GeoDataFrame during the DataLoader step"
-                    )
-                gdf = gpd.read_file(filename=file_name, columns=gdf_config.columns)
-                if gdf is not None:
-                    logger.info(
-                        f"Successfully loaded geojson Files {file_name} into GeoDataFrame"
-                    )
-                    result[label] = gdf
-
-        return result
+            return gdf
+
+        def on_load_done(label: str, gdf: Optional[GeoDataFrame]):
+            if gdf is not None:
+                result[label] = gdf
+
+        with metrics.stage("data_loader") as stage:
+            start_time = time.perf_counter()
+            run_in_dependency_order(
+                dependencies,
+                run_step=run_step,
+                on_step_done=on_load_done,
+                max_workers=self.config.max_workers,
+                thread_name_prefix="data_loader",
+            )
+            logger.info(
+                f"Loaded {len(result)} data sources in "
+                f"{time.perf_counter() - start_time:.2f} seconds"
+            )
+            stage.rows_out = sum(len(gdf) for gdf in result.values())
+        # Keep the configuration order regardless of which source finished first
+        return {label: result[label] for label in tasks if label in result}
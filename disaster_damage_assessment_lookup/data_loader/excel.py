@@ -3,19 +3,27 @@
 import json
 import logging
 import os
+import threading
+from itertools import islice
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Mapping, Optional, Tuple
 
 import geopandas as gpd
 import numpy
+import openpyxl
 import pandas as pd
 from geopandas import GeoDataFrame
 from geopy.exc import GeopyError
 from geopy.extra.rate_limiter import RateLimiter
 from geopy.geocoders import GoogleV3
 from pandas import DataFrame
-from unidecode import unidecode
 
+from disaster_damage_assessment_lookup.data_loader.geocode_cache import GeocodeCache
+from disaster_damage_assessment_lookup.data_loader.geocode_checkpoint import (
+    GeocodeCheckpoint,
+)
+from disaster_damage_assessment_lookup.data_loader.geocoder import ConcurrentGeocoder
+from disaster_damage_assessment_lookup.data_loader.local_geocoder import LocalGeocoder
 from disaster_damage_assessment_lookup.data_loader.schema.excel import (
     AddressFormattingConfig,
     ExcelGeoDataFrameConfig,
@@ -23,6 +31,11 @@ from disaster_damage_assessment_lookup.data_loader.schema.excel import (
     PostProcessingConfig,
     PreProcessingStepConfig,
 )
+from disaster_damage_assessment_lookup.utils import metrics
+from disaster_damage_assessment_lookup.utils.address import transliterate
+from disaster_damage_assessment_lookup.utils.dataframe import (
+    stringify_mixed_type_columns,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -33,105 +46,482 @@ GEOCODE_COLUMN_NAME = "_geocode"
 LATITUDE_COLUMN_NAME = "_latitude"
 LONGITUDE_COLUMN_NAME = "_longitude"
 
-
-def get_cache_name(file_label: str):
+# columns parsed from the result of the geocode request
+FORMATTED_ADDRESS_COLUMN_NAME = "_formatted_address"
+PLACE_ID_COLUMN_NAME = "_place_id"
+LOCATION_TYPE_COLUMN_NAME = "_location_type"
+PARTIAL_MATCH_COLUMN_NAME = "_partial_match"
+GEOCODE_RESULT_COLUMNS = {
+    LATITUDE_COLUMN_NAME: "float64",
+    LONGITUDE_COLUMN_NAME: "float64",
+    FORMATTED_ADDRESS_COLUMN_NAME: "string",
+    PLACE_ID_COLUMN_NAME: "string",
+    LOCATION_TYPE_COLUMN_NAME: "string",
+    PARTIAL_MATCH_COLUMN_NAME: "boolean",
+}
+
+
+# file extension for each of the supported cache_format
+CACHE_FILE_EXTENSIONS = {
+    "excel": "xlsx",
+    "parquet": "parquet",
+    "feather": "feather",
+}
+
+
+def get_cache_name(file_label: str, cache_format: str = "excel"):
     """Returns the name of the file for the given file_label."""
-    return f"{file_label}_cache.xlsx"
+    if cache_format not in CACHE_FILE_EXTENSIONS:
+        raise ValueError(
+            f"Unsupported cache_format '{cache_format}', "
+            f"must be one of {', '.join(CACHE_FILE_EXTENSIONS)}"
+        )
+    return f"{file_label}_cache.{CACHE_FILE_EXTENSIONS[cache_format]}"
+
 
+def read_cache(cache_file_path: str, cache_format: str, sheet_name: str) -> DataFrame:
+    """Read the cached DataFrame saved by write_cache.
 
-def label_location(row, geocode, address_column_name):
+    Args:
+        cache_file_path: Path of the cache file.
+        cache_format: Format of the cache file, one of CACHE_FILE_EXTENSIONS.
+        sheet_name: Sheet to read, only used by the excel cache_format.
+
+    Returns:
+        DataFrame without the geometry column, which is rebuilt from the
+        latitude and longitude columns.
+    """
+    if cache_format == "excel":
+        excel_file = pd.ExcelFile(cache_file_path)
+        return pd.read_excel(excel_file, sheet_name)
+    if cache_format == "parquet":
+        gdf = gpd.read_parquet(cache_file_path)
+    else:
+        gdf = gpd.read_feather(cache_file_path)
+    return pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+
+
+def write_cache(
+    gdf: GeoDataFrame, cache_file_path: str, cache_format: str, sheet_name: str
+):
+    """Save the GeoDataFrame to the cache file in the given cache_format.
+
+    Binary formats keep the geometry and the column dtypes, but cannot store
+    object columns mixing types, e.g. numbers and text in a free form Remarks column,
+    so those are saved as text.
+    """
+    if cache_format == "excel":
+        gdf.to_excel(cache_file_path, sheet_name=sheet_name, index=False)
+        return
+
+    gdf = stringify_mixed_type_columns(gdf)
+    if cache_format == "parquet":
+        gdf.to_parquet(cache_file_path, index=False)
+    else:
+        gdf.to_feather(cache_file_path, index=False)
+
+
+def read_excel_chunks(
+    file_path: str, sheet_name: str, chunk_size: int
+) -> Iterator[DataFrame]:
+    """Read the sheet of the Excel file chunk_size rows at a time, in read only mode so
+    the whole sheet is never held in memory.
+
+    The first row is the header like pd.read_excel, and the rows are indexed by their
+    position in the sheet so the index stays unique across chunks. Empty rows
+    are skipped.
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [
+            f"Unnamed: {position}" if column_name is None else column_name
+            for position, column_name in enumerate(header)
+        ]
+        padding = (None,) * len(columns)
+        position = 0
+        for chunk in iter(lambda: list(islice(rows, chunk_size)), []):
+            index, records = [], []
+            for row in chunk:
+                if any(value is not None for value in row):
+                    index.append(position)
+                    records.append((tuple(row) + padding)[: len(columns)])
+                position += 1
+            if records:
+                yield DataFrame.from_records(records, index=index, columns=columns)
+    finally:
+        workbook.close()
+
+
+def label_location(
+    row,
+    geocode,
+    address_column_name,
+    cache: GeocodeCache = None,
+    progress: metrics.ProgressReporter = None,
+    checkpoint: GeocodeCheckpoint = None,
+):
     """Dataframe apply function for making request to GoogleV3 API using Geopy
     and fetch the geocode information for the given address.
+    The persistent geocode cache is consulted first if provided, and the response of
+    every completed request is recorded to the checkpoint if provided.
     """
-    if pd.isnull(row[GEOCODE_COLUMN_NAME]) and row[address_column_name] != "Na ":
+    if (
+        pd.isnull(row[GEOCODE_COLUMN_NAME])
+        and pd.isnull(row[LATITUDE_COLUMN_NAME])
+        and row[address_column_name] != "Na "
+    ):
+        if progress is not None:
+            progress.update()
+        if cache is not None:
+            cached_response = cache.get(row[address_column_name])
+            if cached_response:
+                metrics.increment("geocode.cache_hits")
+                return cached_response
+            metrics.increment("geocode.cache_misses")
+        code = None
         try:
             logger.debug(f"Running geocode for address '{row[address_column_name]}'")
+            metrics.increment("geocode.requests")
             code = geocode(row[address_column_name])
         except GeopyError as e:
+            metrics.increment("geocode.errors")
             logger.error(
                 "Exception occurred while querying geocode for address: "
                 f"{row[address_column_name]}, e: {e}"
             )
+        else:
+            if not code:
+                metrics.increment("geocode.not_found")
+            if checkpoint is not None:
+                checkpoint.add(
+                    row[address_column_name], json.dumps(code.raw) if code else None
+                )
         if code:
-            return json.dumps(code.raw)
+            response = json.dumps(code.raw)
+            if cache is not None:
+                cache.put(row[address_column_name], response)
+            return response
     return row[GEOCODE_COLUMN_NAME]
 
 
-def label_latitude(row):
-    """Dataframe apply function for labeling latitude column with geocode data
-    loaded from geocoding API request made to GoogleV3 API.
-    """
-    if not pd.isnull(row[GEOCODE_COLUMN_NAME]) and pd.isnull(row[LATITUDE_COLUMN_NAME]):
-        return json.loads(row[GEOCODE_COLUMN_NAME])["geometry"]["location"]["lat"]
-    return row[LATITUDE_COLUMN_NAME]
+def address_hash(addresses: pd.Series) -> numpy.ndarray:
+    """Returns a content hash for each address, used to detect changed addresses."""
+    return pd.util.hash_pandas_object(
+        addresses.astype(str).str.strip(), index=False
+    ).to_numpy()
 
 
-def label_longitude(row):
-    """Dataframe apply function for labeling longitude column with geocode data
-    loaded from geocoding API request made to GoogleV3 API.
-    """
-    if not pd.isnull(row[GEOCODE_COLUMN_NAME]) and pd.isnull(
-        row[LONGITUDE_COLUMN_NAME]
-    ):
-        return json.loads(row[GEOCODE_COLUMN_NAME])["geometry"]["location"]["lng"]
-    return row[LONGITUDE_COLUMN_NAME]
+def get_comparable_keys(keys: pd.Series) -> pd.Series:
+    """Returns the keys as text the way stringify_mixed_type_columns saves them to a
+    Parquet or Feather cache, so 1, 1.0 and "1" are the same key. Null keys are left
+    as is."""
+
+    def to_text(key):
+        if pd.isna(key):
+            return key
+        if isinstance(key, float) and key.is_integer():
+            return str(int(key))
+        return str(key)
 
+    return keys.map(to_text)
 
-def label_siteaddress(row, config: AddressFormattingConfig):
-    """Dataframe apply function for labeling SITEADDRESS column with address
-    loaded from geocoding API request made to GoogleV3 API.
+
+def parse_geocode_responses(responses: pd.Series) -> DataFrame:
+    """Parse the raw JSON geocode responses returned by GoogleV3 API into typed columns,
+    calling json.loads only once per response.
+
+    Args:
+        responses: Series of raw JSON geocode responses, without null values.
+
+    Returns:
+        DataFrame with the same index as responses and a column for each of the
+        GEOCODE_RESULT_COLUMNS.
     """
-    if not pd.isnull(row[GEOCODE_COLUMN_NAME]) and pd.isnull(
-        row[config.normalized_address_output_column_name]
-    ):
-        # GoogleV3's address look like
-        # VÍA DE LA PAZ, PACIFIC PALISADES, CA 90272, USA
-        # and needs to be converted to parcel address in DINS database that looks like
-        # VIA DE LA PAZ, PACIFIC PALISADES, CA 90272
-        formatted_address: str = json.loads(row[GEOCODE_COLUMN_NAME])[
-            "formatted_address"
-        ]
-        site_address = formatted_address
-        if config.to_upper:
-            site_address = site_address.upper()
-        for replacement_config in config.replace:
-            site_address = site_address.replace(
-                replacement_config.old_value,
-                replacement_config.new_value,
+    records = []
+    for response in responses:
+        geocode = json.loads(response)
+        geometry = geocode.get("geometry", {})
+        location = geometry.get("location", {})
+        records.append(
+            (
+                location.get("lat"),
+                location.get("lng"),
+                geocode.get("formatted_address"),
+                geocode.get("place_id"),
+                geometry.get("location_type"),
+                geocode.get("partial_match", False),
             )
-        if config.apply_unidecode:
-            # Fix replace special character like VÍA with English character VIA
-            site_address = unidecode(site_address)
+        )
+    parsed = DataFrame.from_records(
+        records, index=responses.index, columns=list(GEOCODE_RESULT_COLUMNS)
+    )
+    return parsed.astype(GEOCODE_RESULT_COLUMNS)
 
-        return site_address
-    return row[config.normalized_address_output_column_name]
+
+def format_site_address(
+    formatted_address: pd.Series, config: AddressFormattingConfig
+) -> pd.Series:
+    """Format the address returned by GoogleV3 API to match the parcel address,
+    using vectorized string operations over the whole column.
+    """
+    # GoogleV3's address look like
+    # VÍA DE LA PAZ, PACIFIC PALISADES, CA 90272, USA
+    # and needs to be converted to parcel address in DINS database that looks like
+    # VIA DE LA PAZ, PACIFIC PALISADES, CA 90272
+    site_address = formatted_address
+    if config.to_upper:
+        site_address = site_address.str.upper()
+    for replacement_config in config.replace:
+        site_address = site_address.str.replace(
+            replacement_config.old_value,
+            replacement_config.new_value,
+            regex=False,
+        )
+    if config.apply_unidecode:
+        # Fix replace special character like VÍA with English character VIA,
+        # only transliterating each distinct address once
+        site_address = site_address.map(
+            {address: transliterate(address) for address in site_address.unique()}
+        )
+    return site_address
 
 
 class ExcelGeoDataFrameLoader:
     """Helper class for loading Excel file into GeoDataFrame using GoogleV3 API"""
 
-    def __init__(self, config: ExcelGeoDataFrameLoaderConfig):
-        self.geolocator = GoogleV3(config.google_server_api_key)
-        self.geocode = RateLimiter(
-            self.geolocator.geocode,
-            min_delay_seconds=config.min_delay_between_requests_in_seconds,
+    def __init__(self, config: ExcelGeoDataFrameLoaderConfig, geolocator=None):
+        """
+        Args:
+            config: ExcelGeoDataFrameLoader class configuration.
+            geolocator: Geocoder with the same geocode method as the geopy geocoders,
+                used instead of GoogleV3, e.g. a local stand-in for benchmarks.
+                Optional and will use GoogleV3 if omitted.
+        """
+        self.geolocator = geolocator or GoogleV3(config.google_server_api_key)
+        self.concurrent_geocoder = None
+        if config.geocoder_type == "concurrent":
+            self.concurrent_geocoder = ConcurrentGeocoder(
+                self.geolocator.geocode,
+                max_concurrent_requests=config.max_concurrent_requests,
+                requests_per_second=config.requests_per_second,
+                max_retries=config.max_retries,
+            )
+            self.geocode = self.concurrent_geocoder.geocode
+        elif config.geocoder_type == "rate_limiter":
+            # Raise the errors left after the retries to label_location, so a failed
+            # request is not checkpointed as an address that was not found
+            self.geocode = RateLimiter(
+                self.geolocator.geocode,
+                min_delay_seconds=config.min_delay_between_requests_in_seconds,
+                swallow_exceptions=False,
+            )
+        else:
+            raise ValueError(
+                f"Unsupported geocoder_type '{config.geocoder_type}', "
+                "must be one of rate_limiter or concurrent"
+            )
+
+        self.geocode_cache = None
+        if config.geocode_cache:
+            self.geocode_cache = GeocodeCache(
+                file_path=config.geocode_cache.file_path,
+                ttl_in_days=config.geocode_cache.ttl_in_days,
+                max_entries=config.geocode_cache.max_entries,
+            )
+
+        self.checkpoint_config = config.geocode_checkpoint
+        self.local_geocoder_config = config.local_geocoder
+        self.local_geocoder = None
+        self.local_geocoder_lock = threading.Lock()
+        # Cleared while the data source of the local geocoder is still loading
+        self.local_geocoder_ready = threading.Event()
+        self.local_geocoder_ready.set()
+        self.local_geocoder_abandoned = False
+
+    def expect_local_geocoder(self):
+        """Make add_geolocation_data wait until load_local_geocoder is called, so the
+        Excel files start loading while the data source of the local geocoder is still
+        being loaded."""
+        self.local_geocoder_abandoned = False
+        self.local_geocoder_ready.clear()
+
+    def abandon_local_geocoder(self):
+        """Stop waiting for the local geocoder, e.g. when a data source failed to load
+        and the data source of the local geocoder will not be loaded."""
+        self.local_geocoder_abandoned = True
+        self.local_geocoder_ready.set()
+
+    def wait_for_local_geocoder(self):
+        """Wait until the local geocoder expected by expect_local_geocoder is built.
+
+        Raises:
+            ValueError: If the local geocoder was abandoned.
+        """
+        if not self.local_geocoder_ready.is_set():
+            logger.info("Waiting for the data source of the local geocoder")
+            with metrics.stage("excel.local_geocoder.wait"):
+                self.local_geocoder_ready.wait()
+        if self.local_geocoder_abandoned:
+            raise ValueError(
+                "Not geocoding, the data source of the local_geocoder failed to load"
+            )
+
+    def load_local_geocoder(
+        self, gdf_databases: Mapping[str, GeoDataFrame], reload: bool = False
+    ):
+        """Build the local geocoder from its data source, once unless reload is set,
+        e.g. when the lookup server reloads the reference data. The Excel files
+        waiting since expect_local_geocoder are then geocoded, locally if the data
+        source is loaded.
+
+        Args:
+            gdf_databases: Loaded data sources by label.
+            reload: Whether to build the local geocoder again if already built.
+        """
+        config = self.local_geocoder_config
+        if config is None:
+            return
+        try:
+            with self.local_geocoder_lock:
+                if self.local_geocoder is not None and not reload:
+                    return
+                if config.label not in gdf_databases:
+                    logger.warning(
+                        f"label '{config.label}' of the local_geocoder is not loaded, "
+                        "not geocoding locally"
+                    )
+                    return
+                with metrics.stage(f"excel.local_geocoder.{config.label}"):
+                    self.local_geocoder = LocalGeocoder(
+                        gdf_databases[config.label],
+                        address_column_name=config.address_column_name,
+                        interpolate=config.interpolate,
+                        max_interpolation_gap=config.max_interpolation_gap,
+                    )
+        finally:
+            self.local_geocoder_ready.set()
+
+    def get_checkpoint(self, label: str) -> Optional[GeocodeCheckpoint]:
+        """Returns the geocode checkpoint of the label, None if not configured."""
+        if self.checkpoint_config is None:
+            return None
+        return GeocodeCheckpoint(
+            os.path.join(self.checkpoint_config.file_path, f"{label}.jsonl"),
+            flush_every_rows=self.checkpoint_config.flush_every_rows,
+            flush_interval_in_seconds=self.checkpoint_config.flush_interval_in_seconds,
         )
 
-    def add_geolocation_data(self, df: DataFrame, geocode_search_column_name: str):
+    def add_geolocation_data(
+        self,
+        df: DataFrame,
+        geocode_search_column_name: str,
+        checkpoint: Optional[GeocodeCheckpoint] = None,
+    ):
         """Add geolocation information inplace to the given df by looking up
         geocode_search_column_name using geocode call to GoogleV3 API using Geopy.
 
         Args:
             df: DataFrame to add geolocation information to.
             geocode_search_column_name: columns to run geocode search on.
+            checkpoint: Checkpoint to resume the geocoding of a previous run from and
+                to record every completed request to. Optional.
         """
+        if df.empty:
+            return
         logger.info("Adding geolocation data, this can take a while...")
-        df[GEOCODE_COLUMN_NAME] = df.apply(
-            label_location,
-            geocode=self.geocode,
-            address_column_name=geocode_search_column_name,
-            axis=1,
+        pending = (
+            df[GEOCODE_COLUMN_NAME].isna()
+            & df[LATITUDE_COLUMN_NAME].isna()
+            & (df[geocode_search_column_name] != "Na ")
+        )
+        metrics.increment("geocode.rows", int(pending.sum()))
+        if pending.any():
+            self.wait_for_local_geocoder()
+        if self.local_geocoder is not None and pending.any():
+            addresses = df.loc[pending, geocode_search_column_name]
+            local_results = self.local_geocoder.geocode_all(addresses)
+            found = addresses.map(local_results).dropna()
+            df[GEOCODE_COLUMN_NAME] = df[GEOCODE_COLUMN_NAME].astype(object)
+            df.loc[found.index, GEOCODE_COLUMN_NAME] = found
+            pending &= ~df.index.isin(found.index)
+            logger.info(
+                f"Geocoded {len(found)} of {len(addresses)} rows locally, "
+                f"{int(pending.sum())} rows left"
+            )
+
+        if checkpoint is not None and pending.any():
+            addresses = df.loc[pending, geocode_search_column_name]
+            checkpointed = checkpoint.get_many(addresses.unique())
+            resumed = addresses[addresses.isin(checkpointed.keys())]
+            df[GEOCODE_COLUMN_NAME] = df[GEOCODE_COLUMN_NAME].astype(object)
+            df.loc[resumed.index, GEOCODE_COLUMN_NAME] = resumed.map(checkpointed)
+            pending &= ~df.index.isin(resumed.index)
+            metrics.increment("geocode.checkpoint_hits", len(resumed))
+            if len(resumed):
+                logger.info(
+                    f"Resumed {len(resumed)} rows from geocode checkpoint "
+                    f"{checkpoint.file_path}, {int(pending.sum())} rows left"
+                )
+
+        use_remote_geocoder = (
+            self.local_geocoder_config is None
+            or self.local_geocoder_config.use_remote_geocoder
         )
+        if not use_remote_geocoder:
+            metrics.increment("geocode.local_misses", int(pending.sum()))
+            logger.info(
+                f"Not geocoding the {int(pending.sum())} rows left, "
+                "use_remote_geocoder is disabled"
+            )
+        elif self.concurrent_geocoder is not None:
+            addresses = df.loc[pending, geocode_search_column_name]
+            geocode_results = {}
+            if self.geocode_cache is not None:
+                geocode_results = self.geocode_cache.get_many(addresses.unique())
+            addresses_to_request = addresses[~addresses.isin(geocode_results.keys())]
+            if self.geocode_cache is not None:
+                metrics.increment("geocode.cache_hits", len(geocode_results))
+                metrics.increment(
+                    "geocode.cache_misses", addresses_to_request.nunique()
+                )
+            logger.info(
+                f"Geocoding {addresses_to_request.nunique()} unique addresses for "
+                f"{len(addresses)} rows, {len(geocode_results)} found in cache"
+            )
+            try:
+                requested_results = self.concurrent_geocoder.geocode_all(
+                    addresses_to_request,
+                    on_result=checkpoint.add if checkpoint is not None else None,
+                )
+            finally:
+                if checkpoint is not None:
+                    checkpoint.flush()
+            if self.geocode_cache is not None:
+                self.geocode_cache.put_many(requested_results)
+            geocode_results.update(requested_results)
+            df[GEOCODE_COLUMN_NAME] = df[GEOCODE_COLUMN_NAME].astype(object)
+            df.loc[pending, GEOCODE_COLUMN_NAME] = addresses.map(geocode_results)
+        elif pending.any():
+            # Only the pending rows, the rows resumed from the checkpoint may be
+            # addresses that were not found
+            df[GEOCODE_COLUMN_NAME] = df[GEOCODE_COLUMN_NAME].astype(object)
+            try:
+                df.loc[pending, GEOCODE_COLUMN_NAME] = df[pending].apply(
+                    label_location,
+                    geocode=self.geocode,
+                    address_column_name=geocode_search_column_name,
+                    cache=self.geocode_cache,
+                    progress=metrics.progress("Geocoding", int(pending.sum())),
+                    checkpoint=checkpoint,
+                    axis=1,
+                )
+            finally:
+                if checkpoint is not None:
+                    checkpoint.flush()
         logger.info("Finished adding geolocation data")
 
     def do_preprocessing(
@@ -167,14 +557,230 @@ class ExcelGeoDataFrameLoader:
         self, df: DataFrame, post_processing_config: PostProcessingConfig
     ):
         """Run post-processing step on the dataframe, such as formatting the address
-        and adding Latitude and Longitude so it can be converted to GeoDataFrame."""
-        df[LATITUDE_COLUMN_NAME] = df.apply(label_latitude, axis=1)
-        df[LONGITUDE_COLUMN_NAME] = df.apply(label_longitude, axis=1)
-        df[
-            post_processing_config.address_formatting.normalized_address_output_column_name
-        ] = df.apply(
-            label_siteaddress, config=post_processing_config.address_formatting, axis=1
+        and adding Latitude and Longitude so it can be converted to GeoDataFrame.
+
+        Each geocode response not parsed yet is parsed once into the
+        GEOCODE_RESULT_COLUMNS, and the raw response is dropped afterward unless
+        keep_raw_geocode is set."""
+        for column_name, dtype in GEOCODE_RESULT_COLUMNS.items():
+            if column_name not in df:
+                df[column_name] = pd.Series(index=df.index, dtype=dtype)
+            else:
+                df[column_name] = df[column_name].astype(dtype)
+
+        to_parse = (
+            df[GEOCODE_COLUMN_NAME].notna() & df[FORMATTED_ADDRESS_COLUMN_NAME].isna()
+        )
+        if to_parse.any():
+            parsed = parse_geocode_responses(df.loc[to_parse, GEOCODE_COLUMN_NAME])
+            for column_name in GEOCODE_RESULT_COLUMNS:
+                # keep values already present, e.g. coordinates loaded from the cache
+                df.loc[to_parse, column_name] = df.loc[to_parse, column_name].fillna(
+                    parsed[column_name]
+                )
+            logger.debug(f"Parsed {to_parse.sum()} geocode responses")
+
+        address_formatting = post_processing_config.address_formatting
+        site_address_column_name = (
+            address_formatting.normalized_address_output_column_name
         )
+        df[site_address_column_name] = df[site_address_column_name].astype(object)
+        to_format = (
+            df[site_address_column_name].isna()
+            & df[FORMATTED_ADDRESS_COLUMN_NAME].notna()
+        )
+        if to_format.any():
+            df.loc[to_format, site_address_column_name] = format_site_address(
+                df.loc[to_format, FORMATTED_ADDRESS_COLUMN_NAME], address_formatting
+            )
+
+        if not post_processing_config.keep_raw_geocode:
+            df[GEOCODE_COLUMN_NAME] = None
+
+    def geocode_new_rows(
+        self,
+        df: DataFrame,
+        config: ExcelGeoDataFrameConfig,
+        checkpoint: Optional[GeocodeCheckpoint] = None,
+    ):
+        """Geocode and post-process inplace the rows of a DataFrame that was never
+        geocoded, e.g. freshly read from the Excel sheet after preprocessing.
+        Rows with a latitude already set are not geocoded. The geocoding resumes from
+        and is recorded to the checkpoint if provided."""
+        site_address_column_name = config.post_processing.address_formatting.normalized_address_output_column_name
+        for column_name in (
+            GEOCODE_COLUMN_NAME,
+            LATITUDE_COLUMN_NAME,
+            LONGITUDE_COLUMN_NAME,
+            site_address_column_name,
+        ):
+            if column_name not in df:
+                df[column_name] = numpy.nan
+
+        with metrics.stage(f"excel.{config.label}.geocode", rows_in=len(df)):
+            self.add_geolocation_data(df, config.geocode_column_name, checkpoint)
+        with metrics.stage(f"excel.{config.label}.post_processing", rows_in=len(df)):
+            self.do_post_processing(df, config.post_processing)
+
+    def to_geodataframe(
+        self, df: DataFrame, config: ExcelGeoDataFrameConfig
+    ) -> GeoDataFrame:
+        """Convert the geocoded DataFrame to GeoDataFrame of points."""
+        return gpd.GeoDataFrame(
+            df,
+            geometry=gpd.points_from_xy(
+                df[LONGITUDE_COLUMN_NAME],
+                df[LATITUDE_COLUMN_NAME],
+            ),
+            crs=config.post_processing.output_crs,
+        )
+
+    def load_chunks(
+        self,
+        config: ExcelGeoDataFrameConfig,
+        input_file_path: str,
+        chunk_size: int,
+    ) -> Iterator[GeoDataFrame]:
+        """Convert the provided excel file to GeoDataFrame chunk_size rows at a time,
+        geocoding each chunk before reading the next one. The cache of the Excel file
+        is neither read nor written, the geocode_cache avoids geocoding the same
+        address again, and the geocode checkpoint resumes a stopped run.
+
+        Args:
+            config: Configuration for the Excel File to load into GeoDataFrame
+            input_file_path: Base file path to look for all input files.
+            chunk_size: Number of rows of the Excel sheet to read at a time.
+
+        Returns:
+            Iterator of the GeoDataFrame of each chunk, including Global Coordinate
+            System data for the address.
+        """
+        excel_file_to_load = os.path.join(input_file_path, config.file_name)
+        if not os.path.exists(excel_file_to_load):
+            raise ValueError(f"Excel file '{excel_file_to_load}' is missing!")
+
+        # head limits the rows of the whole sheet, not of each chunk
+        preprocessing = [
+            step for step in config.preprocessing if step.processing_type != "head"
+        ]
+        row_limits = [
+            int(step.data[0])
+            for step in config.preprocessing
+            if step.processing_type == "head"
+        ]
+        remaining_rows = min(row_limits) if row_limits else None
+
+        checkpoint = self.get_checkpoint(config.label)
+        for df in read_excel_chunks(excel_file_to_load, config.sheet_name, chunk_size):
+            df = self.do_preprocessing(df, preprocessing)
+            if remaining_rows is not None:
+                df = df.head(remaining_rows)
+                remaining_rows -= len(df)
+            if not df.empty:
+                self.geocode_new_rows(df, config, checkpoint)
+                yield self.to_geodataframe(df, config)
+            if remaining_rows == 0:
+                break
+        # Every chunk is geocoded, a new run starts over
+        if checkpoint is not None:
+            checkpoint.remove()
+
+    def read_excel(
+        self, excel_file_to_load: str, config: ExcelGeoDataFrameConfig
+    ) -> DataFrame:
+        """Read the sheet of the Excel file and run the preprocessing steps on it."""
+        with metrics.stage(f"excel.{config.label}.read_excel") as stage:
+            logger.debug(f"Loaded excel file '{excel_file_to_load}'")
+            excel_file = pd.ExcelFile(excel_file_to_load)
+            df = pd.read_excel(excel_file, config.sheet_name)
+            stage.rows_out = len(df)
+        with metrics.stage(
+            f"excel.{config.label}.preprocessing", rows_in=len(df)
+        ) as stage:
+            df = self.do_preprocessing(df, config.preprocessing)
+            stage.rows_out = len(df)
+        return df
+
+    def merge_new_or_changed_rows(
+        self, df: DataFrame, source_df: DataFrame, config: ExcelGeoDataFrameConfig
+    ) -> Tuple[DataFrame, pd.Series]:
+        """Merge the rows from the source Excel file into the cached DataFrame, matching
+        rows by config.key_column_name. Rows whose geocode_column_name changed take
+        the new source values and have their stale geocode result invalidated, and new
+        rows are appended at the end.
+
+        Args:
+            df: DataFrame loaded from the cache.
+            source_df: Preprocessed DataFrame loaded from the source Excel file.
+            config: Configuration for the Excel File being loaded.
+
+        Returns:
+            Merged DataFrame, boolean Series marking the new or changed rows, and the
+            rows without coordinates, e.g. a geocode request that failed, that need
+            to be geocoded.
+        """
+        key_column_name = config.key_column_name
+        address_column_name = config.geocode_column_name
+        if key_column_name not in source_df or key_column_name not in df:
+            raise ValueError(
+                f"key_column_name '{key_column_name}' is missing from the "
+                f"Excel file or the cache for label '{config.label}'"
+            )
+        source_keys = get_comparable_keys(source_df[key_column_name])
+        if source_keys.duplicated().any():
+            logger.warning(
+                f"Duplicate values in key_column_name '{key_column_name}' of "
+                f"'{config.file_name}', only the last entry is kept"
+            )
+            is_last = ~source_keys.duplicated(keep="last")
+            source_df, source_keys = source_df[is_last], source_keys[is_last]
+
+        source_by_key = source_df.drop(columns=key_column_name).set_index(
+            source_keys.rename(key_column_name)
+        )
+        df = df.reset_index(drop=True)
+        df_keys = get_comparable_keys(df[key_column_name])
+        in_source = df_keys.isin(source_by_key.index)
+        source_addresses = df_keys[in_source].map(source_by_key[address_column_name])
+        changed = pd.Series(False, index=df.index)
+        changed[in_source] = address_hash(
+            df.loc[in_source, address_column_name]
+        ) != address_hash(source_addresses)
+
+        if changed.any():
+            changed_source_rows = source_by_key.loc[df_keys[changed]]
+            for column_name in source_by_key.columns:
+                df[column_name] = df[column_name].astype(object)
+                df.loc[changed, column_name] = changed_source_rows[column_name].values
+            geocode_result_column_names = [
+                GEOCODE_COLUMN_NAME,
+                *GEOCODE_RESULT_COLUMNS,
+                config.post_processing.address_formatting.normalized_address_output_column_name,
+            ]
+            for column_name in geocode_result_column_names:
+                if column_name in df:
+                    df[column_name] = df[column_name].astype(object)
+                    df.loc[changed, column_name] = None
+
+        # Rows whose geocode failed on a previous run are geocoded again
+        not_geocoded = pd.Series(False, index=df.index)
+        if LATITUDE_COLUMN_NAME in df:
+            not_geocoded = ~changed & df[LATITUDE_COLUMN_NAME].isna()
+
+        new_rows = source_df[~source_keys.isin(df_keys)]
+        new_or_changed = pd.concat(
+            [
+                changed | not_geocoded,
+                pd.Series(True, index=range(len(df), len(df) + len(new_rows))),
+            ]
+        )
+        df = pd.concat([df, new_rows], ignore_index=True)
+        logger.info(
+            f"Loaded {len(new_rows)} new and {changed.sum()} changed rows "
+            f"from '{config.file_name}', {not_geocoded.sum()} rows to geocode again, "
+            f"{len(df) - new_or_changed.sum()} rows unchanged"
+        )
+        return df, new_or_changed
 
     def load(
         self,
@@ -191,6 +797,10 @@ class ExcelGeoDataFrameLoader:
             input_file_path: Base file path to look for all input files.
             output_file_path: Base file path to save all output files.
 
+        The response of every geocode request is checkpointed until the cache is
+        saved, so a run stopped while geocoding resumes without requesting the same
+        addresses again.
+
         Returns:
             GeoDataFrame of the provided excel sheet, including Global Coordinate System data for
             the address.
@@ -204,59 +814,81 @@ class ExcelGeoDataFrameLoader:
             )
             raise ValueError(f"Excel file '{excel_file_to_load}' is missing!")
 
-        cache_file_path = os.path.join(output_file_path, get_cache_name(config.label))
+        cache_file_path = os.path.join(
+            output_file_path, get_cache_name(config.label, config.cache_format)
+        )
+        excel_cache_file_path = os.path.join(
+            output_file_path, get_cache_name(config.label)
+        )
+        checkpoint = self.get_checkpoint(config.label)
+        cache_to_load = None
         if os.path.exists(cache_file_path):
+            cache_to_load = (cache_file_path, config.cache_format)
+        elif os.path.exists(excel_cache_file_path):
+            # Migrate from the Excel cache written before switching cache_format
+            cache_to_load = (excel_cache_file_path, "excel")
+
+        if cache_to_load:
             logger.debug(
-                f"Loading excel file {excel_file_to_load} from cache {cache_file_path}"
+                f"Loading excel file {excel_file_to_load} from cache {cache_to_load[0]}"
             )
 
-            excel_file = pd.ExcelFile(cache_file_path)
-            df = pd.read_excel(excel_file, config.sheet_name)
+            with metrics.stage(f"excel.{config.label}.read_cache") as stage:
+                df = read_cache(*cache_to_load, config.sheet_name)
+                stage.rows_out = len(df)
 
             if config.load_new_data:
                 print(f"Merging additional data from {excel_file_to_load}")
-                source_intake_form_excel = pd.ExcelFile(excel_file_to_load)
-                source_intake_form_dataframe = pd.read_excel(
-                    source_intake_form_excel, config.sheet_name
-                )
-
-                source_intake_form_dataframe = self.do_preprocessing(
-                    source_intake_form_dataframe, config.preprocessing
+                source_intake_form_dataframe = self.read_excel(
+                    excel_file_to_load, config
                 )
 
-                df = df.combine_first(source_intake_form_dataframe)
-
-                self.add_geolocation_data(df, config.geocode_column_name)
-                self.do_post_processing(df, config.post_processing)
+                if config.key_column_name:
+                    with metrics.stage(f"excel.{config.label}.merge") as stage:
+                        df, new_or_changed = self.merge_new_or_changed_rows(
+                            df, source_intake_form_dataframe, config
+                        )
+                        delta = df[new_or_changed].copy()
+                        stage.rows_out = len(delta)
+                    with metrics.stage(
+                        f"excel.{config.label}.geocode", rows_in=len(delta)
+                    ):
+                        self.add_geolocation_data(
+                            delta, config.geocode_column_name, checkpoint
+                        )
+                    df = pd.concat([df[~new_or_changed], delta]).sort_index()
+                else:
+                    df = df.combine_first(source_intake_form_dataframe)
+                    with metrics.stage(
+                        f"excel.{config.label}.geocode", rows_in=len(df)
+                    ):
+                        self.add_geolocation_data(
+                            df, config.geocode_column_name, checkpoint
+                        )
+
+                # Only rows without parsed geocode results are post-processed
+                with metrics.stage(
+                    f"excel.{config.label}.post_processing", rows_in=len(df)
+                ):
+                    self.do_post_processing(df, config.post_processing)
         else:
-            logger.debug(f"Loaded excel file '{excel_file_to_load}'")
-            excel_file = pd.ExcelFile(excel_file_to_load)
-            df = pd.read_excel(excel_file, config.sheet_name)
-
-            df = self.do_preprocessing(df, config.preprocessing)
-
-            df[GEOCODE_COLUMN_NAME] = numpy.nan
-            df[LATITUDE_COLUMN_NAME] = numpy.nan
-            df[LONGITUDE_COLUMN_NAME] = numpy.nan
-            df[
-                config.post_processing.address_formatting.normalized_address_output_column_name
-            ] = numpy.nan
-
-            self.add_geolocation_data(df, config.geocode_column_name)
-            self.do_post_processing(df, config.post_processing)
+            df = self.read_excel(excel_file_to_load, config)
+            self.geocode_new_rows(df, config, checkpoint)
 
-        gdf = gpd.GeoDataFrame(
-            df,
-            geometry=gpd.points_from_xy(
-                df[LONGITUDE_COLUMN_NAME],
-                df[LATITUDE_COLUMN_NAME],
-            ),
-            crs=config.post_processing.output_crs,
-        )
+        gdf = self.to_geodataframe(df, config)
 
         logger.debug(
             f"Saving GeoDataFrame for excel file {excel_file_to_load} to cache {cache_file_path}"
         )
-        Path(output_file_path).mkdir(parents=True, exist_ok=True)
-        gdf.to_excel(cache_file_path, sheet_name=config.sheet_name, index=False)
+        with metrics.stage(f"excel.{config.label}.write_cache", rows_in=len(gdf)):
+            Path(output_file_path).mkdir(parents=True, exist_ok=True)
+            write_cache(gdf, cache_file_path, config.cache_format, config.sheet_name)
+            if config.export_excel and config.cache_format != "excel":
+                logger.debug(
+                    f"Exporting human readable copy to {excel_cache_file_path}"
+                )
+                write_cache(gdf, excel_cache_file_path, "excel", config.sheet_name)
+        # The responses are saved in the cache now
+        if checkpoint is not None:
+            checkpoint.remove()
         return gdf
@@ -0,0 +1,171 @@
+"""Persistent geocode cache shared across labels, configurations and runs."""
+
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from disaster_damage_assessment_lookup.utils.address import normalize_address
+
+logger = logging.getLogger(__name__)
+
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class GeocodeCache:
+    """SQLite backed key value store of the raw geocode response, keyed by the
+    normalized address that was looked up."""
+
+    def __init__(
+        self,
+        file_path: str,
+        ttl_in_days: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        """
+        Args:
+            file_path: Path of the SQLite database file, created if missing.
+            ttl_in_days: Entries older than this are ignored and purged.
+                Never expire if None.
+            max_entries: Least recently used entries are evicted once the cache
+                holds more than this many entries. Unbounded if None.
+        """
+        self.file_path = file_path
+        self.ttl_in_seconds = ttl_in_days * _SECONDS_PER_DAY if ttl_in_days else None
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(file_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS geocode_cache ("
+                "address_key TEXT PRIMARY KEY, "
+                "response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "last_accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS geocode_cache_last_accessed_at "
+                "ON geocode_cache (last_accessed_at)"
+            )
+        self.purge_expired()
+        logger.info(f"Opened geocode cache {file_path} with {len(self)} entries")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM geocode_cache"
+            ).fetchone()[0]
+
+    def _expired_before(self, now: float) -> float:
+        if self.ttl_in_seconds is None:
+            return float("-inf")
+        return now - self.ttl_in_seconds
+
+    def get(self, address: str) -> Optional[str]:
+        """Returns the cached raw geocode response for the given address, or None."""
+        return self.get_many([address]).get(address)
+
+    def get_many(self, addresses: Iterable[str]) -> Dict[str, str]:
+        """Look up multiple addresses at once.
+
+        Args:
+            addresses: Addresses to look up.
+
+        Returns:
+            Dictionary of address as key and cached raw geocode response as value,
+            only containing the addresses found in the cache.
+        """
+        keys = {address: normalize_address(address) for address in addresses}
+        if not keys:
+            return {}
+        now = time.time()
+        unique_keys = list(set(keys.values()))
+        responses = {}
+        with self._lock, self._connection:
+            # Stay well below SQLite's limit on the number of bound parameters
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                responses.update(
+                    self._connection.execute(
+                        "SELECT address_key, response FROM geocode_cache "
+                        f"WHERE address_key IN ({placeholders}) AND created_at >= ?",
+                        (*batch, self._expired_before(now)),
+                    ).fetchall()
+                )
+            self._connection.executemany(
+                "UPDATE geocode_cache SET last_accessed_at = ? WHERE address_key = ?",
+                [(now, key) for key in responses],
+            )
+
+        result = {
+            address: responses[key] for address, key in keys.items() if key in responses
+        }
+        self.hits += len(result)
+        self.misses += len(keys) - len(result)
+        return result
+
+    def put(self, address: str, response: str):
+        """Store the raw geocode response for the given address."""
+        self.put_many({address: response})
+
+    def put_many(self, responses: Dict[str, Optional[str]]):
+        """Store multiple raw geocode responses, skipping empty responses so that
+        failed lookups are retried on the next run.
+
+        Args:
+            responses: Dictionary of address as key and raw geocode response as value.
+        """
+        now = time.time()
+        rows = [
+            (normalize_address(address), response, now, now)
+            for address, response in responses.items()
+            if response
+        ]
+        if not rows:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO geocode_cache "
+                "(address_key, response, created_at, last_accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        self.evict()
+
+    def purge_expired(self):
+        """Delete every entry older than the configured TTL."""
+        if self.ttl_in_seconds is None:
+            return
+        with self._lock, self._connection:
+            deleted = self._connection.execute(
+                "DELETE FROM geocode_cache WHERE created_at < ?",
+                (self._expired_before(time.time()),),
+            ).rowcount
+        if deleted:
+            logger.info(f"Purged {deleted} expired entries from the geocode cache")
+
+    def evict(self):
+        """Delete the least recently used entries above the configured max_entries."""
+        if self.max_entries is None:
+            return
+        with self._lock, self._connection:
+            deleted = self._connection.execute(
+                "DELETE FROM geocode_cache WHERE address_key IN ("
+                "SELECT address_key FROM geocode_cache "
+                "ORDER BY last_accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        if deleted:
+            logger.debug(f"Evicted {deleted} entries from the geocode cache")
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._connection.close()
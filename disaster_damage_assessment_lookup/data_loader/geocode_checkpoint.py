@@ -0,0 +1,131 @@
+"""Append only checkpoint of the geocode responses of a label, so a run stopped while
+geocoding resumes without requesting the same addresses again."""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodeCheckpoint:
+    """JSON Lines file of the address and raw geocode response of every completed
+    geocode request of a label, null when the address was not found.
+
+    The responses are buffered and appended to the file every flush_every_rows
+    responses or flush_interval_in_seconds, whichever comes first, and synced to the
+    disk so they survive a crash. Failed requests are not recorded, so they are sent
+    again on the next run. The file is removed once the geocoded label is saved.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        flush_every_rows: int = 100,
+        flush_interval_in_seconds: float = 10.0,
+    ):
+        """
+        Args:
+            file_path: Path of the checkpoint file, created on the first flush.
+            flush_every_rows: Number of buffered responses triggering a flush.
+            flush_interval_in_seconds: Seconds since the last flush triggering
+                a flush.
+        """
+        self.file_path = file_path
+        self.flush_every_rows = max(flush_every_rows, 1)
+        self.flush_interval_in_seconds = flush_interval_in_seconds
+        self._buffer: List[str] = []
+        self._previous_responses: Optional[Dict[str, Optional[str]]] = None
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Optional[str]]:
+        """Read the responses saved by a previous run.
+
+        Returns:
+            Dictionary of address as key and raw geocode response as value, None
+            when the address was not found. A line cut short by a crash is skipped.
+        """
+        responses = {}
+        if not os.path.exists(self.file_path):
+            return responses
+        with open(self.file_path, encoding="utf-8") as file:
+            for line_number, line in enumerate(file, start=1):
+                try:
+                    entry = json.loads(line)
+                    responses[entry["address"]] = entry["response"]
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(
+                        f"Skipping unreadable line {line_number} of geocode "
+                        f"checkpoint {self.file_path}"
+                    )
+        logger.info(
+            f"Loaded {len(responses)} geocode responses from checkpoint "
+            f"{self.file_path}"
+        )
+        return responses
+
+    def get_many(self, addresses: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Returns the response saved by a previous run of each of the addresses,
+        only containing the addresses found in the checkpoint. The file is read on
+        the first call only."""
+        if self._previous_responses is None:
+            self._previous_responses = self.load()
+        responses = self._previous_responses
+        return {
+            address: responses[address]
+            for address in addresses
+            if isinstance(address, str) and address in responses
+        }
+
+    def add(self, address: str, response: Optional[str]):
+        """Record the response of a completed geocode request, flushing the buffered
+        responses when due."""
+        line = json.dumps({"address": address, "response": response})
+        with self._lock:
+            self._buffer.append(line)
+            if (
+                len(self._buffer) >= self.flush_every_rows
+                or time.monotonic() - self._last_flush >= self.flush_interval_in_seconds
+            ):
+                self._flush()
+
+    def flush(self):
+        """Append the buffered responses to the file and sync it to the disk."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        Path(self.file_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(self.file_path, "a+b") as file:
+            # Start on a new line after a line cut short by a crash
+            prefix = b""
+            if file.tell() > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    prefix = b"\n"
+            file.write(prefix + "\n".join(self._buffer).encode("utf-8") + b"\n")
+            file.flush()
+            os.fsync(file.fileno())
+        logger.debug(
+            f"Saved {len(self._buffer)} geocode responses to checkpoint "
+            f"{self.file_path}"
+        )
+        self._buffer.clear()
+
+    def remove(self):
+        """Delete the checkpoint file and the buffered responses, once the responses
+        are saved along with the geocoded label."""
+        with self._lock:
+            self._buffer.clear()
+            self._previous_responses = None
+            if os.path.exists(self.file_path):
+                os.remove(self.file_path)
+                logger.debug(f"Removed geocode checkpoint {self.file_path}")
@@ -0,0 +1,201 @@
+"""Concurrent geocoding engine with a shared token-bucket rate limit."""
+
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from geopy.exc import (
+    GeocoderQuotaExceeded,
+    GeocoderRateLimited,
+    GeocoderTimedOut,
+    GeocoderUnavailable,
+    GeopyError,
+)
+from geopy.location import Location
+
+from disaster_damage_assessment_lookup.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying with backoff. GoogleV3 raises GeocoderQuotaExceeded when the
+# provider returns OVER_QUERY_LIMIT, and GeocoderRateLimited on HTTP 429.
+RETRYABLE_GEOCODER_ERRORS = (
+    GeocoderQuotaExceeded,
+    GeocoderRateLimited,
+    GeocoderTimedOut,
+    GeocoderUnavailable,
+)
+
+
+class TokenBucket:
+    """Thread safe token bucket shared by every worker making geocode requests."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: Number of tokens added to the bucket per second.
+            capacity: Maximum number of tokens the bucket can hold, which is the
+                largest burst allowed. Default to one second worth of tokens.
+        """
+        if rate <= 0:
+            raise ValueError(f"Token bucket rate must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+    def pause(self, seconds: float):
+        """Drain the bucket so that no worker sends a request for the given seconds.
+
+        Used when the provider tells us we are over the query limit, since every
+        worker shares the same quota.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class ConcurrentGeocoder:
+    """Geocoder that keeps multiple requests in flight on a thread pool while
+    respecting a shared requests per second limit."""
+
+    def __init__(
+        self,
+        geocode: Callable,
+        max_concurrent_requests: int = 8,
+        requests_per_second: float = 10.0,
+        max_retries: int = 5,
+        backoff_base_in_seconds: float = 1.0,
+        backoff_max_in_seconds: float = 60.0,
+    ):
+        """
+        Args:
+            geocode: Function taking an address and returning a geopy Location or None.
+            max_concurrent_requests: Number of requests in flight at the same time.
+            requests_per_second: Shared rate limit across all of the workers.
+            max_retries: Number of retries for a request failing with a retryable error.
+            backoff_base_in_seconds: Initial backoff, doubled after every retry.
+            backoff_max_in_seconds: Upper bound for a single backoff.
+        """
+        self._geocode = geocode
+        self.max_concurrent_requests = max(1, max_concurrent_requests)
+        self.bucket = TokenBucket(requests_per_second)
+        self.max_retries = max_retries
+        self.backoff_base_in_seconds = backoff_base_in_seconds
+        self.backoff_max_in_seconds = backoff_max_in_seconds
+
+    def geocode(self, address: str):
+        """Geocode a single address, retrying with exponential backoff when the
+        provider is throttling us.
+
+        Returns:
+            geopy Location, or None if nothing was found or the request failed.
+        """
+        return self.request(address)[0]
+
+    def request(self, address: str) -> Tuple[Optional[Location], bool]:
+        """Geocode a single address like geocode, telling a failed request apart from
+        an address that was not found.
+
+        Returns:
+            geopy Location or None, and whether the request completed, False if it
+            failed.
+        """
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            metrics.increment("geocode.requests")
+            try:
+                location = self._geocode(address)
+                if not location:
+                    metrics.increment("geocode.not_found")
+                return location, True
+            except RETRYABLE_GEOCODER_ERRORS as e:
+                if attempt >= self.max_retries:
+                    metrics.increment("geocode.errors")
+                    logger.error(
+                        f"Giving up geocode for address: {address} after "
+                        f"{attempt} retries, e: {e}"
+                    )
+                    return None, False
+                backoff = min(
+                    self.backoff_max_in_seconds,
+                    self.backoff_base_in_seconds * (2**attempt),
+                )
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after:
+                    backoff = max(backoff, retry_after)
+                # Jitter so the workers do not all retry at the same instant
+                backoff *= random.uniform(1.0, 1.5)
+                logger.warning(
+                    f"Geocode throttled for address: {address}, "
+                    f"backing off {backoff:.2f} seconds, e: {e}"
+                )
+                self.bucket.pause(backoff)
+                metrics.increment("geocode.retries")
+                attempt += 1
+            except GeopyError as e:
+                metrics.increment("geocode.errors")
+                logger.error(
+                    "Exception occurred while querying geocode for address: "
+                    f"{address}, e: {e}"
+                )
+                return None, False
+
+    def geocode_all(
+        self,
+        addresses: Iterable[str],
+        on_result: Optional[Callable[[str, Optional[str]], None]] = None,
+    ) -> Dict[str, Optional[str]]:
+        """Geocode all of the given addresses concurrently.
+
+        Args:
+            addresses: Addresses to geocode, duplicates are only requested once.
+            on_result: Function called with the address and the raw geocode response
+                of each completed request, e.g. to checkpoint it. Optional.
+
+        Returns:
+            Dictionary of address as key and the raw geocode response serialized
+            as JSON as value, or None if nothing was found.
+        """
+        unique_addresses = list(dict.fromkeys(addresses))
+        progress = metrics.progress("Geocoding", len(unique_addresses))
+        result = {}
+        executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrent_requests,
+            thread_name_prefix="geocoder",
+        )
+        try:
+            for address, (location, completed) in zip(
+                unique_addresses, executor.map(self.request, unique_addresses)
+            ):
+                result[address] = json.dumps(location.raw) if location else None
+                if completed and on_result is not None:
+                    on_result(address, result[address])
+                progress.update()
+        finally:
+            # Do not send the queued requests when stopped midway, e.g. by Ctrl-C
+            executor.shutdown(wait=True, cancel_futures=True)
+        return result
@@ -0,0 +1,258 @@
+"""Helper for loading GeoJSON file into GeoDataFrame, with a columnar conversion cache."""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import geopandas as gpd
+import shapely
+from geopandas import GeoDataFrame, GeoSeries
+
+from disaster_damage_assessment_lookup.data_loader.schema.geojson import (
+    GeoJSONGeoDataFrameConfig,
+    RegionOfInterestConfig,
+)
+from disaster_damage_assessment_lookup.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# file extension for each of the supported cache_format
+CACHE_FILE_EXTENSIONS = {
+    "parquet": "parquet",
+    "feather": "feather",
+}
+
+
+# CRS of the GeoJSON coordinates, per RFC 7946
+GEOJSON_CRS = 4326
+
+# CRS of the buffer around the extent of a region of interest, same as the matchers
+REGION_BUFFER_CRS = 3857
+
+
+def get_where_clause(region: RegionOfInterestConfig) -> Optional[str]:
+    """Returns the OGR SQL attribute filter of the region of interest."""
+    clauses = []
+    if region.filter_column_name and region.filter_values is not None:
+        values = ", ".join(
+            "'{}'".format(str(value).replace("'", "''"))
+            for value in region.filter_values
+        )
+        column_name = region.filter_column_name.replace('"', '""')
+        clauses.append(f'"{column_name}" IN ({values})')
+    if region.where:
+        clauses.append(f"({region.where})")
+    return " AND ".join(clauses) or None
+
+
+def get_region_geometry(
+    gdf: GeoDataFrame, buffer_meter: float, use_mask: bool
+) -> Optional[shapely.Geometry]:
+    """Returns the area within buffer_meter of the geometries of gdf, or of their
+    bounding box unless use_mask, in GeoJSON coordinates. None if gdf has no
+    geometry."""
+    geometries = gdf.geometry.dropna()
+    geometries = geometries[~geometries.is_empty].to_crs(REGION_BUFFER_CRS)
+    if geometries.empty:
+        return None
+    if use_mask:
+        region = shapely.union_all(geometries.buffer(buffer_meter).values)
+    else:
+        minx, miny, maxx, maxy = geometries.total_bounds
+        region = shapely.box(
+            minx - buffer_meter,
+            miny - buffer_meter,
+            maxx + buffer_meter,
+            maxy + buffer_meter,
+        )
+    return GeoSeries([region], crs=REGION_BUFFER_CRS).to_crs(GEOJSON_CRS).iloc[0]
+
+
+def get_read_options(
+    region: RegionOfInterestConfig, extent_gdf: Optional[GeoDataFrame] = None
+) -> Dict[str, Any]:
+    """Returns the bbox, mask and where options of gpd.read_file filtering the records
+    on the region of interest, so the records outside of it are never loaded.
+
+    Args:
+        region: Region of interest of the GeoJSON file.
+        extent_gdf: Data source of region.extent_of_label, if loaded.
+    """
+    read_options: Dict[str, Any] = {}
+    if region.bbox is not None:
+        if len(region.bbox) != 4:
+            raise ValueError(
+                "region_of_interest.bbox must be minx, miny, maxx, maxy, "
+                f"got {region.bbox}"
+            )
+        read_options["bbox"] = tuple(region.bbox)
+    if extent_gdf is not None:
+        geometry = get_region_geometry(
+            extent_gdf, float(region.buffer_meter or 0), region.use_mask
+        )
+        if geometry is None:
+            logger.warning(
+                f"{region.extent_of_label} has no geometry, not filtering on its extent"
+            )
+        else:
+            if "bbox" in read_options:
+                geometry = shapely.intersection(
+                    geometry, shapely.box(*read_options.pop("bbox"))
+                )
+            if region.use_mask:
+                read_options["mask"] = geometry
+            else:
+                read_options["bbox"] = tuple(geometry.bounds)
+    where = get_where_clause(region)
+    if where:
+        read_options["where"] = where
+    return read_options
+
+
+def get_cache_key(
+    file_name: str,
+    config: GeoJSONGeoDataFrameConfig,
+    read_options: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Returns a key identifying the given GeoJSON file content and read options,
+    so the cache is invalidated whenever the source file, the selected
+    columns or the region of interest change."""
+    stat = os.stat(file_name)
+    key = json.dumps(
+        {
+            "path": os.path.abspath(file_name),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "columns": config.columns,
+            "read_options": {
+                name: (
+                    hashlib.sha256(shapely.to_wkb(value)).hexdigest()
+                    if name == "mask"
+                    else value
+                )
+                for name, value in (read_options or {}).items()
+            },
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def get_cache_name(file_label: str, cache_key: str, cache_format: str) -> str:
+    """Returns the name of the conversion cache file for the given file_label."""
+    if cache_format not in CACHE_FILE_EXTENSIONS:
+        raise ValueError(
+            f"Unsupported cache_format '{cache_format}', "
+            f"must be one of {', '.join(CACHE_FILE_EXTENSIONS)}"
+        )
+    return (
+        f"{file_label}_geojson_cache_{cache_key}.{CACHE_FILE_EXTENSIONS[cache_format]}"
+    )
+
+
+class GeoJSONGeoDataFrameLoader:
+    """Helper class for loading GeoJSON file into GeoDataFrame."""
+
+    def read_cache(self, cache_file_path: str, cache_format: str) -> GeoDataFrame:
+        """Read the conversion cache, memory mapping the Arrow IPC file when possible."""
+        if cache_format == "feather":
+            return gpd.read_feather(cache_file_path, memory_map=True)
+        return gpd.read_parquet(cache_file_path)
+
+    def write_cache(self, gdf: GeoDataFrame, cache_file_path: str, cache_format: str):
+        """Write the conversion cache atomically, so an interrupted write is never
+        mistaken for a valid cache."""
+        temporary_file_path = f"{cache_file_path}.tmp"
+        if cache_format == "feather":
+            # Uncompressed Arrow IPC file can be memory mapped without copying
+            gdf.to_feather(temporary_file_path, compression="uncompressed")
+        else:
+            gdf.to_parquet(temporary_file_path)
+        os.replace(temporary_file_path, cache_file_path)
+
+    def remove_stale_cache(self, label: str, output_file_path: str, keep: str):
+        """Remove conversion cache files of the given label other than keep."""
+        for cache_file_path in glob.glob(
+            os.path.join(output_file_path, f"{glob.escape(label)}_geojson_cache_*")
+        ):
+            if os.path.abspath(cache_file_path) != os.path.abspath(keep):
+                logger.debug(f"Removing stale geojson cache {cache_file_path}")
+                os.remove(cache_file_path)
+
+    def read_file(
+        self,
+        file_name: str,
+        config: GeoJSONGeoDataFrameConfig,
+        read_options: Optional[Dict[str, Any]] = None,
+    ) -> GeoDataFrame:
+        """Parse the GeoJSON file, restricted to the configured columns and to the
+        records matching the read_options."""
+        with metrics.stage(f"geojson.{config.label}.read_file") as stage:
+            gdf = gpd.read_file(
+                filename=file_name, columns=config.columns, **(read_options or {})
+            )
+            stage.rows_out = len(gdf)
+        return gdf
+
+    def load(
+        self,
+        config: GeoJSONGeoDataFrameConfig,
+        input_file_path: str,
+        output_file_path: str,
+        read_options: Optional[Dict[str, Any]] = None,
+    ) -> Optional[GeoDataFrame]:
+        """Load the provided GeoJSON file into GeoDataFrame. When a cache_format is
+        configured, a columnar copy is saved to output_file_path on the first load
+        and used instead of parsing the GeoJSON until the source file changes.
+
+        Args:
+            config: Configuration for the GeoJSON File to load into GeoDataFrame.
+            input_file_path: Base file path to look for all input files.
+            output_file_path: Base file path to save all output files.
+            read_options: bbox, mask and where options of gpd.read_file returned by
+                get_read_options. Optional and will load every record if omitted.
+
+        Returns:
+            GeoDataFrame of the provided GeoJSON file.
+        """
+        file_name = os.path.join(input_file_path, config.file_name)
+        if not config.cache_format:
+            return self.read_file(file_name, config, read_options)
+
+        cache_file_path = os.path.join(
+            output_file_path,
+            get_cache_name(
+                config.label,
+                get_cache_key(file_name, config, read_options),
+                config.cache_format,
+            ),
+        )
+        if os.path.exists(cache_file_path):
+            logger.info(
+                f"Loading geojson file {file_name} from cache {cache_file_path}"
+            )
+            try:
+                with metrics.stage(f"geojson.{config.label}.read_cache") as stage:
+                    gdf = self.read_cache(cache_file_path, config.cache_format)
+                    stage.rows_out = len(gdf)
+                return gdf
+            except (OSError, ValueError) as e:
+                logger.warning(
+                    f"Failed to read geojson cache {cache_file_path}, "
+                    f"falling back to {file_name}, e: {e}"
+                )
+
+        gdf = self.read_file(file_name, config, read_options)
+        if gdf is not None:
+            logger.info(f"Saving geojson file {file_name} to cache {cache_file_path}")
+            Path(output_file_path).mkdir(parents=True, exist_ok=True)
+            with metrics.stage(f"geojson.{config.label}.write_cache", rows_in=len(gdf)):
+                self.write_cache(gdf, cache_file_path, config.cache_format)
+            self.remove_stale_cache(
+                config.label, output_file_path, keep=cache_file_path
+            )
+        return gdf
@@ -0,0 +1,249 @@
+"""Offline geocoder answering from the addresses and points of a loaded data source,
+e.g. the damage inspection records, before any request is sent to GoogleV3."""
+
+import bisect
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import shapely
+from geopandas import GeoDataFrame
+from geopy.location import Location
+
+from disaster_damage_assessment_lookup.utils import metrics
+from disaster_damage_assessment_lookup.utils.address import (
+    ParsedAddress,
+    parse_address,
+)
+
+logger = logging.getLogger(__name__)
+
+# location_type of the GoogleV3 response for an exact and an interpolated address
+ROOFTOP_LOCATION_TYPE = "ROOFTOP"
+RANGE_INTERPOLATED_LOCATION_TYPE = "RANGE_INTERPOLATED"
+
+
+def is_same_locality(address: ParsedAddress, record: ParsedAddress) -> bool:
+    """Whether the record can be in the same locality as the address, comparing the
+    ZIP codes and the cities when both of them have one."""
+    if address.zip_code and record.zip_code and address.zip_code != record.zip_code:
+        return False
+    if address.city and record.city and address.city != record.city:
+        return False
+    return True
+
+
+class LocalGeocoder:
+    """Geocoder with the same geocode method as GoogleV3, answering from the addresses
+    of a GeoDataFrame instead of calling the API.
+
+    The addresses are parsed into house number, street, unit, city and ZIP code and
+    indexed by house number and street. An address is found when a single record
+    address matches it, preferring the records with the same unit, and is returned
+    with the record address and point like a ROOFTOP GoogleV3 result. An address whose
+    house number is missing from the records is interpolated between the closest house
+    numbers on each side of the same street, like a RANGE_INTERPOLATED result.
+    """
+
+    def __init__(
+        self,
+        gdf: GeoDataFrame,
+        address_column_name: str = "SITEADDRESS",
+        interpolate: bool = True,
+        max_interpolation_gap: int = 100,
+    ):
+        """
+        Args:
+            gdf: Records with an address and a geometry, e.g. the damage inspection
+                records. The representative point of other geometries is used.
+            address_column_name: Name of the column with the address of each record.
+            interpolate: Whether to interpolate the house numbers missing from the
+                records.
+            max_interpolation_gap: Largest difference between the house numbers to
+                interpolate between.
+        """
+        if address_column_name not in gdf:
+            raise ValueError(
+                f"address_column_name '{address_column_name}' is missing from the "
+                "data of the local geocoder"
+            )
+        self.interpolate = interpolate
+        self.max_interpolation_gap = max_interpolation_gap
+
+        geometries = gdf.geometry
+        if geometries.crs is not None and not geometries.crs.equals("EPSG:4326"):
+            geometries = geometries.to_crs("EPSG:4326")
+        geometries = geometries.to_numpy()
+        is_point = shapely.get_type_id(geometries) == shapely.GeometryType.POINT
+        points = np.where(is_point, geometries, shapely.point_on_surface(geometries))
+        has_point = ~(shapely.is_missing(points) | shapely.is_empty(points))
+
+        self.addresses: List[str] = []
+        self.parsed_addresses: List[ParsedAddress] = []
+        self.coordinates: List[Tuple[float, float]] = []
+        self.by_key: Dict[str, List[int]] = defaultdict(list)
+        by_street: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for address, x, y in zip(
+            gdf[address_column_name].to_numpy()[has_point],
+            shapely.get_x(points[has_point]),
+            shapely.get_y(points[has_point]),
+        ):
+            if not isinstance(address, str):
+                continue
+            parsed = parse_address(address)
+            if parsed is None:
+                continue
+            position = len(self.addresses)
+            self.addresses.append(address)
+            self.parsed_addresses.append(parsed)
+            self.coordinates.append((y, x))
+            self.by_key[parsed.key].append(position)
+            by_street[parsed.street].append((parsed.number, position))
+        # House numbers of each street in ascending order, for the interpolation
+        self.by_street = {
+            street: sorted(numbers) for street, numbers in by_street.items()
+        }
+        logger.info(
+            f"Indexed {len(self.addresses)} addresses on {len(self.by_street)} "
+            "streets for the local geocoder"
+        )
+
+    def find(self, address: ParsedAddress) -> Optional[int]:
+        """Returns the position of the single record with the address, None if there
+        is none or several records with different addresses."""
+        candidates = [
+            position
+            for position in self.by_key.get(address.key, [])
+            if is_same_locality(address, self.parsed_addresses[position])
+        ]
+        # The records with the same unit, or without unit if the address has none,
+        # then the records with any unit, e.g. a unit missing from the records
+        same_unit = [
+            position
+            for position in candidates
+            if self.parsed_addresses[position].unit == address.unit
+        ]
+        candidates = same_unit or candidates
+        record_addresses = {self.addresses[position] for position in candidates}
+        if len(record_addresses) != 1:
+            if len(record_addresses) > 1:
+                metrics.increment("geocode.local_ambiguous")
+            return None
+        return candidates[0]
+
+    def find_neighbors(
+        self, address: ParsedAddress
+    ) -> Optional[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """Returns the house number and position of the closest records on each side
+        of the house number on the same street and locality, preferring the same side
+        of the street, None if the gap between them is over max_interpolation_gap."""
+        numbers = [
+            (number, position)
+            for number, position in self.by_street.get(address.street, [])
+            if is_same_locality(address, self.parsed_addresses[position])
+        ]
+        localities = {
+            (
+                self.parsed_addresses[position].city,
+                self.parsed_addresses[position].zip_code,
+            )
+            for _, position in numbers
+        }
+        if len(localities) != 1:
+            # Same street name in several cities and nothing to tell them apart
+            return None
+        same_side = [entry for entry in numbers if entry[0] % 2 == address.number % 2]
+        for entries in (same_side, numbers):
+            index = bisect.bisect_left(entries, (address.number, -1))
+            if 0 < index < len(entries) and entries[index][0] > address.number:
+                lower, upper = entries[index - 1], entries[index]
+                if upper[0] - lower[0] <= self.max_interpolation_gap:
+                    return lower, upper
+        return None
+
+    def interpolate_location(self, address: ParsedAddress) -> Optional[dict]:
+        """Returns the raw GoogleV3 like response of the address interpolated between
+        its neighbors on the street, None if it cannot be interpolated."""
+        neighbors = self.find_neighbors(address)
+        if neighbors is None:
+            return None
+        (lower_number, lower), (upper_number, upper) = neighbors
+        fraction = (address.number - lower_number) / (upper_number - lower_number)
+        (lower_lat, lower_lng), (upper_lat, upper_lng) = (
+            self.coordinates[lower],
+            self.coordinates[upper],
+        )
+        # Keep the city, state and ZIP code of the neighbor
+        _, _, locality = self.addresses[lower].partition(",")
+        formatted_address = f"{address.key},{locality}" if locality else address.key
+        return {
+            "formatted_address": formatted_address,
+            "geometry": {
+                "location": {
+                    "lat": lower_lat + fraction * (upper_lat - lower_lat),
+                    "lng": lower_lng + fraction * (upper_lng - lower_lng),
+                },
+                "location_type": RANGE_INTERPOLATED_LOCATION_TYPE,
+            },
+            "partial_match": True,
+            "source": "local_geocoder",
+        }
+
+    def locate(self, query: str) -> Optional[dict]:
+        """Returns the raw GoogleV3 like response of the address, None if not found."""
+        if not isinstance(query, str):
+            return None
+        address = parse_address(query)
+        if address is None:
+            return None
+        position = self.find(address)
+        if position is not None:
+            lat, lng = self.coordinates[position]
+            return {
+                "formatted_address": self.addresses[position],
+                "geometry": {
+                    "location": {"lat": lat, "lng": lng},
+                    "location_type": ROOFTOP_LOCATION_TYPE,
+                },
+                "partial_match": False,
+                "source": "local_geocoder",
+            }
+        if self.interpolate:
+            return self.interpolate_location(address)
+        return None
+
+    def geocode(self, query: str, **kwargs) -> Optional[Location]:
+        """Geocode the address like GoogleV3.geocode with exactly_one.
+
+        Returns:
+            geopy Location with a GoogleV3 like raw response, or None if not found.
+        """
+        raw = self.locate(query)
+        if raw is None:
+            return None
+        location = raw["geometry"]["location"]
+        return Location(
+            raw["formatted_address"], (location["lat"], location["lng"]), raw
+        )
+
+    def geocode_all(self, addresses: Iterable[str]) -> Dict[str, str]:
+        """Geocode all of the given addresses, each distinct address once.
+
+        Returns:
+            Dictionary of each address found as key and the raw response serialized
+            as JSON as value. The addresses not found are left out.
+        """
+        result = {}
+        interpolated_count = 0
+        for address in dict.fromkeys(addresses):
+            raw = self.locate(address)
+            if raw is not None:
+                result[address] = json.dumps(raw)
+                interpolated_count += (
+                    raw["geometry"]["location_type"] == RANGE_INTERPOLATED_LOCATION_TYPE
+                )
+        metrics.increment("geocode.local_hits", len(result) - interpolated_count)
+        metrics.increment("geocode.local_interpolated", interpolated_count)
+        return result
@@ -24,6 +24,16 @@ class DataLoaderConfig:
     output_file_path: Optional[str] = "output_data"
     """Base file path to save all output files."""
 
+    max_workers: Optional[int] = 1
+    """Number of data sources to load concurrently, e.g. parsing the geojson files
+    while the Excel files are being geocoded. Default to 1, loading one at a time."""
+
+    prune_columns: Optional[bool] = False
+    """Whether to only load the columns of the geojson files used by the matchers,
+    worked out from their join keys, key columns and saved columns. The geojson files
+    with a list of columns configured are loaded as configured. Default to False,
+    loading every column."""
+
     geodataframe_loader: Optional[ExcelGeoDataFrameLoaderConfig] = None
     """Configuration for the GeoDataFrame Loader."""
 
@@ -47,6 +47,11 @@ class PostProcessingConfig:
     output_crs: Optional[str] = "EPSG:4326"
     """Output Coordinate Reference System format for the GeoDataFrame. Default to EPSG:4236."""
 
+    keep_raw_geocode: Optional[bool] = True
+    """Whether or not to keep the raw JSON geocode response in the _geocode column after
+    it is parsed into the typed _latitude, _longitude, _formatted_address, _place_id,
+    _location_type and _partial_match columns. Default to True."""
+
 
 @dataclass
 class PreProcessingStepConfig:
@@ -80,6 +85,11 @@ class ExcelGeoDataFrameConfig:
     load_new_data: Optional[bool] = False
     """Whether or not new entry from the excel sheet should be loaded."""
 
+    key_column_name: Optional[str] = None
+    """Name of the column uniquely identifying each row, e.g. Intake #. When set,
+    load_new_data only geocodes the new rows and the rows whose geocode_column_name
+    changed since the cache was saved, instead of merging the whole sheet by position."""
+
     preprocessing: Optional[List[PreProcessingStepConfig]] = field(default_factory=list)
     """Preprocessing operations to run before running the geocoding operation.
     List of Dictionaries with key for the type of operation to run and value 
@@ -90,6 +100,71 @@ class ExcelGeoDataFrameConfig:
     )
     """Configuration for post processing steps to run after getting the geocode."""
 
+    cache_format: Optional[str] = "excel"
+    """Format of the cache file saved to the output_file_path, one of excel, parquet
+    or feather. The binary formats are much faster to read and write and keep the
+    geometry and column types. Default to excel."""
+
+    export_excel: Optional[bool] = False
+    """Whether or not to also save a human readable Excel copy of the cache when
+    cache_format is not excel. Default to False."""
+
+
+@dataclass
+class GeocodeCacheConfig:
+    """Configuration for the persistent geocode cache shared across labels and runs."""
+
+    file_path: str
+    """Path of the SQLite database file used to store the geocode responses."""
+
+    ttl_in_days: Optional[float] = None
+    """Number of days before a cached geocode response expires. Never expire if omitted."""
+
+    max_entries: Optional[int] = None
+    """Maximum number of cached geocode responses, least recently used entries
+    are evicted first. Unbounded if omitted."""
+
+
+@dataclass
+class GeocodeCheckpointConfig:
+    """Configuration for checkpointing the geocode responses while geocoding, so a run
+    stopped midway resumes without requesting the same addresses again."""
+
+    file_path: str
+    """Directory to save the checkpoint file of each label to."""
+
+    flush_every_rows: Optional[int] = 100
+    """Number of geocode responses to save to the checkpoint file at a time.
+    Default to 100."""
+
+    flush_interval_in_seconds: Optional[float] = 10.0
+    """Maximum seconds between two saves of the checkpoint file. Default to 10."""
+
+
+@dataclass
+class LocalGeocoderConfig:
+    """Configuration for geocoding the addresses found in a loaded geojson data source
+    before sending any request to GoogleV3."""
+
+    label: str
+    """Label of the geojson data source to geocode from, e.g. postfire_master_data.
+    It is loaded before the Excel files."""
+
+    address_column_name: Optional[str] = "SITEADDRESS"
+    """Name of the column with the address of each record. Default to SITEADDRESS."""
+
+    interpolate: Optional[bool] = True
+    """Whether to interpolate the house numbers missing from the data source between
+    the closest house numbers of the same street. Default to True."""
+
+    max_interpolation_gap: Optional[int] = 100
+    """Largest difference between the house numbers to interpolate between.
+    Default to 100."""
+
+    use_remote_geocoder: Optional[bool] = True
+    """Whether to geocode the addresses not found locally with GoogleV3. Set to False
+    to run offline, leaving those addresses without coordinates. Default to True."""
+
 
 @dataclass
 class ExcelGeoDataFrameLoaderConfig:
@@ -99,5 +174,37 @@ class ExcelGeoDataFrameLoaderConfig:
     """API Key used for making request to GoogleV3 API for geocoding information."""
 
     min_delay_between_requests_in_seconds: float = 0.5
-    """Minimum delay in seconds between Geocode request operation to prevent 
-    throttling by the provider service. Default to 0.5 seconds."""
+    """Minimum delay in seconds between Geocode request operation to prevent
+    throttling by the provider service. Default to 0.5 seconds.
+    Only used by the rate_limiter geocoder_type."""
+
+    geocoder_type: Optional[str] = "rate_limiter"
+    """Geocoding engine to use. rate_limiter makes one request at a time with
+    min_delay_between_requests_in_seconds in between, concurrent keeps
+    max_concurrent_requests in flight limited by requests_per_second.
+    Default to rate_limiter."""
+
+    max_concurrent_requests: Optional[int] = 8
+    """Number of geocode requests in flight at the same time for the concurrent
+    geocoder_type. Default to 8."""
+
+    requests_per_second: Optional[float] = 10.0
+    """Maximum geocode requests per second shared by all of the workers for the
+    concurrent geocoder_type. Default to 10."""
+
+    max_retries: Optional[int] = 5
+    """Number of retries with exponential backoff when the provider returns
+    OVER_QUERY_LIMIT for the concurrent geocoder_type. Default to 5."""
+
+    geocode_cache: Optional[GeocodeCacheConfig] = None
+    """Configuration for the persistent geocode cache consulted before any geocode
+    request. Optional and will not cache across runs if omitted."""
+
+    geocode_checkpoint: Optional[GeocodeCheckpointConfig] = None
+    """Configuration for checkpointing the geocode responses of each Excel file until
+    its cache is saved. Optional and will not resume a stopped run if omitted."""
+
+    local_geocoder: Optional[LocalGeocoderConfig] = None
+    """Configuration for geocoding from a loaded geojson data source first, only
+    sending the addresses not found to GoogleV3. Optional and will send every address
+    to GoogleV3 if omitted."""
@@ -5,6 +5,40 @@ from typing import List, Optional
 from marshmallow_dataclass import dataclass
 
 
+@dataclass
+class RegionOfInterestConfig:
+    """Region of interest of a GeoJSON file, so the records outside of it are
+    filtered out while reading the file instead of being loaded."""
+
+    bbox: Optional[List[float]] = None
+    """Bounding box to read, as minx, miny, maxx, maxy in longitude and latitude."""
+
+    extent_of_label: Optional[str] = None
+    """Label of another data source whose extent plus buffer_meter is the region to
+    read, e.g. the intake form or the fire perimeters. That data source is loaded
+    first. Ignored with a warning if the label is not loaded, e.g. by the lookup
+    server which does not load the Excel files."""
+
+    buffer_meter: Optional[float] = 0
+    """Distance around the extent of extent_of_label to read, in the same Web Mercator
+    meters as the distances of the matchers. Default to 0."""
+
+    use_mask: Optional[bool] = False
+    """Whether to read the records within buffer_meter of the geometries of
+    extent_of_label instead of their bounding box. Default to False, reading the
+    bounding box."""
+
+    filter_column_name: Optional[str] = None
+    """Column to filter on filter_values while reading, e.g. poly_IncidentName."""
+
+    filter_values: Optional[List[str]] = None
+    """Values of filter_column_name of the records to read, e.g. the incident names."""
+
+    where: Optional[str] = None
+    """Attribute filter in OGR SQL to apply while reading, e.g. DAMAGE <> 'No Damage'.
+    Combined with the filter_values if both are set."""
+
+
 @dataclass
 class GeoJSONGeoDataFrameConfig:
     """GeoJSON data loader configuration."""
@@ -18,3 +52,15 @@ class GeoJSONGeoDataFrameConfig:
 
     columns: Optional[List[str]] = None
     """Columns to select from the GeoJSON to output to GeoDataFrame."""
+
+    region_of_interest: Optional[RegionOfInterestConfig] = None
+    """Region of interest to filter the records on while reading the GeoJSON, by
+    bounding box, extent of another data source, or attribute values. Optional and
+    will load every record if omitted."""
+
+    cache_format: Optional[str] = None
+    """Format of the conversion cache saved to the output_file_path, one of parquet or
+    feather. The cache is keyed by the GeoJSON file path, modification time, size and
+    columns, and is used instead of parsing the GeoJSON until the file changes.
+    feather files are memory mapped when loaded. Optional and will always parse the
+    GeoJSON if omitted."""
@@ -4,15 +4,26 @@ import logging
 
 from dotenv import load_dotenv
 
-from disaster_damage_assessment_lookup.data_loader.data_loader import DataLoader
+from disaster_damage_assessment_lookup.data_loader.data_loader import (
+    DataLoader,
+    get_labels,
+)
 from disaster_damage_assessment_lookup.data_loader.schema.data_loader import (
     DataLoaderConfig,
 )
+from disaster_damage_assessment_lookup.matcher.column_usage import get_required_columns
 from disaster_damage_assessment_lookup.matcher.matcher import Matcher
 from disaster_damage_assessment_lookup.matcher.schema.matcher import (
     MatcherConfigWrapper,
 )
+from disaster_damage_assessment_lookup.result_writer.result_writer import ResultWriter
+from disaster_damage_assessment_lookup.result_writer.schema.result_writer import (
+    ResultWriterConfig,
+)
+from disaster_damage_assessment_lookup.utils import metrics
 from disaster_damage_assessment_lookup.utils.config_loader import load_himl_config
+from disaster_damage_assessment_lookup.utils.metrics import MetricsRecorder
+from disaster_damage_assessment_lookup.utils.schema.metrics import MetricsConfig
 
 logger = logging.getLogger(__name__)
 
@@ -28,24 +39,58 @@ def main():
     logger.info("Loaded configuration")
 
     # pylint: disable=E1101 # Suppress no member error for dynamic member
-    data_loader = DataLoader(
-        config=DataLoaderConfig.Schema().load(config["data_loader"])
+    metrics_config = MetricsConfig.Schema().load(
+        {
+            "file_path": f"{config['output_data_path']}/metrics",
+            **config.get("metrics", {}),
+        }
     )
-    logger.info("Initialized Data Loader")
+    recorder = MetricsRecorder.from_config(metrics_config)
+    metrics.set_recorder(recorder)
 
-    gdf_databases = data_loader.load()
-    logger.info("Loaded databases")
+    status = "failed"
+    try:
+        # pylint: disable=E1101 # Suppress no member error for dynamic member
+        matcher = Matcher(
+            config=MatcherConfigWrapper.Schema().load(
+                {
+                    "matcher": config["matcher"],
+                    "options": config.get("matcher_options", {}),
+                }
+            )
+        )
 
-    # pylint: disable=E1101 # Suppress no member error for dynamic member
-    matcher = Matcher(
-        config=MatcherConfigWrapper.Schema().load({"matcher": config["matcher"]})
-    )
+        # pylint: disable=E1101 # Suppress no member error for dynamic member
+        data_loader_config = DataLoaderConfig.Schema().load(config["data_loader"])
+        data_loader = DataLoader(
+            config=data_loader_config,
+            required_columns=get_required_columns(
+                matcher.config.matcher, get_labels(data_loader_config)
+            ),
+        )
+        logger.info("Initialized Data Loader")
 
-    logger.info("Running matchers")
-    matcher.run(
-        gdf_databases=gdf_databases,
-        output_file_path=config["output_data_path"],
-    )
+        gdf_databases = data_loader.load()
+        logger.info("Loaded databases")
+
+        # pylint: disable=E1101 # Suppress no member error for dynamic member
+        result_writer_config = ResultWriterConfig.Schema().load(
+            {
+                "output_file_path": config["output_data_path"],
+                **config.get("result_writer", {}),
+            }
+        )
+
+        logger.info("Running matchers")
+        with ResultWriter(config=result_writer_config) as result_writer:
+            matcher.run(gdf_databases=gdf_databases, result_writer=result_writer)
+            logger.info("Waiting for the results to be saved")
+        logger.info("Saved results")
+
+        status = "done"
+    finally:
+        recorder.close(status)
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,41 @@
 """Helper for fetching damage assessment data for the given address."""
 
 import logging
-import os
-from pathlib import Path
-from typing import Dict, Tuple
+from typing import Optional, Tuple
 
 from geopandas import GeoDataFrame
 
+from disaster_damage_assessment_lookup.matcher.dataset_registry import DatasetRegistry
 from disaster_damage_assessment_lookup.matcher.schema.matcher import MatcherConfig
+from disaster_damage_assessment_lookup.result_writer.result_writer import ResultWriter
+from disaster_damage_assessment_lookup.utils.address import (
+    canonicalize_addresses,
+    hash_address_keys,
+)
 
 logger = logging.getLogger(__name__)
 
+# column added to both sides with the canonical key of the address when canonical_key
+# is enabled and no address_key_column_name is configured
+DEFAULT_ADDRESS_KEY_COLUMN_NAME = "_address_key"
+
+
+def is_enabled(value: Optional[str]) -> bool:
+    """Whether the matcher_data_key_value option is set to true."""
+    return str(value).strip().lower() == "true"
+
 
 def match_by_address(
     config: MatcherConfig,
-    gdf_databases: Dict[str, GeoDataFrame],
-    output_file_path: str,
+    gdf_databases: DatasetRegistry,
+    result_writer: Optional[ResultWriter] = None,
 ) -> Tuple[GeoDataFrame, GeoDataFrame]:
     """Helper function for fetching damage assessment data for the given address.
 
     Args:
         config: Matcher configurations.
         gdf_databases: Database to check.
-        output_file_path: base path of the output file path, if saving the result.
+        result_writer: Writer to queue the result to, if saving the result.
 
     Returns:
         GeoDataFrame with matched data, GeoDataFrame with unmatched data
@@ -35,23 +48,50 @@ def match_by_address(
         )
 
     on_column_name = config.matcher_data_key_value["on_column_name"]
-    gdf = gdf_databases[config.source_data]
-    gdf = gdf.to_crs(3857)
-    gdf.dropna(subset=["geometry"], inplace=True)
-    gdf.dropna(subset=[on_column_name], inplace=True)
+    gdf = gdf_databases.to_crs(config.source_data, 3857)
+    gdf = gdf.dropna(subset=["geometry", on_column_name])
 
     postfire_master_data = gdf_databases[config.match_against_data]
+    join_column_name = on_column_name
+    if is_enabled(config.matcher_data_key_value.get("canonical_key")):
+        # Join both sides on the canonical key of their address instead
+        join_column_name = config.matcher_data_key_value.get(
+            "address_key_column_name", DEFAULT_ADDRESS_KEY_COLUMN_NAME
+        )
+        if join_column_name in gdf or join_column_name in postfire_master_data:
+            raise ValueError(
+                f"address_key_column_name '{join_column_name}' of matcher_type "
+                "by_address would overwrite a column of the source_data or "
+                "match_against_data, e.g. the key_column_name of the intake form"
+            )
+        keep_unit = is_enabled(config.matcher_data_key_value.get("keep_unit"))
+        hash_key = is_enabled(config.matcher_data_key_value.get("hash_key"))
+        source_keys = canonicalize_addresses(gdf[on_column_name], keep_unit)
+        if hash_key:
+            source_keys = hash_address_keys(source_keys)
+        gdf = gdf.assign(**{join_column_name: source_keys})
+        # Keep the address of the source as is and the address it matched suffixed
+        postfire_master_data = postfire_master_data.assign(
+            **{
+                join_column_name: gdf_databases.get_address_keys(
+                    config.match_against_data, on_column_name, keep_unit, hash_key
+                )
+            }
+        ).rename(
+            columns={on_column_name: f"{on_column_name}{config.column_suffix.right}"}
+        )
+
     address_matching_result = gdf.merge(
         postfire_master_data,
-        on=on_column_name,
+        on=join_column_name,
         how="inner",
         suffixes=(config.column_suffix.left, config.column_suffix.right),
     )
     unique_address_matched = address_matching_result.drop_duplicates(
-        subset=[on_column_name]
+        subset=[join_column_name]
     )
     address_matching_unmatched_result = gdf[
-        ~gdf[on_column_name].isin(unique_address_matched[on_column_name])
+        ~gdf[join_column_name].isin(unique_address_matched[join_column_name])
     ]
 
     logger.info(
@@ -59,13 +99,6 @@ def match_by_address(
         f"Total of {len(address_matching_result)} including duplicates."
     )
 
-    if config.save_file is not None:
-        Path(output_file_path).mkdir(parents=True, exist_ok=True)
-        save_file_path = os.path.join(output_file_path, config.save_file.file_name)
-        address_matching_result.to_excel(
-            save_file_path,
-            sheet_name=config.save_file.sheet_name,
-            index=config.save_file.include_index,
-            columns=config.save_file.columns,
-        )
+    if config.save_file is not None and result_writer is not None:
+        result_writer.save(config.save_file, address_matching_result)
     return address_matching_result, address_matching_unmatched_result
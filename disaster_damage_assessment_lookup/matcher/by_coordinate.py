@@ -1,28 +1,91 @@
 """Helper for fetching damage assessment data for the given coordinate."""
 
 import logging
-import os
-from pathlib import Path
-from typing import Dict, Tuple
+from typing import Optional, Tuple
 
+import numpy as np
+import pandas as pd
 from geopandas import GeoDataFrame
 
+from disaster_damage_assessment_lookup.matcher.dataset_registry import (
+    DatasetRegistry,
+    check_same_crs,
+)
 from disaster_damage_assessment_lookup.matcher.schema.matcher import MatcherConfig
+from disaster_damage_assessment_lookup.matcher.tiling import TilePool, sort_pairs
+from disaster_damage_assessment_lookup.result_writer.result_writer import ResultWriter
 
 logger = logging.getLogger(__name__)
 
 
+def join_nearest(
+    left: GeoDataFrame,
+    right: GeoDataFrame,
+    left_positions: np.ndarray,
+    right_positions: np.ndarray,
+    distances: np.ndarray,
+    distance_column_name: str,
+    lsuffix: str,
+    rsuffix: str,
+) -> GeoDataFrame:
+    """Join the rows of left with their nearest rows of right found by the spatial index,
+    with the same columns as GeoDataFrame.sjoin_nearest: the index of right is added as
+    index_<rsuffix>, overlapping column names get the lsuffix and rsuffix, and the
+    distance is added as distance_column_name.
+
+    Args:
+        left: Source GeoDataFrame.
+        right: GeoDataFrame to join, its geometry column is dropped.
+        left_positions: Position in left of each pair.
+        right_positions: Position in right of each pair.
+        distances: Distance between the geometries of each pair.
+        distance_column_name: Name of the distance column to add.
+        lsuffix: Suffix of the overlapping column names of left.
+        rsuffix: Suffix of the overlapping column names of right.
+
+    Returns:
+        GeoDataFrame with one row per pair, indexed by the index of left.
+    """
+    left_index_name = left.index.name
+    right = right.drop(columns=right.geometry.name)
+    right = right.rename_axis(
+        right.index.name if right.index.name is not None else f"index_{rsuffix}"
+    ).reset_index()
+
+    overlapping_column_names = set(left.columns) & set(right.columns)
+    left_joined = left.iloc[left_positions].rename(
+        columns={
+            column_name: f"{column_name}_{lsuffix}"
+            for column_name in overlapping_column_names
+            if column_name != left.geometry.name
+        }
+    )
+    right_joined = right.iloc[right_positions].rename(
+        columns={
+            column_name: f"{column_name}_{rsuffix}"
+            for column_name in overlapping_column_names
+        }
+    )
+    right_joined.index = left_joined.index
+    joined = pd.concat([left_joined, right_joined], axis=1)
+    joined[distance_column_name] = distances
+    joined.index.name = left_index_name
+    return GeoDataFrame(joined, geometry=left.geometry.name, crs=left.crs)
+
+
 def match_by_coordinate(
     config: MatcherConfig,
-    gdf_databases: Dict[str, GeoDataFrame],
-    output_file_path: str,
+    gdf_databases: DatasetRegistry,
+    result_writer: Optional[ResultWriter] = None,
+    tile_pool: Optional[TilePool] = None,
 ) -> Tuple[GeoDataFrame, GeoDataFrame]:
     """Helper function for fetching damage assessment data for the given coordinate.
 
     Args:
         config: Matcher configurations.
         gdf_databases: Database to check.
-        output_file_path: base path of the output file path, if saving the result.
+        result_writer: Writer to queue the result to, if saving the result.
+        tile_pool: Process pool to run the nearest query in tiles, if large enough.
 
     Returns:
         GeoDataFrame with matched data, GeoDataFrame with unmatched data
@@ -44,22 +107,43 @@ def match_by_coordinate(
             "matcher_type by_coordinate"
         )
 
-    gdf = gdf_databases[config.source_data]
-    gdf = gdf.to_crs(3857)
-
-    postfire_master_data = gdf_databases[config.match_against_data]
+    gdf = gdf_databases.to_crs(config.source_data, 3857)
+    postfire_master_data = gdf_databases.to_crs(config.match_against_data, gdf.crs)
+    check_same_crs(gdf, postfire_master_data)
     distance_column_name = config.matcher_data_key_value["distance_column_name"]
     max_match_distance_meter = int(
         config.matcher_data_key_value["max_match_distance_meter"]
     )
     key_column_name = config.matcher_data_key_value["key_column_name"]
 
-    coordinate_matching_result = gdf.sjoin_nearest(
+    if tile_pool is not None and tile_pool.is_sharded(len(gdf)):
+        left_positions, right_positions, distances = tile_pool.nearest(
+            gdf.geometry.to_numpy(),
+            postfire_master_data,
+            f"{config.match_against_data}_3857",
+            max_match_distance_meter,
+        )
+    else:
+        (left_positions, right_positions), distances = gdf_databases.get_sindex(
+            config.match_against_data, gdf.crs
+        ).nearest(
+            gdf.geometry.values,
+            return_all=True,
+            max_distance=max_match_distance_meter,
+            return_distance=True,
+        )
+        left_positions, right_positions, distances = sort_pairs(
+            left_positions, right_positions, distances
+        )
+    coordinate_matching_result = join_nearest(
+        gdf,
         postfire_master_data,
-        max_distance=max_match_distance_meter,
-        distance_col=distance_column_name,
-        rsuffix=config.column_suffix.right,
+        left_positions,
+        right_positions,
+        distances,
+        distance_column_name=distance_column_name,
         lsuffix=config.column_suffix.left,
+        rsuffix=config.column_suffix.right,
     )
 
     coordinate_matching_unmatched_result = gdf[
@@ -70,13 +154,6 @@ def match_by_coordinate(
         f"{len(coordinate_matching_result)} of {len(gdf)} records matched "
         f"by coordinate within {max_match_distance_meter} meter away."
     )
-    if config.save_file is not None:
-        Path(output_file_path).mkdir(parents=True, exist_ok=True)
-        save_file_path = os.path.join(output_file_path, config.save_file.file_name)
-        coordinate_matching_result.to_excel(
-            save_file_path,
-            sheet_name=config.save_file.sheet_name,
-            index=config.save_file.include_index,
-            columns=config.save_file.columns,
-        )
+    if config.save_file is not None and result_writer is not None:
+        result_writer.save(config.save_file, coordinate_matching_result)
     return coordinate_matching_result, coordinate_matching_unmatched_result
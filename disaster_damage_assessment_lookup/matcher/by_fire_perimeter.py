@@ -1,39 +1,41 @@
 """Helper for checking if a given coordinate is within a fire perimeter."""
 
 import logging
-import os
-from pathlib import Path
-from typing import Dict
+from typing import Optional
 
-import geopandas as gpd
 import numpy as np
+import shapely
 from geopandas import GeoDataFrame
 
+from disaster_damage_assessment_lookup.matcher.dataset_registry import (
+    DatasetRegistry,
+    check_same_crs,
+)
 from disaster_damage_assessment_lookup.matcher.schema.matcher import MatcherConfig
+from disaster_damage_assessment_lookup.matcher.tiling import TilePool, sort_pairs
+from disaster_damage_assessment_lookup.result_writer.result_writer import ResultWriter
 
 logger = logging.getLogger(__name__)
 
 
 def match_by_fire_perimeters(
     config: MatcherConfig,
-    gdf_databases: Dict[str, GeoDataFrame],
-    output_file_path: str,
+    gdf_databases: DatasetRegistry,
+    result_writer: Optional[ResultWriter] = None,
+    tile_pool: Optional[TilePool] = None,
 ) -> GeoDataFrame:
     """Helper function for checking if a given coordinate is within a fire perimeter
 
     Args:
         config: Matcher configurations.
         gdf_databases: Database to check.
-        output_file_path: base path of the output file path, if saving the result.
+        result_writer: Writer to queue the result to, if saving the result.
+        tile_pool: Process pool to run the spatial query in tiles, if large enough.
 
     Returns:
         source_data with fire perimeter information columns appended.
     """
     logger.info("Running match by fire perimeters")
-    perimeters = {}
-    fire_perimeter_database = gdf_databases[config.match_against_data]
-    fire_perimeter_database = fire_perimeter_database.to_crs(3857)
-
     if "incident_name" not in config.matcher_data_key_list:
         raise ValueError(
             "incident_name must be added in matcher_data_key_list "
@@ -46,97 +48,101 @@ def match_by_fire_perimeters(
             "matcher_type by_fire_perimeters"
         )
 
-    for incident_name in config.matcher_data_key_list["incident_name"]:
-        fire_perimeter = fire_perimeter_database.loc[
-            (fire_perimeter_database["poly_IncidentName"] == incident_name)
-        ]
-        perimeters[incident_name] = fire_perimeter
+    incident_names = config.matcher_data_key_list["incident_name"]
+    incident_column_name = config.matcher_data_key_value.get(
+        "incident_column_name", "poly_IncidentName"
+    )
+    n = config.matcher_data_key_value["max_distance_from_perimeter_meter"]
 
-    logger.info(
-        f"Loaded fire perimeters: {config.matcher_data_key_list['incident_name']}"
+    perimeters = gdf_databases.to_crs(config.match_against_data, 3857)
+    is_selected_perimeter = (
+        perimeters[incident_column_name].isin(incident_names).to_numpy()
     )
+    logger.info(f"Loaded fire perimeters: {incident_names}")
 
-    # Check inside of perimeter
-    # Assuming that no perimeters overlaps
-    gdf = gdf_databases[config.source_data]
-    gdf = gdf.to_crs(3857)
-    within_fire_perimeter = {}
+    gdf = gdf_databases.to_crs(config.source_data, 3857)
+    check_same_crs(gdf, perimeters)
     total_data_count = len(gdf)
     distance_from_fire_perimeter_column_label = "Distance from Fire Perimeter"
     fire_perimeter_column_label = "Fire Perimeter"
-    gdf[distance_from_fire_perimeter_column_label] = ""
-    gdf[fire_perimeter_column_label] = ""
-    for label, perimeter in perimeters.items():
-        points_in_perimeter = gpd.sjoin(perimeter, gdf, predicate="contains")
-        gdf[fire_perimeter_column_label] = np.where(
-            gdf["Intake #"].isin(points_in_perimeter["Intake #"]),
-            label,
-            gdf[fire_perimeter_column_label],
+
+    points = gdf.geometry.values
+    if tile_pool is not None and tile_pool.is_sharded(total_data_count):
+        # Each tile of points against the selected perimeters near it, in parallel
+        point_positions, perimeter_positions, is_inside, distances = tile_pool.dwithin(
+            gdf.geometry.to_numpy(),
+            perimeters,
+            f"{config.match_against_data}_3857",
+            float(n),
+            tree_positions=np.flatnonzero(is_selected_perimeter),
         )
-        gdf[distance_from_fire_perimeter_column_label] = np.where(
-            gdf["Intake #"].isin(points_in_perimeter["Intake #"]),
-            "Inside",
-            gdf[distance_from_fire_perimeter_column_label],
+    else:
+        # Single spatial query of every point against every selected perimeter
+        point_positions, perimeter_positions = sort_pairs(
+            *gdf_databases.get_sindex(config.match_against_data, 3857).query(
+                points, predicate="dwithin", distance=float(n)
+            )
         )
+        # The cached index covers every perimeter, keep the selected incidents only
+        is_selected_pair = is_selected_perimeter[perimeter_positions]
+        point_positions = point_positions[is_selected_pair]
+        perimeter_positions = perimeter_positions[is_selected_pair]
+        candidate_perimeters = perimeters.geometry.values[perimeter_positions]
+        candidate_points = points[point_positions]
+        is_inside = shapely.contains(candidate_perimeters, candidate_points)
+        distances = shapely.distance(candidate_perimeters, candidate_points)
+    incident_order = (
+        perimeters[incident_column_name]
+        .map({name: order for order, name in enumerate(incident_names)})
+        .to_numpy()[perimeter_positions]
+    )
+
+    # Overlapping perimeters are resolved by preferring the perimeter containing the
+    # point, then the closest perimeter, then the incident listed first in the config
+    ranking = np.lexsort((incident_order, distances, ~is_inside, point_positions))
+    matched_point_positions, first = np.unique(
+        point_positions[ranking], return_index=True
+    )
+    best = ranking[first]
+
+    fire_perimeter = np.full(total_data_count, "", dtype=object)
+    fire_perimeter[matched_point_positions] = perimeters[
+        incident_column_name
+    ].to_numpy()[perimeter_positions[best]]
+    distance_from_fire_perimeter = np.full(total_data_count, f">{n}m  ", dtype=object)
+    distance_from_fire_perimeter[matched_point_positions] = np.where(
+        is_inside[best], "Inside", f"<{n} m"
+    )
+    # The projected source_data is shared with the other matchers, so add the columns
+    # to a new GeoDataFrame instead of modifying it in place
+    gdf = gdf.assign(
+        **{
+            distance_from_fire_perimeter_column_label: distance_from_fire_perimeter,
+            fire_perimeter_column_label: fire_perimeter,
+        }
+    )
 
+    for label in incident_names:
+        in_incident = fire_perimeter == label
+        inside_count = (in_incident & (distance_from_fire_perimeter == "Inside")).sum()
         logger.info(
-            f"{len(points_in_perimeter)} of {total_data_count} entries "
+            f"{inside_count} of {total_data_count} entries "
             f"inside of fire perimeter {label}"
         )
-        within_fire_perimeter[label] = points_in_perimeter
-
-    # Check within n meter from the perimeter
-    within_n_meter_from_fire_perimeter = {}
-    n = config.matcher_data_key_value["max_distance_from_perimeter_meter"]
-    for label, perimeter in perimeters.items():
-        points_not_perimeters = gdf[
-            ~gdf["Intake #"].isin(within_fire_perimeter[label]["Intake #"])
-        ]
-
-        points_close_to_perimeter = gpd.sjoin(
-            perimeter,
-            points_not_perimeters,
-            predicate="dwithin",
-            distance=n,
-        )
-        gdf[fire_perimeter_column_label] = np.where(
-            gdf["Intake #"].isin(points_close_to_perimeter["Intake #"]),
-            label,
-            gdf[fire_perimeter_column_label],
-        )
-        gdf[distance_from_fire_perimeter_column_label] = np.where(
-            gdf["Intake #"].isin(points_close_to_perimeter["Intake #"]),
-            f"<{n} m",
-            gdf[distance_from_fire_perimeter_column_label],
-        )
-
         logger.info(
-            f"{len(points_close_to_perimeter)} of {total_data_count} entries "
+            f"{in_incident.sum() - inside_count} of {total_data_count} entries "
             f"within {n} meters "
             f"from the fire perimeter {label}"
         )
-        within_n_meter_from_fire_perimeter[label] = points_close_to_perimeter
 
     # Remaining are outside of the perimeter
     logger.info(
-        f"{len(gdf[gdf[fire_perimeter_column_label] == ''])} of {total_data_count} entries "
+        f"{total_data_count - len(matched_point_positions)} of {total_data_count} entries "
         f"more than {n} meters "
         f"from the fire perimeters"
     )
 
-    gdf[distance_from_fire_perimeter_column_label] = np.where(
-        gdf[fire_perimeter_column_label] == "",
-        f">{n}m  ",
-        gdf[distance_from_fire_perimeter_column_label],
-    )
-    if config.save_file is not None:
-        Path(output_file_path).mkdir(parents=True, exist_ok=True)
-        save_file_path = os.path.join(output_file_path, config.save_file.file_name)
-        gdf.to_excel(
-            save_file_path,
-            sheet_name=config.save_file.sheet_name,
-            index=config.save_file.include_index,
-            columns=config.save_file.columns,
-        )
+    if config.save_file is not None and result_writer is not None:
+        result_writer.save(config.save_file, gdf)
 
     return gdf
@@ -0,0 +1,225 @@
+"""Helper for fetching damage assessment data for an address that does not exactly match
+the address in the database, e.g. "ST" vs "STREET", a missing unit, or a typo."""
+
+import logging
+import re
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import pandas as pd
+from geopandas import GeoDataFrame
+
+from disaster_damage_assessment_lookup.matcher.dataset_registry import DatasetRegistry
+from disaster_damage_assessment_lookup.matcher.schema.matcher import MatcherConfig
+from disaster_damage_assessment_lookup.result_writer.result_writer import ResultWriter
+from disaster_damage_assessment_lookup.utils.address import normalize_addresses
+
+logger = logging.getLogger(__name__)
+
+# column added to the source data with the address of the best candidate
+MATCHED_ADDRESS_COLUMN_NAME = "_fuzzy_matched_address"
+
+_ZIP_CODE_PATTERN = re.compile(r"^\d{5}(-\d{4})?$")
+
+
+def get_trigrams(address: str) -> FrozenSet[str]:
+    """Returns the set of character trigrams of the padded address."""
+    padded = f"  {address} "
+    return frozenset(map("".join, zip(padded, padded[1:], padded[2:])))
+
+
+def get_blocking_keys(normalized_address: str) -> Tuple[Optional[str], Optional[str]]:
+    """Returns the house number and the ZIP code of the normalized address, used for
+    only comparing addresses that could possibly refer to the same parcel."""
+    tokens = normalized_address.split(" ")
+    house_number = tokens[0] if tokens[0][:1].isdigit() else None
+    zip_code = None
+    for token in reversed(tokens[1:]):
+        if _ZIP_CODE_PATTERN.match(token):
+            zip_code = token[:5]
+            break
+    return house_number, zip_code
+
+
+class FuzzyAddressIndex:
+    """Index over a list of addresses for finding the most similar address without
+    comparing every pair of addresses.
+
+    Addresses are blocked by house number and ZIP code, then the candidates in the
+    block are scored with the Dice coefficient of their character trigrams.
+    """
+
+    def __init__(self, addresses: pd.Series):
+        """
+        Args:
+            addresses: Series of addresses to index, without null values.
+        """
+        addresses = addresses.astype(str).drop_duplicates().reset_index(drop=True)
+        normalized_addresses = normalize_addresses(addresses)
+        self.addresses: List[str] = addresses.tolist()
+        self.normalized_addresses: List[str] = normalized_addresses.tolist()
+        self.by_normalized_address: Dict[str, int] = {
+            normalized: position
+            for position, normalized in reversed(
+                list(enumerate(self.normalized_addresses))
+            )
+        }
+        # trigrams are only computed for the addresses that end up being a candidate
+        self._trigrams: Dict[int, FrozenSet[str]] = {}
+
+        self.by_house_number_and_zip_code: Dict[Tuple[str, str], List[int]] = (
+            defaultdict(list)
+        )
+        self.by_house_number: Dict[str, List[int]] = defaultdict(list)
+        self.without_house_number: List[int] = []
+        for position, normalized in enumerate(self.normalized_addresses):
+            house_number, zip_code = get_blocking_keys(normalized)
+            if house_number is None:
+                self.without_house_number.append(position)
+                continue
+            self.by_house_number[house_number].append(position)
+            if zip_code is not None:
+                self.by_house_number_and_zip_code[(house_number, zip_code)].append(
+                    position
+                )
+
+    def get_trigrams(self, position: int) -> FrozenSet[str]:
+        """Returns the trigrams of the indexed address at the given position."""
+        trigrams = self._trigrams.get(position)
+        if trigrams is None:
+            trigrams = get_trigrams(self.normalized_addresses[position])
+            self._trigrams[position] = trigrams
+        return trigrams
+
+    def get_candidates(self, normalized_address: str) -> List[int]:
+        """Returns the position of the indexed addresses sharing a block with the
+        given normalized address."""
+        house_number, zip_code = get_blocking_keys(normalized_address)
+        if house_number is None:
+            return self.without_house_number
+        if zip_code is not None:
+            candidates = self.by_house_number_and_zip_code.get((house_number, zip_code))
+            if candidates:
+                return candidates
+        return self.by_house_number.get(house_number, [])
+
+    def find_best_matches(
+        self, normalized_addresses: pd.Series
+    ) -> Dict[str, Tuple[Optional[str], float]]:
+        """Find the most similar indexed address for each of the given addresses.
+
+        Args:
+            normalized_addresses: Addresses normalized with normalize_addresses.
+
+        Returns:
+            Dictionary of the normalized address as key, and the best matching address
+            and its similarity score between 0 and 1 as value, or None and 0 if there
+            is no candidate.
+        """
+        return {
+            normalized_address: self.find_best_match(normalized_address)
+            for normalized_address in normalized_addresses.unique()
+        }
+
+    def find_best_match(self, normalized_address: str) -> Tuple[Optional[str], float]:
+        """Find the most similar indexed address for a single normalized address."""
+        exact_position = self.by_normalized_address.get(normalized_address)
+        if exact_position is not None:
+            return self.addresses[exact_position], 1.0
+
+        trigrams = get_trigrams(normalized_address)
+        best_position, best_score = None, 0.0
+        for position in self.get_candidates(normalized_address):
+            candidate_trigrams = self.get_trigrams(position)
+            score = (
+                2
+                * len(trigrams & candidate_trigrams)
+                / (len(trigrams) + len(candidate_trigrams))
+            )
+            if score > best_score:
+                best_position, best_score = position, score
+        if best_position is None:
+            return None, 0.0
+        return self.addresses[best_position], best_score
+
+
+def match_by_fuzzy_address(
+    config: MatcherConfig,
+    gdf_databases: DatasetRegistry,
+    result_writer: Optional[ResultWriter] = None,
+) -> Tuple[GeoDataFrame, GeoDataFrame]:
+    """Helper function for fetching damage assessment data for the most similar address.
+
+    Args:
+        config: Matcher configurations.
+        gdf_databases: Database to check.
+        result_writer: Writer to queue the result to, if saving the result.
+
+    Returns:
+        GeoDataFrame with matched data, GeoDataFrame with unmatched data
+    """
+    logger.info("Running match by fuzzy address")
+    if "on_column_name" not in config.matcher_data_key_value:
+        raise ValueError(
+            "on_column_name must be added in matcher_data_key_value for "
+            "matcher_type by_fuzzy_address"
+        )
+
+    on_column_name = config.matcher_data_key_value["on_column_name"]
+    match_against_column_name = config.matcher_data_key_value.get(
+        "match_against_column_name", on_column_name
+    )
+    min_similarity_score = float(
+        config.matcher_data_key_value.get("min_similarity_score", 0.8)
+    )
+    score_column_name = config.matcher_data_key_value.get(
+        "score_column_name", "similarity_score"
+    )
+
+    gdf = gdf_databases.to_crs(config.source_data, 3857)
+    gdf = gdf.dropna(subset=["geometry", on_column_name])
+
+    postfire_master_data = gdf_databases[config.match_against_data]
+    index = FuzzyAddressIndex(postfire_master_data[match_against_column_name].dropna())
+    logger.info(f"Indexed {len(index.addresses)} addresses for fuzzy matching")
+
+    source_addresses = normalize_addresses(gdf[on_column_name])
+    best_matches = index.find_best_matches(source_addresses)
+    gdf = gdf.assign(
+        **{
+            MATCHED_ADDRESS_COLUMN_NAME: source_addresses.map(
+                {address: match[0] for address, match in best_matches.items()}
+            ),
+            score_column_name: source_addresses.map(
+                {address: match[1] for address, match in best_matches.items()}
+            ).astype(float),
+        }
+    )
+    is_matched = gdf[MATCHED_ADDRESS_COLUMN_NAME].notna() & (
+        gdf[score_column_name] >= min_similarity_score
+    )
+
+    fuzzy_address_matching_result = (
+        gdf[is_matched]
+        .merge(
+            postfire_master_data,
+            left_on=MATCHED_ADDRESS_COLUMN_NAME,
+            right_on=match_against_column_name,
+            how="inner",
+            suffixes=(config.column_suffix.left, config.column_suffix.right),
+        )
+        .drop(columns=[MATCHED_ADDRESS_COLUMN_NAME])
+    )
+    fuzzy_address_matching_unmatched_result = gdf[~is_matched].drop(
+        columns=[MATCHED_ADDRESS_COLUMN_NAME]
+    )
+
+    logger.info(
+        f"{is_matched.sum()} of {len(gdf)} records matched by fuzzy address "
+        f"with a similarity score of at least {min_similarity_score}. "
+        f"Total of {len(fuzzy_address_matching_result)} including duplicates."
+    )
+
+    if config.save_file is not None and result_writer is not None:
+        result_writer.save(config.save_file, fuzzy_address_matching_result)
+    return fuzzy_address_matching_result, fuzzy_address_matching_unmatched_result
@@ -0,0 +1,318 @@
+"""Helper for fetching damage assessment data with several strategies in a single
+matcher, e.g. by address, then by coordinate for the records left unmatched."""
+
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import shapely
+from geopandas import GeoDataFrame
+
+from disaster_damage_assessment_lookup.matcher.by_address import is_enabled
+from disaster_damage_assessment_lookup.matcher.by_coordinate import join_nearest
+from disaster_damage_assessment_lookup.matcher.by_fuzzy_address import (
+    FuzzyAddressIndex,
+)
+from disaster_damage_assessment_lookup.matcher.dataset_registry import (
+    DatasetRegistry,
+    check_same_crs,
+)
+from disaster_damage_assessment_lookup.matcher.schema.matcher import MatcherConfig
+from disaster_damage_assessment_lookup.matcher.tiling import TilePool, sort_pairs
+from disaster_damage_assessment_lookup.result_writer.result_writer import ResultWriter
+from disaster_damage_assessment_lookup.utils import metrics
+from disaster_damage_assessment_lookup.utils.address import (
+    canonicalize_addresses,
+    hash_address_keys,
+    normalize_addresses,
+)
+
+logger = logging.getLogger(__name__)
+
+# CRS of the distances of the strategies, in meters like the other matchers
+CASCADE_CRS = 3857
+
+# strategies supported in matcher_data_key_list strategies, in their usual order
+ADDRESS_STRATEGY = "address"
+COORDINATE_STRATEGY = "coordinate"
+FUZZY_ADDRESS_STRATEGY = "fuzzy_address"
+
+# pairs found by a strategy: source positions, reference positions, confidence and
+# distance of each pair
+Pairs = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def join_on_key(
+    source_positions: np.ndarray, source_keys: pd.Series, reference_keys: pd.Series
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the source and reference positions of every pair sharing the same
+    key, null keys matching nothing."""
+    source = pd.DataFrame(
+        {"key": source_keys.to_numpy(), "source_position": source_positions}
+    ).dropna(subset=["key"])
+    reference = pd.DataFrame(
+        {
+            "key": reference_keys.to_numpy(),
+            "reference_position": np.arange(len(reference_keys)),
+        }
+    ).dropna(subset=["key"])
+    pairs = source.merge(reference, on="key", how="inner")
+    return (
+        pairs["source_position"].to_numpy(dtype=np.int64),
+        pairs["reference_position"].to_numpy(dtype=np.int64),
+    )
+
+
+class CascadeMatcher:
+    """Strategies of a cascade matcher sharing the source data in EPSG:3857, the
+    reference data projected once with its spatial index and address keys, each
+    strategy only receiving the positions of the source rows still unmatched."""
+
+    def __init__(
+        self,
+        config: MatcherConfig,
+        gdf_databases: DatasetRegistry,
+        tile_pool: Optional[TilePool] = None,
+    ):
+        self.config = config
+        self.options = config.matcher_data_key_value or {}
+        self.gdf_databases = gdf_databases
+        self.tile_pool = tile_pool
+        self.gdf = gdf_databases.to_crs(config.source_data, CASCADE_CRS)
+        self.reference = gdf_databases.to_crs(config.match_against_data, self.gdf.crs)
+        check_same_crs(self.gdf, self.reference)
+
+    def get_strategy(self, name: str) -> Callable[[np.ndarray], Pairs]:
+        """Returns the function running the strategy of the given name.
+
+        Raises:
+            ValueError: If the strategy is unsupported or its options are missing.
+        """
+        strategies = {
+            ADDRESS_STRATEGY: self.match_address,
+            COORDINATE_STRATEGY: self.match_coordinate,
+            FUZZY_ADDRESS_STRATEGY: self.match_fuzzy_address,
+        }
+        if name not in strategies:
+            raise ValueError(
+                f"Unsupported strategy '{name}' for matcher_type cascade, must be one "
+                f"of {', '.join(strategies)}"
+            )
+        if name in (ADDRESS_STRATEGY, FUZZY_ADDRESS_STRATEGY):
+            if "on_column_name" not in self.options:
+                raise ValueError(
+                    "on_column_name must be added in matcher_data_key_value for "
+                    f"the {name} strategy of matcher_type cascade"
+                )
+        if name == COORDINATE_STRATEGY:
+            if "max_match_distance_meter" not in self.options:
+                raise ValueError(
+                    "max_match_distance_meter must be added in matcher_data_key_value "
+                    "for the coordinate strategy of matcher_type cascade"
+                )
+        return strategies[name]
+
+    def get_address_positions(self, positions: np.ndarray) -> np.ndarray:
+        """Returns the positions with an address in the on_column_name."""
+        addresses = self.gdf[self.options["on_column_name"]].to_numpy()[positions]
+        return positions[pd.notna(addresses)]
+
+    def match_address(self, positions: np.ndarray) -> Pairs:
+        """Match the source rows with the reference rows of the same address, or of
+        the same canonical key of their address when canonical_key is enabled, with a
+        confidence of 1."""
+        on_column_name = self.options["on_column_name"]
+        match_against_column_name = self.options.get(
+            "match_against_column_name", on_column_name
+        )
+        positions = self.get_address_positions(positions)
+        source_addresses = self.gdf[on_column_name].iloc[positions]
+        if is_enabled(self.options.get("canonical_key")):
+            keep_unit = is_enabled(self.options.get("keep_unit"))
+            hash_key = is_enabled(self.options.get("hash_key"))
+            source_keys = canonicalize_addresses(source_addresses, keep_unit)
+            if hash_key:
+                source_keys = hash_address_keys(source_keys)
+            reference_keys = self.gdf_databases.get_address_keys(
+                self.config.match_against_data,
+                match_against_column_name,
+                keep_unit,
+                hash_key,
+            )
+        else:
+            source_keys = source_addresses
+            reference_keys = self.reference[match_against_column_name]
+        source_positions, reference_positions = join_on_key(
+            positions, source_keys, reference_keys
+        )
+        return (
+            source_positions,
+            reference_positions,
+            np.ones(len(source_positions)),
+            np.full(len(source_positions), np.nan),
+        )
+
+    def match_coordinate(self, positions: np.ndarray) -> Pairs:
+        """Match the source rows with every nearest reference row within
+        max_match_distance_meter, with a confidence decreasing from 1 at the same
+        point to 0 at max_match_distance_meter."""
+        max_match_distance_meter = float(self.options["max_match_distance_meter"])
+        geometries = self.gdf.geometry.to_numpy()[positions]
+        has_geometry = ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+        positions, geometries = positions[has_geometry], geometries[has_geometry]
+
+        if self.tile_pool is not None and self.tile_pool.is_sharded(len(positions)):
+            input_positions, reference_positions, distances = self.tile_pool.nearest(
+                geometries,
+                self.reference,
+                f"{self.config.match_against_data}_3857",
+                max_match_distance_meter,
+            )
+        else:
+            (input_positions, reference_positions), distances = (
+                self.gdf_databases.get_sindex(
+                    self.config.match_against_data, self.gdf.crs
+                ).nearest(
+                    geometries,
+                    return_all=True,
+                    max_distance=max_match_distance_meter,
+                    return_distance=True,
+                )
+            )
+        confidences = np.clip(1 - distances / max_match_distance_meter, 0, 1)
+        return (
+            positions[input_positions],
+            reference_positions.astype(np.int64),
+            confidences,
+            distances,
+        )
+
+    def match_fuzzy_address(self, positions: np.ndarray) -> Pairs:
+        """Match the source rows with the reference rows of the most similar address,
+        with the similarity score as the confidence, at least min_similarity_score."""
+        on_column_name = self.options["on_column_name"]
+        match_against_column_name = self.options.get(
+            "match_against_column_name", on_column_name
+        )
+        min_similarity_score = float(self.options.get("min_similarity_score", 0.8))
+        positions = self.get_address_positions(positions)
+        reference_addresses = self.reference[match_against_column_name]
+        index = FuzzyAddressIndex(reference_addresses.dropna())
+        source_addresses = normalize_addresses(self.gdf[on_column_name].iloc[positions])
+        best_matches = index.find_best_matches(source_addresses)
+        matched_addresses = source_addresses.map(
+            {address: match[0] for address, match in best_matches.items()}
+        )
+        scores = source_addresses.map(
+            {address: match[1] for address, match in best_matches.items()}
+        ).astype(float)
+        is_matched = (
+            matched_addresses.notna() & (scores >= min_similarity_score)
+        ).to_numpy()
+        source_positions, reference_positions = join_on_key(
+            positions[is_matched],
+            matched_addresses[is_matched],
+            # Indexed as strings, see FuzzyAddressIndex
+            reference_addresses.astype(str).where(reference_addresses.notna()),
+        )
+        score_by_position = dict(zip(positions[is_matched], scores[is_matched]))
+        return (
+            source_positions,
+            reference_positions,
+            np.array([score_by_position[position] for position in source_positions]),
+            np.full(len(source_positions), np.nan),
+        )
+
+    def run(self, strategies: List[str]) -> Tuple[GeoDataFrame, GeoDataFrame]:
+        """Run the strategies in order on the source rows not matched by the previous
+        strategies.
+
+        Returns:
+            GeoDataFrame with a row per matched source and reference row pair,
+            GeoDataFrame with the source rows matched by no strategy.
+        """
+        strategy_functions = [self.get_strategy(name) for name in strategies]
+        method_column_name = self.options.get("method_column_name", "match_method")
+        confidence_column_name = self.options.get(
+            "confidence_column_name", "match_confidence"
+        )
+        distance_column_name = self.options.get("distance_column_name", "distance")
+
+        remaining = np.arange(len(self.gdf))
+        found: List[Pairs] = []
+        methods: List[np.ndarray] = []
+        matched_counts: Dict[str, int] = {}
+        for name, strategy in zip(strategies, strategy_functions):
+            with metrics.stage(
+                f"matcher.{self.config.label}.{name}", rows_in=len(remaining)
+            ) as stage:
+                pairs = strategy(remaining)
+                matched_positions = np.unique(pairs[0])
+                remaining = np.setdiff1d(remaining, matched_positions)
+                stage.rows_out = len(matched_positions)
+            found.append(pairs)
+            methods.append(np.full(len(pairs[0]), name, dtype=object))
+            matched_counts[name] = len(matched_positions)
+
+        source_positions, reference_positions, confidences, distances, methods = (
+            sort_pairs(
+                *(np.concatenate(arrays) for arrays in zip(*found)),
+                np.concatenate(methods),
+            )
+        )
+        matched_result = join_nearest(
+            self.gdf,
+            self.reference,
+            source_positions,
+            reference_positions,
+            distances,
+            distance_column_name=distance_column_name,
+            lsuffix=self.config.column_suffix.left,
+            rsuffix=self.config.column_suffix.right,
+        )
+        matched_result[method_column_name] = methods
+        matched_result[confidence_column_name] = confidences
+        unmatched_result = self.gdf.iloc[remaining]
+
+        logger.info(
+            f"{len(self.gdf) - len(remaining)} of {len(self.gdf)} records matched by "
+            + ", then ".join(
+                f"{name} ({count})" for name, count in matched_counts.items()
+            )
+            + f". Total of {len(matched_result)} including duplicates."
+        )
+        return matched_result, unmatched_result
+
+
+def match_by_cascade(
+    config: MatcherConfig,
+    gdf_databases: DatasetRegistry,
+    result_writer: Optional[ResultWriter] = None,
+    tile_pool: Optional[TilePool] = None,
+) -> Tuple[GeoDataFrame, GeoDataFrame]:
+    """Helper function for fetching damage assessment data with the strategies listed
+    in matcher_data_key_list strategies, in order, e.g. by address then by coordinate.
+
+    Args:
+        config: Matcher configurations.
+        gdf_databases: Database to check.
+        result_writer: Writer to queue the result to, if saving the result.
+        tile_pool: Process pool to run the nearest query in tiles, if large enough.
+
+    Returns:
+        GeoDataFrame with matched data, GeoDataFrame with unmatched data
+    """
+    logger.info("Running match by cascade")
+    strategies = (config.matcher_data_key_list or {}).get("strategies")
+    if not strategies:
+        raise ValueError(
+            "strategies must be added in matcher_data_key_list for matcher_type cascade"
+        )
+
+    matched_result, unmatched_result = CascadeMatcher(
+        config, gdf_databases, tile_pool
+    ).run(strategies)
+    if config.save_file is not None and result_writer is not None:
+        result_writer.save(config.save_file, matched_result)
+    return matched_result, unmatched_result
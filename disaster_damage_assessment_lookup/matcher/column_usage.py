@@ -0,0 +1,196 @@
+"""Analysis of the columns read from each label by the matchers, so the data sources
+can be loaded with only the columns the matcher chain uses."""
+
+from typing import Dict, Iterable, List, Optional, Set
+
+from disaster_damage_assessment_lookup.matcher.scheduler import (
+    build_dependency_graph,
+    get_execution_order,
+    get_input_labels,
+)
+from disaster_damage_assessment_lookup.matcher.schema.matcher import (
+    MatcherConfig,
+    SaveFileConfig,
+)
+
+GEOMETRY_COLUMN_NAME = "geometry"
+
+# columns added by match_by_fire_perimeters to the source data
+FIRE_PERIMETER_COLUMN_NAMES = {"Distance from Fire Perimeter", "Fire Perimeter"}
+
+
+class ColumnUsage:
+    """Columns used from each label, None meaning every column is used, e.g. when a
+    result is saved without a list of columns."""
+
+    def __init__(self):
+        self.columns: Dict[str, Optional[Set[str]]] = {}
+
+    def add(self, label: str, columns: Optional[Iterable[str]]):
+        """Mark the columns of the label as used, every column if columns is None."""
+        if not label:
+            return
+        if columns is None:
+            self.columns[label] = None
+        elif self.columns.setdefault(label, set()) is not None:
+            self.columns[label].update(columns)
+
+    def get(self, label: str) -> Optional[Set[str]]:
+        """Returns the columns used from the label, None if every column is used."""
+        return self.columns.get(label, set())
+
+
+def strip_suffix(columns: Optional[Set[str]], suffix: str) -> Optional[Set[str]]:
+    """Returns the columns of a join result along with the column names they come from
+    when suffixed on both sides, so the column is kept on both sides of the join and
+    keeps the suffixed name."""
+    if columns is None:
+        return None
+    stripped = set(columns)
+    if suffix:
+        stripped.update(
+            column_name[: -len(suffix)]
+            for column_name in columns
+            if column_name.endswith(suffix) and len(column_name) > len(suffix)
+        )
+    return stripped
+
+
+def union(*column_sets: Optional[Iterable[str]]) -> Optional[Set[str]]:
+    """Returns the union of the column sets, None if any of them is None."""
+    result = set()
+    for columns in column_sets:
+        if columns is None:
+            return None
+        result.update(columns)
+    return result
+
+
+def add_matcher_usage(
+    usage: ColumnUsage,
+    matcher: MatcherConfig,
+    matched_columns: Optional[Set[str]],
+    unmatched_columns: Optional[Set[str]],
+):
+    """Mark the columns the matcher reads from its source_data and match_against_data
+    to produce the given columns of its matched and unmatched results."""
+    key_value = matcher.matcher_data_key_value or {}
+    left_suffix = matcher.column_suffix.left if matcher.column_suffix else ""
+    right_suffix = matcher.column_suffix.right if matcher.column_suffix else ""
+    if matcher.matcher_type == "no_op":
+        usage.add(matcher.source_data, union(matched_columns, unmatched_columns))
+    elif matcher.matcher_type == "by_fire_perimeters":
+        usage.add(
+            matcher.source_data,
+            union(
+                None
+                if matched_columns is None
+                else matched_columns - FIRE_PERIMETER_COLUMN_NAMES,
+                [GEOMETRY_COLUMN_NAME],
+            ),
+        )
+        usage.add(
+            matcher.match_against_data,
+            [
+                key_value.get("incident_column_name", "poly_IncidentName"),
+                GEOMETRY_COLUMN_NAME,
+            ],
+        )
+    elif matcher.matcher_type in ("by_address", "by_fuzzy_address"):
+        # merge suffixes the overlapping column names as is
+        on_column_name = key_value.get("on_column_name")
+        usage.add(
+            matcher.source_data,
+            union(
+                strip_suffix(matched_columns, left_suffix),
+                unmatched_columns,
+                [on_column_name, GEOMETRY_COLUMN_NAME],
+            ),
+        )
+        usage.add(
+            matcher.match_against_data,
+            union(
+                strip_suffix(matched_columns, right_suffix),
+                [key_value.get("match_against_column_name", on_column_name)],
+            ),
+        )
+    elif matcher.matcher_type == "by_coordinate":
+        # join_nearest suffixes the overlapping column names with an underscore
+        usage.add(
+            matcher.source_data,
+            union(
+                strip_suffix(matched_columns, f"_{left_suffix}"),
+                unmatched_columns,
+                [key_value.get("key_column_name"), GEOMETRY_COLUMN_NAME],
+            ),
+        )
+        usage.add(
+            matcher.match_against_data,
+            union(
+                strip_suffix(matched_columns, f"_{right_suffix}"),
+                [GEOMETRY_COLUMN_NAME],
+            ),
+        )
+    elif matcher.matcher_type == "cascade":
+        # every strategy is joined with join_nearest, see by_coordinate
+        on_column_name = key_value.get("on_column_name")
+        usage.add(
+            matcher.source_data,
+            union(
+                strip_suffix(matched_columns, f"_{left_suffix}"),
+                unmatched_columns,
+                [on_column_name, GEOMETRY_COLUMN_NAME],
+            ),
+        )
+        usage.add(
+            matcher.match_against_data,
+            union(
+                strip_suffix(matched_columns, f"_{right_suffix}"),
+                [
+                    key_value.get("match_against_column_name", on_column_name),
+                    GEOMETRY_COLUMN_NAME,
+                ],
+            ),
+        )
+    else:
+        for label in get_input_labels(matcher):
+            usage.add(label, None)
+
+
+def get_required_columns(
+    matchers: Dict[str, MatcherConfig], available_labels: Iterable[str]
+) -> Dict[str, Optional[List[str]]]:
+    """Work out the columns of each loaded label used by the matcher chain, from the
+    join keys, key columns and saved columns of the matchers reading it directly or
+    through the results of other matchers.
+
+    Args:
+        matchers: Dictionary of matcher name as key and matcher configuration as value.
+        available_labels: Labels loaded before running any matcher.
+
+    Returns:
+        Dictionary of each loaded label as key and the sorted column names used by
+        the matchers as value, or None if every column is used, e.g. a result derived
+        from the label is saved without a list of columns, or if no matcher reads
+        the label.
+    """
+    available_labels = list(available_labels)
+    dependencies = build_dependency_graph(matchers, available_labels)
+    usage = ColumnUsage()
+    # Every reader of a label comes after the matcher writing it
+    for name in reversed(get_execution_order(dependencies)):
+        matcher = matchers[name]
+        if isinstance(matcher.save_file, SaveFileConfig):
+            usage.add(matcher.label, matcher.save_file.columns)
+        add_matcher_usage(
+            usage,
+            matcher,
+            usage.get(matcher.label),
+            usage.get(matcher.unmatched_label),
+        )
+
+    required_columns = {}
+    for label in available_labels:
+        columns = usage.get(label) if label in usage.columns else None
+        required_columns[label] = None if columns is None else sorted(columns - {None})
+    return required_columns
@@ -0,0 +1,207 @@
+"""Registry of the GeoDataFrame shared by the matchers, caching their reprojections,
+spatial indexes and address keys."""
+
+import logging
+import threading
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import pandas as pd
+from geopandas import GeoDataFrame
+from pyproj import CRS
+
+from disaster_damage_assessment_lookup.matcher.spatial_index import (
+    PackedHilbertRTree,
+    load_or_build,
+)
+from disaster_damage_assessment_lookup.utils.address import (
+    canonicalize_addresses,
+    hash_address_keys,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_crs_key(crs: Any) -> str:
+    """Returns a key identifying the given CRS, so that e.g. 3857 and "EPSG:3857"
+    share the same cache entry."""
+    return CRS.from_user_input(crs).to_wkt()
+
+
+def check_same_crs(left: GeoDataFrame, right: GeoDataFrame):
+    """Check that both sides of a spatial join share the same CRS.
+
+    Raises:
+        ValueError: If the CRS of the GeoDataFrame are missing or different.
+    """
+    if left.crs is None or right.crs is None or not left.crs.equals(right.crs):
+        raise ValueError(
+            f"Both sides of the spatial join must share the same CRS, "
+            f"got {left.crs} and {right.crs}"
+        )
+
+
+class DatasetRegistry(MutableMapping):
+    """Dictionary of label to GeoDataFrame that also remembers the reprojected copy of
+    each label per CRS, their spatial index and the canonical keys of their address
+    columns, so every matcher reading the same label does not compute them again.
+
+    The cached GeoDataFrame are shared by every reader and must not be modified in
+    place, use assign or copy instead. Overwriting a label invalidates its cache.
+    """
+
+    def __init__(
+        self,
+        datasets: Optional[Dict[str, GeoDataFrame]] = None,
+        spatial_index_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            datasets: Dictionary of label to GeoDataFrame to register. It is not copied,
+                so labels written to the registry are also written to it.
+            spatial_index_path: Directory to save the spatial index of the registered
+                datasets to, so the next run loads them instead of rebuilding them.
+                Labels written afterward, e.g. matcher results, are never saved.
+                Optional and will use the geopandas spatial index if omitted.
+        """
+        self.datasets: Dict[str, GeoDataFrame] = (
+            datasets if datasets is not None else {}
+        )
+        self.projected: Dict[Tuple[str, str], GeoDataFrame] = {}
+        self.spatial_index_path = spatial_index_path
+        self.spatial_indexes: Dict[Tuple[str, str], PackedHilbertRTree] = {}
+        self.address_keys: Dict[Tuple[str, str, bool, bool], pd.Series] = {}
+        self.saved_index_labels = set(self.datasets)
+        # labels whose cache is kept by the registry this one is an overlay of
+        self.parent: Optional["DatasetRegistry"] = None
+        self.inherited_labels = set()
+        self.lock = threading.RLock()
+
+    def __getitem__(self, label: str) -> GeoDataFrame:
+        return self.datasets[label]
+
+    def __setitem__(self, label: str, gdf: GeoDataFrame):
+        with self.lock:
+            self.invalidate(label)
+            self.datasets[label] = gdf
+
+    def __delitem__(self, label: str):
+        with self.lock:
+            self.invalidate(label)
+            del self.datasets[label]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.datasets)
+
+    def __len__(self) -> int:
+        return len(self.datasets)
+
+    def invalidate(self, label: str):
+        """Drop the cached reprojections, spatial indexes and address keys of the given
+        label."""
+        with self.lock:
+            self.saved_index_labels.discard(label)
+            self.inherited_labels.discard(label)
+            for cache in (self.projected, self.spatial_indexes, self.address_keys):
+                for key in [key for key in cache if key[0] == label]:
+                    del cache[key]
+
+    def to_crs(self, label: str, crs: Any) -> GeoDataFrame:
+        """Returns the GeoDataFrame of the given label in the given CRS, reprojecting it
+        only on the first call.
+
+        Args:
+            label: Label of the GeoDataFrame.
+            crs: Target CRS, in any format accepted by GeoDataFrame.to_crs.
+
+        Returns:
+            Shared GeoDataFrame in the given CRS that must not be modified in place.
+        """
+        if label in self.inherited_labels:
+            return self.parent.to_crs(label, crs)
+        with self.lock:
+            gdf = self.datasets[label]
+            if gdf.crs is not None and gdf.crs.equals(CRS.from_user_input(crs)):
+                return gdf
+            key = (label, get_crs_key(crs))
+            projected = self.projected.get(key)
+            if projected is None:
+                logger.debug(f"Reprojecting {label} to {crs}")
+                projected = gdf.to_crs(crs)
+                self.projected[key] = projected
+            return projected
+
+    def get_sindex(self, label: str, crs: Any):
+        """Returns the spatial index of the GeoDataFrame of the given label in the given
+        CRS, building it only on the first call. For the registered datasets it is
+        loaded from spatial_index_path when it was saved for the same content and CRS.
+
+        Returns:
+            PackedHilbertRTree or geopandas SpatialIndex, both answering query and
+            nearest with the same conventions.
+        """
+        if label in self.inherited_labels:
+            return self.parent.get_sindex(label, crs)
+        with self.lock:
+            gdf = self.to_crs(label, crs)
+            if self.spatial_index_path is None or label not in self.saved_index_labels:
+                # geopandas keeps the spatial index on the GeoDataFrame once built
+                return gdf.sindex
+            key = (label, get_crs_key(crs))
+            index = self.spatial_indexes.get(key)
+            if index is None:
+                index = load_or_build(
+                    label,
+                    gdf.geometry.to_numpy(),
+                    gdf.crs,
+                    self.spatial_index_path,
+                )
+                self.spatial_indexes[key] = index
+            return index
+
+    def get_address_keys(
+        self,
+        label: str,
+        column_name: str,
+        keep_unit: bool = False,
+        hash_key: bool = False,
+    ) -> pd.Series:
+        """Returns the canonical key of the addresses in the given column of the
+        GeoDataFrame of the given label, computing them only on the first call.
+
+        Args:
+            label: Label of the GeoDataFrame.
+            column_name: Name of the address column.
+            keep_unit: Whether to keep the unit in the key, see canonicalize_addresses.
+            hash_key: Whether to return the 64 bit hash of the keys instead.
+
+        Returns:
+            Shared Series of keys with the index of the GeoDataFrame, that must not be
+            modified in place.
+        """
+        if label in self.inherited_labels:
+            return self.parent.get_address_keys(label, column_name, keep_unit, hash_key)
+        with self.lock:
+            key = (label, column_name, keep_unit, hash_key)
+            keys = self.address_keys.get(key)
+            if keys is None:
+                logger.debug(f"Computing the address keys of {column_name} of {label}")
+                keys = canonicalize_addresses(
+                    self.datasets[label][column_name], keep_unit=keep_unit
+                )
+                if hash_key:
+                    keys = hash_address_keys(keys)
+                self.address_keys[key] = keys
+            return keys
+
+    def overlay(self, datasets: Dict[str, GeoDataFrame]) -> "DatasetRegistry":
+        """Returns a new registry with the given datasets on top of the datasets of this
+        registry, e.g. a single looked up address as the source of the matchers. The
+        labels it does not overwrite reuse the reprojections, spatial indexes and
+        address keys cached by this registry, and writing to the new registry never modifies this one.
+        """
+        registry = DatasetRegistry({**self.datasets, **datasets})
+        registry.saved_index_labels = set()
+        registry.parent = self
+        registry.inherited_labels = set(self.datasets) - set(datasets)
+        return registry
@@ -1,7 +1,7 @@
 """Helper for running matcher to look up the damage assessment data."""
 
 import logging
-from typing import Dict
+from typing import Dict, Optional, Tuple, Union
 
 from geopandas import GeoDataFrame
 
@@ -10,10 +10,23 @@ from disaster_damage_assessment_lookup.matcher.by_coordinate import match_by_coo
 from disaster_damage_assessment_lookup.matcher.by_fire_perimeter import (
     match_by_fire_perimeters,
 )
+from disaster_damage_assessment_lookup.matcher.by_fuzzy_address import (
+    match_by_fuzzy_address,
+)
+from disaster_damage_assessment_lookup.matcher.cascade import match_by_cascade
+from disaster_damage_assessment_lookup.matcher.dataset_registry import DatasetRegistry
 from disaster_damage_assessment_lookup.matcher.no_op import no_op_matcher
+from disaster_damage_assessment_lookup.matcher.scheduler import (
+    build_dependency_graph,
+    run_in_dependency_order,
+)
 from disaster_damage_assessment_lookup.matcher.schema.matcher import (
+    MatcherConfig,
     MatcherConfigWrapper,
 )
+from disaster_damage_assessment_lookup.matcher.tiling import TilePool
+from disaster_damage_assessment_lookup.result_writer.result_writer import ResultWriter
+from disaster_damage_assessment_lookup.utils import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -24,43 +37,116 @@ class Matcher:
     def __init__(self, config: MatcherConfigWrapper):
         self.config = config
 
+    def run_matcher(
+        self,
+        matcher: MatcherConfig,
+        gdf_databases: DatasetRegistry,
+        result_writer: Optional[ResultWriter] = None,
+        tile_pool: Optional[TilePool] = None,
+    ) -> Tuple[GeoDataFrame, GeoDataFrame]:
+        """Run a single matcher, running its spatial join in the tile_pool if given.
+
+        Returns:
+            GeoDataFrame to save as the matcher label, GeoDataFrame to save as
+            the matcher unmatched_label.
+        """
+        if matcher.matcher_type == "by_fire_perimeters":
+            result = match_by_fire_perimeters(
+                config=matcher,
+                gdf_databases=gdf_databases,
+                result_writer=result_writer,
+                tile_pool=tile_pool,
+            )
+            return result, result
+        if matcher.matcher_type == "by_address":
+            return match_by_address(
+                config=matcher,
+                gdf_databases=gdf_databases,
+                result_writer=result_writer,
+            )
+        if matcher.matcher_type == "by_coordinate":
+            return match_by_coordinate(
+                config=matcher,
+                gdf_databases=gdf_databases,
+                result_writer=result_writer,
+                tile_pool=tile_pool,
+            )
+        if matcher.matcher_type == "by_fuzzy_address":
+            return match_by_fuzzy_address(
+                config=matcher,
+                gdf_databases=gdf_databases,
+                result_writer=result_writer,
+            )
+        if matcher.matcher_type == "cascade":
+            return match_by_cascade(
+                config=matcher,
+                gdf_databases=gdf_databases,
+                result_writer=result_writer,
+                tile_pool=tile_pool,
+            )
+        if matcher.matcher_type == "no_op":
+            no_op_result = no_op_matcher(
+                config=matcher,
+                gdf_databases=gdf_databases,
+                result_writer=result_writer,
+            )
+            return no_op_result, no_op_result
+        raise ValueError(f"Unsupported matcher_type '{matcher.matcher_type}'")
+
     def run(
         self,
-        gdf_databases: Dict[str, GeoDataFrame],
-        output_file_path: str,
+        gdf_databases: Union[DatasetRegistry, Dict[str, GeoDataFrame]],
+        result_writer: Optional[ResultWriter] = None,
     ) -> None:
-        """Run the matchers and output the results to file."""
-
-        for matcher in self.config.matcher.values():
-            if matcher.matcher_type == "by_fire_perimeters":
-                result = match_by_fire_perimeters(
-                    config=matcher,
-                    gdf_databases=gdf_databases,
-                    output_file_path=output_file_path,
-                )
-                gdf_databases[matcher.label] = result
-                gdf_databases[matcher.unmatched_label] = result
-            elif matcher.matcher_type == "by_address":
-                matched_result, unmatched_result = match_by_address(
-                    config=matcher,
-                    gdf_databases=gdf_databases,
-                    output_file_path=output_file_path,
-                )
-                gdf_databases[matcher.label] = matched_result
-                gdf_databases[matcher.unmatched_label] = unmatched_result
-            elif matcher.matcher_type == "by_coordinate":
-                matched_result, unmatched_result = match_by_coordinate(
-                    config=matcher,
-                    gdf_databases=gdf_databases,
-                    output_file_path=output_file_path,
-                )
-                gdf_databases[matcher.label] = matched_result
-                gdf_databases[matcher.unmatched_label] = unmatched_result
-            elif matcher.matcher_type == "no_op":
-                no_op_result = no_op_matcher(
-                    config=matcher,
-                    gdf_databases=gdf_databases,
-                    output_file_path=output_file_path,
+        """Run the matchers and queue the results to the result_writer.
+
+        The matchers form a dependency graph through the labels they read and write.
+        Each matcher starts once the matchers writing its source_data and
+        match_against_data are done, running up to max_workers independent matchers
+        at the same time. Missing labels and cycles are reported before running
+        any matcher.
+
+        A plain dictionary is wrapped in a DatasetRegistry, so the reprojections and
+        spatial indexes are shared by the matchers, and still receives the results.
+
+        When process_workers is greater than 1, the spatial joins of a large enough
+        source data run in tiles on a pool of processes started for the run."""
+        if not isinstance(gdf_databases, DatasetRegistry):
+            gdf_databases = DatasetRegistry(
+                gdf_databases,
+                spatial_index_path=self.config.options.spatial_index_path,
+            )
+        matchers = self.config.matcher
+        dependencies = build_dependency_graph(matchers, gdf_databases.keys())
+
+        def run_step(name: str) -> Tuple[GeoDataFrame, GeoDataFrame]:
+            matcher = matchers[name]
+            with metrics.stage(
+                f"matcher.{name}", rows_in=len(gdf_databases[matcher.source_data])
+            ) as stage:
+                result = self.run_matcher(
+                    matcher, gdf_databases, result_writer, tile_pool
                 )
-                gdf_databases[matcher.label] = no_op_result
-                gdf_databases[matcher.unmatched_label] = no_op_result
+                stage.rows_out = len(result[0])
+                stage.attributes["matcher_type"] = matcher.matcher_type
+                if result[1] is not result[0]:
+                    stage.attributes["unmatched_rows"] = len(result[1])
+            return result
+
+        def on_step_done(name: str, result: Tuple[GeoDataFrame, GeoDataFrame]):
+            matched_result, unmatched_result = result
+            gdf_databases[matchers[name].label] = matched_result
+            gdf_databases[matchers[name].unmatched_label] = unmatched_result
+
+        options = self.config.options
+        with TilePool(
+            max_workers=options.process_workers,
+            tile_count=options.tile_count,
+            min_rows_per_tile=options.min_rows_per_tile,
+        ) as tile_pool:
+            run_in_dependency_order(
+                dependencies,
+                run_step=run_step,
+                on_step_done=on_step_done,
+                max_workers=options.max_workers,
+            )
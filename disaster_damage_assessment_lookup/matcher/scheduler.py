@@ -0,0 +1,150 @@
+"""Dependency aware scheduler for running the matchers concurrently."""
+
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Set
+
+from disaster_damage_assessment_lookup.matcher.schema.matcher import MatcherConfig
+
+logger = logging.getLogger(__name__)
+
+
+def get_input_labels(matcher: MatcherConfig) -> List[str]:
+    """Returns the labels read by the given matcher."""
+    return [
+        label for label in (matcher.source_data, matcher.match_against_data) if label
+    ]
+
+
+def get_output_labels(matcher: MatcherConfig) -> List[str]:
+    """Returns the labels written by the given matcher."""
+    return list(dict.fromkeys([matcher.label, matcher.unmatched_label]))
+
+
+def build_dependency_graph(
+    matchers: Dict[str, MatcherConfig], available_labels: Iterable[str]
+) -> Dict[str, Set[str]]:
+    """Build the dependency graph of the matchers from the labels they read and write.
+
+    Args:
+        matchers: Dictionary of matcher name as key and matcher configuration as value.
+        available_labels: Labels loaded before running any matcher.
+
+    Returns:
+        Dictionary of matcher name as key and the set of matcher names it depends on
+        as value.
+
+    Raises:
+        ValueError: If a label is written by more than one matcher, a label is neither
+            loaded nor written by any matcher, or the matchers depend on each other
+            in a cycle.
+    """
+    producers: Dict[str, str] = {}
+    for name, matcher in matchers.items():
+        for label in get_output_labels(matcher):
+            if label in producers:
+                raise ValueError(
+                    f"Label '{label}' is written by both matcher "
+                    f"'{producers[label]}' and matcher '{name}'"
+                )
+            producers[label] = name
+
+    available_labels = set(available_labels)
+    dependencies = {}
+    for name, matcher in matchers.items():
+        dependencies[name] = set()
+        for label in get_input_labels(matcher):
+            if label in producers:
+                dependencies[name].add(producers[label])
+            elif label not in available_labels:
+                raise ValueError(
+                    f"Label '{label}' used by matcher '{name}' is neither loaded by "
+                    "the DataLoader nor written by any matcher"
+                )
+
+    get_execution_order(dependencies)
+    return dependencies
+
+
+def get_execution_order(
+    dependencies: Dict[str, Set[str]], step_noun: str = "Matchers"
+) -> List[str]:
+    """Returns the step names in an order where every step comes after the steps it
+    depends on, keeping the configuration order otherwise.
+
+    Args:
+        dependencies: Dictionary of step name as key and the set of step names it
+            depends on as value.
+        step_noun: Plural noun naming the steps in the error message, e.g.
+            "Data sources". Default to "Matchers".
+
+    Raises:
+        ValueError: If the steps depend on each other in a cycle.
+    """
+    order = []
+    remaining = dict(dependencies)
+    while remaining:
+        ready = [
+            name
+            for name, depends_on in remaining.items()
+            if not depends_on.intersection(remaining)
+        ]
+        if not ready:
+            raise ValueError(
+                f"{step_noun} {', '.join(remaining)} depend on each other in a cycle"
+            )
+        order.append(ready[0])
+        del remaining[ready[0]]
+    return order
+
+
+def run_in_dependency_order(
+    dependencies: Dict[str, Set[str]],
+    run_step: Callable[[str], object],
+    on_step_done: Callable[[str, object], None],
+    max_workers: int = 1,
+    thread_name_prefix: str = "matcher",
+):
+    """Run every step once all of the steps it depends on are done, running up to
+    max_workers independent steps at the same time.
+
+    Args:
+        dependencies: Dependency graph returned by build_dependency_graph.
+        run_step: Function running the step with the given name on a worker thread.
+        on_step_done: Function called on the calling thread with the name and result
+            of each step as soon as it is done, before any step depending on it starts.
+        max_workers: Number of steps to run at the same time.
+        thread_name_prefix: Name prefix of the worker threads.
+    """
+    order = get_execution_order(dependencies)
+    if max_workers <= 1:
+        for name in order:
+            on_step_done(name, run_step(name))
+        return
+
+    done: Set[str] = set()
+    running = {}
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix=thread_name_prefix
+    ) as executor:
+        while len(done) < len(order):
+            for name in order:
+                if (
+                    name not in done
+                    and name not in running.values()
+                    and dependencies[name] <= done
+                ):
+                    logger.debug(f"Starting {thread_name_prefix} {name}")
+                    running[executor.submit(run_step, name)] = name
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            # Handle finished steps in configuration order to stay deterministic
+            for future in sorted(finished, key=lambda f: order.index(running[f])):
+                name = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception:
+                    for pending in running:
+                        pending.cancel()
+                    raise
+                on_step_done(name, result)
+                done.add(name)
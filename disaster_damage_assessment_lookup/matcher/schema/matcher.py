@@ -69,9 +69,45 @@ class MatcherConfig:
     """Configuration for the column suffix on merge operation."""
 
 
+@dataclass
+class MatcherOptionsConfig:
+    """Configuration for how the Matchers are run."""
+
+    max_workers: Optional[int] = 1
+    """Number of independent matchers to run at the same time. A matcher only starts
+    once the matchers writing its source_data and match_against_data are done.
+    Default to 1, running the matchers one at a time."""
+
+    process_workers: Optional[int] = 1
+    """Number of processes running the spatial joins of by_coordinate and
+    by_fire_perimeters. The source data is split in tiles along the Hilbert curve,
+    each matched in parallel against the data near the tile, with the same result as
+    a single join. The merge of by_address stays in process, since sending the data to
+    another process costs more than the merge. Default to 1, joining in process."""
+
+    tile_count: Optional[int] = None
+    """Number of tiles to split the source data in when process_workers is greater
+    than 1. Optional and will use 4 tiles per process if omitted."""
+
+    min_rows_per_tile: Optional[int] = 10000
+    """Minimum number of source rows of a tile, so small source data is joined in
+    process. Default to 10000."""
+
+    spatial_index_path: Optional[str] = None
+    """Directory to save the spatial index of the loaded datasets to, e.g. the damage
+    inspection points and the fire perimeters, so the next run loads them instead of
+    rebuilding them as long as the dataset is unchanged. Optional and will build the
+    spatial index on every run if omitted."""
+
+
 @dataclass
 class MatcherConfigWrapper:
     """Wrapper class for the Matchers definitions"""
 
     matcher: Optional[Dict[str, MatcherConfig]] = field(default_factory=dict)
     """Dictionary list of matchers to execute in order."""
+
+    options: Optional[MatcherOptionsConfig] = field(
+        default_factory=MatcherOptionsConfig
+    )
+    """Configuration for how the Matchers are run."""
@@ -0,0 +1,379 @@
+"""Packed Hilbert R-tree spatial index that can be saved to file and loaded on the next
+run instead of being rebuilt."""
+
+import glob
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import shapely
+from pyproj import CRS
+
+logger = logging.getLogger(__name__)
+
+# number of children of each node, same default as flatgeobuf
+DEFAULT_NODE_SIZE = 16
+
+# Hilbert curve coordinates are computed on a 16 bits grid
+_HILBERT_MAX = 0xFFFF
+
+# predicate of query that are decided by the distance instead of a binary predicate
+_DISTANCE_PREDICATES = ("dwithin",)
+
+
+def hilbert(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Returns the position along the Hilbert curve of the given grid coordinates,
+    both between 0 and 0xFFFF. Vectorized port of the branch free implementation used
+    by flatgeobuf."""
+    x = x.astype(np.uint32)
+    y = y.astype(np.uint32)
+    a = x ^ y
+    b = _HILBERT_MAX ^ a
+    c = _HILBERT_MAX ^ (x | y)
+    d = x & (y ^ _HILBERT_MAX)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C = C ^ ((a & (c >> 2)) ^ (b & (d >> 2)))
+    D = D ^ ((b & (c >> 2)) ^ ((a ^ b) & (d >> 2)))
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C = C ^ ((a & (c >> 4)) ^ (b & (d >> 4)))
+    D = D ^ ((b & (c >> 4)) ^ ((a ^ b) & (d >> 4)))
+
+    a, b, c, d = A, B, C, D
+    C = C ^ ((a & (c >> 8)) ^ (b & (d >> 8)))
+    D = D ^ ((b & (c >> 8)) ^ ((a ^ b) & (d >> 8)))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+
+    i0 = x ^ y
+    i1 = b | (_HILBERT_MAX ^ (i0 | a))
+    for shift, mask in (
+        (8, 0x00FF00FF),
+        (4, 0x0F0F0F0F),
+        (2, 0x33333333),
+        (1, 0x55555555),
+    ):
+        i0 = (i0 | (i0 << shift)) & mask
+        i1 = (i1 | (i1 << shift)) & mask
+    return (i1 << 1) | i0
+
+
+def get_hilbert_order(bounds: np.ndarray) -> np.ndarray:
+    """Returns the positions of the given bounds sorted along the Hilbert curve of
+    their centers, without the missing geometries whose bounds are nan."""
+    order = np.flatnonzero(~np.isnan(bounds).any(axis=1))
+    if len(order) == 0:
+        return order
+    bounds = bounds[order]
+    min_x, min_y = bounds[:, 0].min(), bounds[:, 1].min()
+    width = bounds[:, 2].max() - min_x
+    height = bounds[:, 3].max() - min_y
+    center_x = (bounds[:, 0] + bounds[:, 2]) / 2
+    center_y = (bounds[:, 1] + bounds[:, 3]) / 2
+    hilbert_values = hilbert(
+        np.floor(_HILBERT_MAX * (center_x - min_x) / (width or 1)),
+        np.floor(_HILBERT_MAX * (center_y - min_y) / (height or 1)),
+    )
+    return order[np.argsort(hilbert_values, kind="stable")]
+
+
+def get_index_key(bounds: np.ndarray, crs, node_size: int) -> str:
+    """Returns a key identifying the index built from the given geometry bounds, so a
+    saved index is only reused for the same dataset content in the same CRS."""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(bounds, dtype=np.float64).tobytes())
+    digest.update(CRS.from_user_input(crs).to_wkt().encode() if crs else b"")
+    digest.update(str(node_size).encode())
+    return digest.hexdigest()[:16]
+
+
+class PackedHilbertRTree:
+    """Static R-tree whose leaves are the geometry bounds sorted along the Hilbert
+    curve and packed node_size at a time, stored as flat numpy arrays so it can be
+    saved and loaded back without rebuilding.
+
+    query and nearest follow the geopandas sindex conventions, returning an array of
+    input positions and tree positions sorted by input then tree position.
+    """
+
+    def __init__(
+        self,
+        geometries: np.ndarray,
+        node_bounds: np.ndarray,
+        level_offsets: np.ndarray,
+        order: np.ndarray,
+        node_size: int,
+    ):
+        """Use build or load instead.
+
+        Args:
+            geometries: Array of the indexed geometries, used for the exact predicates.
+            node_bounds: Bounds of every node, from the leaves up to the root.
+            level_offsets: Position of the first node of each level in node_bounds,
+                followed by the total number of nodes.
+            order: Geometry position of each leaf.
+            node_size: Number of children of each node.
+        """
+        self.geometries = geometries
+        self.node_bounds = node_bounds
+        self.level_offsets = level_offsets
+        self.order = order
+        self.node_size = node_size
+
+    @classmethod
+    def build(
+        cls, geometries: np.ndarray, node_size: int = DEFAULT_NODE_SIZE
+    ) -> "PackedHilbertRTree":
+        """Build the index over the given geometries. Missing and empty geometries are
+        not indexed."""
+        bounds = shapely.bounds(geometries)
+        order = get_hilbert_order(bounds)
+        leaf_bounds = bounds[order]
+
+        levels = [leaf_bounds]
+        while len(levels[-1]) > 1:
+            starts = np.arange(0, len(levels[-1]), node_size)
+            children = levels[-1]
+            levels.append(
+                np.column_stack(
+                    [
+                        np.minimum.reduceat(children[:, 0], starts),
+                        np.minimum.reduceat(children[:, 1], starts),
+                        np.maximum.reduceat(children[:, 2], starts),
+                        np.maximum.reduceat(children[:, 3], starts),
+                    ]
+                )
+            )
+        level_offsets = np.cumsum([0] + [len(level) for level in levels])
+        return cls(
+            geometries=geometries,
+            node_bounds=np.concatenate(levels).reshape(-1, 4),
+            level_offsets=level_offsets,
+            order=order,
+            node_size=node_size,
+        )
+
+    def save(self, file_path: str):
+        """Save the index, without the geometries, atomically to the .npz file_path."""
+        temporary_file_path = f"{file_path}.tmp.npz"
+        np.savez(
+            temporary_file_path,
+            node_bounds=self.node_bounds,
+            level_offsets=self.level_offsets,
+            order=self.order,
+            node_size=np.array(self.node_size),
+        )
+        os.replace(temporary_file_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str, geometries: np.ndarray) -> "PackedHilbertRTree":
+        """Load the index saved with save, for the same geometries it was built from."""
+        with np.load(file_path) as data:
+            return cls(
+                geometries=geometries,
+                node_bounds=data["node_bounds"],
+                level_offsets=data["level_offsets"],
+                order=data["order"],
+                node_size=int(data["node_size"]),
+            )
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def query_bounds(self, bounds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns every pair of input position and geometry position whose bounds
+        intersect, walking down the tree one level at a time for all of the inputs."""
+        empty = np.array([], dtype=np.intp)
+        if len(self.order) == 0 or len(bounds) == 0:
+            return empty, empty
+
+        def intersects(input_positions, node_positions):
+            node_bounds = self.node_bounds[node_positions]
+            input_bounds = bounds[input_positions]
+            return (
+                (node_bounds[:, 0] <= input_bounds[:, 2])
+                & (node_bounds[:, 2] >= input_bounds[:, 0])
+                & (node_bounds[:, 1] <= input_bounds[:, 3])
+                & (node_bounds[:, 3] >= input_bounds[:, 1])
+            )
+
+        # Every input starts at the root, missing geometries have nan bounds
+        level = len(self.level_offsets) - 2
+        input_positions = np.flatnonzero(~np.isnan(bounds).any(axis=1))
+        node_positions = np.full(len(input_positions), self.level_offsets[level])
+        keep = intersects(input_positions, node_positions)
+        input_positions, node_positions = input_positions[keep], node_positions[keep]
+
+        while level > 0:
+            parent_offset = self.level_offsets[level]
+            child_offset = self.level_offsets[level - 1]
+            child_count = parent_offset - child_offset
+            first_child = (node_positions - parent_offset) * self.node_size
+            children_count = np.minimum(child_count - first_child, self.node_size)
+            input_positions = np.repeat(input_positions, children_count)
+            # position of each child within its parent
+            child_rank = np.arange(len(input_positions)) - np.repeat(
+                np.cumsum(children_count) - children_count, children_count
+            )
+            node_positions = (
+                child_offset + np.repeat(first_child, children_count) + child_rank
+            )
+            keep = intersects(input_positions, node_positions)
+            input_positions, node_positions = (
+                input_positions[keep],
+                node_positions[keep],
+            )
+            level -= 1
+
+        tree_positions = self.order[node_positions]
+        sort_order = np.lexsort((tree_positions, input_positions))
+        return input_positions[sort_order], tree_positions[sort_order]
+
+    def query(
+        self,
+        geometry: Union[np.ndarray, shapely.Geometry],
+        predicate: Optional[str] = None,
+        distance: Optional[float] = None,
+    ) -> np.ndarray:
+        """Returns the input and tree positions of the pairs of geometries whose bounds
+        intersect, and that satisfy predicate(input geometry, tree geometry) if given.
+
+        Args:
+            geometry: Array of geometries to query.
+            predicate: Name of a shapely binary predicate, e.g. intersects or contains,
+                or dwithin.
+            distance: Distance for the dwithin predicate.
+
+        Returns:
+            Array of shape (2, n) with the input positions and the tree positions.
+        """
+        geometry = np.asarray(geometry, dtype=object).reshape(-1)
+        bounds = shapely.bounds(geometry)
+        if predicate in _DISTANCE_PREDICATES:
+            if distance is None:
+                raise ValueError(f"distance is required for predicate {predicate}")
+            bounds = bounds + np.array([-distance, -distance, distance, distance])
+        input_positions, tree_positions = self.query_bounds(bounds)
+        if predicate is not None:
+            predicate_function = getattr(shapely, predicate)
+            arguments = (geometry[input_positions], self.geometries[tree_positions])
+            if predicate in _DISTANCE_PREDICATES:
+                keep = predicate_function(*arguments, distance)
+            else:
+                keep = predicate_function(*arguments)
+            input_positions, tree_positions = (
+                input_positions[keep],
+                tree_positions[keep],
+            )
+        return np.vstack([input_positions, tree_positions])
+
+    def nearest(
+        self,
+        geometry: Union[np.ndarray, shapely.Geometry],
+        return_all: bool = True,
+        max_distance: Optional[float] = None,
+        return_distance: bool = False,
+    ):
+        """Returns the nearest tree geometry of each input geometry within max_distance.
+
+        Args:
+            geometry: Array of geometries to query.
+            return_all: Whether or not to return every equidistant nearest geometry
+                instead of only the first one.
+            max_distance: Maximum distance to look for the nearest geometry, required
+                since the candidates are found through the bounds.
+            return_distance: Whether or not to also return the distances.
+
+        Returns:
+            Array of shape (2, n) with the input positions and the tree positions,
+            and the array of distances if return_distance.
+        """
+        if max_distance is None:
+            raise ValueError("max_distance is required for the nearest query")
+        geometry = np.asarray(geometry, dtype=object).reshape(-1)
+        input_positions, tree_positions = self.query(
+            geometry, predicate="dwithin", distance=max_distance
+        )
+        distances = shapely.distance(
+            geometry[input_positions], self.geometries[tree_positions]
+        )
+        # keep the candidates at the minimum distance of their input, which is the
+        # first candidate of each input once sorted by distance
+        ranking = np.lexsort((tree_positions, distances, input_positions))
+        input_positions = input_positions[ranking]
+        tree_positions = tree_positions[ranking]
+        distances = distances[ranking]
+        is_first = np.ones(len(input_positions), dtype=bool)
+        is_first[1:] = input_positions[1:] != input_positions[:-1]
+        if return_all:
+            first_positions = np.maximum.accumulate(
+                np.where(is_first, np.arange(len(is_first)), 0)
+            )
+            keep = distances == distances[first_positions]
+        else:
+            keep = is_first
+        indices = np.vstack([input_positions[keep], tree_positions[keep]])
+        if return_distance:
+            return indices, distances[keep]
+        return indices
+
+
+def get_index_file_name(label: str, key: str) -> str:
+    """Returns the name of the saved spatial index file of the given label."""
+    return f"{label}_spatial_index_{key}.npz"
+
+
+def load_or_build(
+    label: str,
+    geometries: np.ndarray,
+    crs,
+    index_file_path: str,
+    node_size: int = DEFAULT_NODE_SIZE,
+) -> PackedHilbertRTree:
+    """Load the saved spatial index of the given label if it was built from the same
+    geometry bounds in the same CRS, otherwise build it and save it for the next run.
+
+    Args:
+        label: Label of the indexed GeoDataFrame.
+        geometries: Geometries of the GeoDataFrame.
+        crs: CRS of the geometries.
+        index_file_path: Directory to save the spatial index files to.
+        node_size: Number of children of each node.
+
+    Returns:
+        Spatial index of the geometries.
+    """
+    key = get_index_key(shapely.bounds(geometries), crs, node_size)
+    file_path = os.path.join(index_file_path, get_index_file_name(label, key))
+    if os.path.exists(file_path):
+        try:
+            index = PackedHilbertRTree.load(file_path, geometries)
+            logger.info(f"Loaded spatial index of {label} from {file_path}")
+            return index
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Failed to load spatial index {file_path}, e: {e}")
+
+    index = PackedHilbertRTree.build(geometries, node_size=node_size)
+    Path(index_file_path).mkdir(parents=True, exist_ok=True)
+    index.save(file_path)
+    logger.info(f"Saved spatial index of {label} to {file_path}")
+    for stale_file_path in glob.glob(
+        os.path.join(index_file_path, f"{glob.escape(label)}_spatial_index_*.npz")
+    ):
+        if os.path.abspath(stale_file_path) != os.path.abspath(file_path):
+            os.remove(stale_file_path)
+    return index
@@ -0,0 +1,286 @@
+"""Process pool matching the source data one spatial tile at a time, so the spatial
+joins of a large source data use every core."""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+import shapely
+from geopandas import GeoDataFrame
+
+from disaster_damage_assessment_lookup.matcher.spatial_index import (
+    PackedHilbertRTree,
+    get_hilbert_order,
+)
+from disaster_damage_assessment_lookup.utils.shared_data import (
+    SharedDataStore,
+    SharedGeometries,
+)
+
+logger = logging.getLogger(__name__)
+
+# number of tiles per process when tile_count is not configured, so a slow tile does
+# not keep the other processes waiting
+TILES_PER_PROCESS = 4
+
+
+def sort_pairs(
+    input_positions: np.ndarray, tree_positions: np.ndarray, *values: np.ndarray
+) -> Tuple[np.ndarray, ...]:
+    """Returns the pairs and their values sorted by input then tree position, the
+    order of the spatial index queries whether they ran in tiles or not."""
+    sort_order = np.lexsort((tree_positions, input_positions))
+    return tuple(
+        array[sort_order] for array in (input_positions, tree_positions, *values)
+    )
+
+
+def get_geometries(geometries: Union[np.ndarray, SharedGeometries]) -> np.ndarray:
+    """Returns the geometries, decoded from the shared data when shared."""
+    if isinstance(geometries, SharedGeometries):
+        return geometries.get_geometries()
+    return geometries
+
+
+def dwithin_tile(
+    geometries: np.ndarray,
+    tree_geometries: Union[np.ndarray, SharedGeometries],
+    distance: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Find the pairs of geometries within distance of each other in a single tile.
+
+    Returns:
+        Input positions, tree positions, whether the tree geometry contains the input
+        geometry, and their distance, for each pair.
+    """
+    tree_geometries = get_geometries(tree_geometries)
+    input_positions, tree_positions = PackedHilbertRTree.build(tree_geometries).query(
+        geometries, predicate="dwithin", distance=distance
+    )
+    candidate_tree_geometries = tree_geometries[tree_positions]
+    candidate_geometries = geometries[input_positions]
+    return (
+        input_positions,
+        tree_positions,
+        shapely.contains(candidate_tree_geometries, candidate_geometries),
+        shapely.distance(candidate_tree_geometries, candidate_geometries),
+    )
+
+
+def nearest_tile(
+    geometries: np.ndarray,
+    tree_geometries: Union[np.ndarray, SharedGeometries],
+    max_distance: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find every nearest tree geometry within max_distance in a single tile.
+
+    Returns:
+        Input positions, tree positions and distance of each pair.
+    """
+    tree_geometries = get_geometries(tree_geometries)
+    (input_positions, tree_positions), distances = PackedHilbertRTree.build(
+        tree_geometries
+    ).nearest(
+        geometries,
+        return_all=True,
+        max_distance=max_distance,
+        return_distance=True,
+    )
+    return input_positions, tree_positions, distances
+
+
+class TilePool:
+    """Pool of processes running the spatial joins of the matchers one tile of the
+    source data at a time.
+
+    The source geometries are sorted along the Hilbert curve in EPSG:3857 and split in
+    tiles of consecutive geometries. Each tile is joined in its own process against the
+    tree geometries intersecting the bounds of the tile plus the join distance, which
+    are the only ones it can match. The pairs found are mapped back to the positions in
+    the whole data and sorted, so the result is identical to a single join.
+
+    The data joined against, e.g. the damage inspection points or the fire perimeters,
+    is published once to a SharedDataStore that every process memory maps, and each
+    tile only receives the positions of its candidates instead of a copy of their
+    geometries.
+
+    The processes are started on the first sharded join, so a pool that never shards,
+    e.g. on small chunks of source data, costs nothing.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        tile_count: Optional[int] = None,
+        min_rows_per_tile: int = 10000,
+    ):
+        """
+        Args:
+            max_workers: Number of processes.
+            tile_count: Number of tiles to split the source data in. Optional and will
+                use 4 tiles per process if omitted.
+            min_rows_per_tile: Minimum number of source rows of a tile, so small
+                source data is joined in process instead of paying for the transfer.
+        """
+        self.max_workers = max_workers
+        self.tile_count = tile_count or max_workers * TILES_PER_PROCESS
+        self.min_rows_per_tile = max(min_rows_per_tile, 1)
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.store: Optional[SharedDataStore] = None
+        # The matchers run in several threads, so the processes and the shared data
+        # are only created once
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> "TilePool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop the processes of the pool and remove the shared data."""
+        with self.lock:
+            executor, self.executor = self.executor, None
+            store, self.store = self.store, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        if store is not None:
+            store.close()
+
+    def share(self, key: str, gdf: GeoDataFrame) -> SharedGeometries:
+        """Returns the geometries of the GeoDataFrame published under the given key,
+        publishing only its geometry column on the first call."""
+        with self.lock:
+            if self.store is None:
+                self.store = SharedDataStore()
+            store = self.store
+        dataset = store.publish(key, gdf[[gdf.geometry.name]])
+        return SharedGeometries(dataset, np.arange(len(gdf), dtype=np.int64))
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                logger.info(
+                    f"Starting {self.max_workers} processes for the spatial joins"
+                )
+                # spawn does not inherit the locks held by the other threads, e.g. the
+                # DataLoader or ResultWriter threads, and behaves the same on every OS
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self.executor
+
+    def get_tile_count(self, row_count: int) -> int:
+        """Returns the number of tiles to split the given number of rows in, 1 if the
+        rows are joined in process."""
+        return max(min(self.tile_count, row_count // self.min_rows_per_tile), 1)
+
+    def is_sharded(self, row_count: int) -> bool:
+        """Whether the join of the given number of source rows runs in tiles."""
+        return self.max_workers > 1 and self.get_tile_count(row_count) > 1
+
+    def get_tiles(self, geometries: np.ndarray) -> List[np.ndarray]:
+        """Returns the sorted positions of the geometries of each tile, consecutive
+        along the Hilbert curve. Missing geometries are left out, they match
+        nothing."""
+        order = get_hilbert_order(shapely.bounds(geometries))
+        tiles = np.array_split(order, self.get_tile_count(len(order)))
+        return [np.sort(tile) for tile in tiles if len(tile)]
+
+    def map_tiles(
+        self,
+        function,
+        geometries: np.ndarray,
+        tree: GeoDataFrame,
+        tree_key: str,
+        distance: float,
+        tree_positions: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, ...]:
+        """Run the join function on each tile in the pool.
+
+        Args:
+            function: dwithin_tile or nearest_tile.
+            geometries: Geometries of the source data.
+            tree: GeoDataFrame to join against.
+            tree_key: Key identifying the tree in the shared data, e.g. its label
+                and CRS.
+            distance: Distance of the join, extending the bounds of each tile.
+            tree_positions: Positions of the tree geometries to join against.
+                Optional and will join against every tree geometry if omitted.
+
+        Returns:
+            Input positions, tree positions, and the values returned by the function
+            for each pair, sorted by input then tree position.
+        """
+        tree_geometries = tree.geometry.to_numpy()
+        if tree_positions is None:
+            tree_positions = np.arange(len(tree_geometries))
+        tree_bounds = shapely.bounds(tree_geometries[tree_positions])
+        is_valid_tree = ~np.isnan(tree_bounds).any(axis=1)
+        shared_tree = self.share(tree_key, tree)
+
+        tiles = []
+        futures = []
+        executor = self.get_executor()
+        for tile in self.get_tiles(geometries):
+            bounds = shapely.bounds(geometries[tile])
+            min_x, min_y = np.nanmin(bounds[:, :2], axis=0) - distance
+            max_x, max_y = np.nanmax(bounds[:, 2:], axis=0) + distance
+            candidates = tree_positions[
+                is_valid_tree
+                & (tree_bounds[:, 0] <= max_x)
+                & (tree_bounds[:, 2] >= min_x)
+                & (tree_bounds[:, 1] <= max_y)
+                & (tree_bounds[:, 3] >= min_y)
+            ]
+            if len(candidates) == 0:
+                continue
+            tiles.append((tile, candidates))
+            futures.append(
+                executor.submit(
+                    function,
+                    geometries[tile],
+                    SharedGeometries(shared_tree.dataset, candidates),
+                    distance,
+                )
+            )
+        logger.debug(f"Joining {len(geometries)} rows in {len(futures)} tiles")
+
+        results = []
+        for (tile, candidates), future in zip(tiles, futures):
+            input_positions, candidate_positions, *values = future.result()
+            results.append(
+                (tile[input_positions], candidates[candidate_positions], *values)
+            )
+        if not results:
+            # Same arrays and dtypes as an empty join
+            return function(geometries[:0], tree_geometries[:0], distance)
+        return sort_pairs(*(np.concatenate(arrays) for arrays in zip(*results)))
+
+    def dwithin(
+        self,
+        geometries: np.ndarray,
+        tree: GeoDataFrame,
+        tree_key: str,
+        distance: float,
+        tree_positions: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Find the pairs of geometries within distance of each other, see
+        dwithin_tile."""
+        return self.map_tiles(
+            dwithin_tile, geometries, tree, tree_key, distance, tree_positions
+        )
+
+    def nearest(
+        self,
+        geometries: np.ndarray,
+        tree: GeoDataFrame,
+        tree_key: str,
+        max_distance: float,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Find every nearest tree geometry within max_distance, see nearest_tile."""
+        return self.map_tiles(nearest_tile, geometries, tree, tree_key, max_distance)
@@ -0,0 +1,176 @@
+"""Helper for appending the matcher results of each chunk to the same files."""
+
+import logging
+import os
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import xlsxwriter
+from geopandas import GeoDataFrame
+from pandas import DataFrame
+
+from disaster_damage_assessment_lookup.matcher.schema.matcher import SaveFileConfig
+from disaster_damage_assessment_lookup.result_writer.result_writer import (
+    ResultWriter,
+    open_xlsxwriter_workbook,
+    select_columns,
+    to_excel_values,
+    to_geopackage_layer,
+)
+from disaster_damage_assessment_lookup.result_writer.schema.result_writer import (
+    ResultWriterConfig,
+)
+
+logger = logging.getLogger(__name__)
+
+# file_format that can be appended to
+APPEND_FILE_FORMATS = ("xlsxwriter", "csv", "gpkg")
+
+
+@dataclass
+class AppendTarget:
+    """File, or sheet or layer of the bundle file, that the rows are appended to."""
+
+    file_path: str
+    name: Optional[str]
+    columns: List
+    workbook: Optional[xlsxwriter.Workbook] = None
+    worksheet: Optional[xlsxwriter.worksheet.Worksheet] = None
+    row_count: Optional[int] = None
+    """Number of rows appended, None until the first chunk is written."""
+
+
+class AppendingResultWriter(ResultWriter):
+    """ResultWriter saving every result of the same save file into the same file, one
+    chunk of rows after the other, e.g. when the matchers run on the Excel sheet one
+    chunk at a time.
+
+    Later chunks are written with the columns of the first chunk saved to the file.
+    The results are saved one at a time on a single background thread to keep the
+    order of the rows.
+    """
+
+    def __init__(self, config: ResultWriterConfig):
+        if config.file_format not in APPEND_FILE_FORMATS:
+            raise ValueError(
+                f"Unsupported file_format '{config.file_format}' for appending "
+                f"results, must be one of {', '.join(APPEND_FILE_FORMATS)}"
+            )
+        super().__init__(replace(config, max_workers=1))
+        self.targets: Dict[str, AppendTarget] = {}
+        self.workbooks: Dict[str, xlsxwriter.Workbook] = {}
+
+    def save(self, save_file: SaveFileConfig, gdf: GeoDataFrame) -> Future:
+        """Queue the rows of the result to be appended in the background.
+
+        Args:
+            save_file: Save file configuration of the matcher.
+            gdf: Result of the matcher for the chunk. It is not copied, so it must not
+                be modified in place afterward.
+
+        Returns:
+            Future done once the rows are appended.
+        """
+        df = select_columns(gdf, save_file)
+        with self.lock:
+            future = self.executor.submit(self.append, save_file, df)
+            self.futures.append(future)
+        return future
+
+    def get_target(self, save_file: SaveFileConfig, df: DataFrame) -> AppendTarget:
+        """Returns the file, sheet or layer the result of the save file is appended to,
+        starting it on the first call."""
+        target = self.targets.get(save_file.file_name)
+        if target is not None:
+            return target
+
+        if self.bundle_file_path is not None:
+            file_path = self.bundle_file_path
+            name = self.get_bundle_name(save_file.file_name)
+        else:
+            file_path = self.get_file_path(save_file.file_name)
+            name = None
+            Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+            if os.path.exists(file_path):
+                # Rows of the previous run would otherwise be kept
+                os.remove(file_path)
+        target = AppendTarget(file_path=file_path, name=name, columns=list(df.columns))
+        if self.config.file_format == "xlsxwriter":
+            workbook = self.workbooks.get(file_path)
+            if workbook is None:
+                workbook = open_xlsxwriter_workbook(file_path)
+                self.workbooks[file_path] = workbook
+            target.workbook = workbook
+            target.worksheet = workbook.add_worksheet(name or save_file.sheet_name)
+        self.targets[save_file.file_name] = target
+        return target
+
+    def append(self, save_file: SaveFileConfig, df: DataFrame):
+        """Append the rows of the result to its file, sheet or layer."""
+        start_time = time.perf_counter()
+        target = self.get_target(save_file, df)
+        if list(df.columns) != target.columns:
+            df = df.reindex(columns=target.columns)
+        if save_file.include_index:
+            df = df.reset_index()
+
+        is_first = target.row_count is None
+        row_count = target.row_count or 0
+        file_format = self.config.file_format
+        if file_format == "csv":
+            df.to_csv(
+                target.file_path,
+                mode="w" if is_first else "a",
+                header=is_first,
+                index=False,
+            )
+        elif file_format == "gpkg":
+            to_geopackage_layer(df).to_file(
+                target.file_path,
+                driver="GPKG",
+                layer=target.name,
+                mode="a" if os.path.exists(target.file_path) else "w",
+                index=False,
+            )
+        else:
+            worksheet = target.worksheet
+            if is_first:
+                worksheet.write_row(
+                    0,
+                    0,
+                    [str(column_name) for column_name in df.columns],
+                    target.workbook.add_format({"bold": True}),
+                )
+            columns = [
+                to_excel_values(df.iloc[:, position]) for position in range(df.shape[1])
+            ]
+            for row, values in enumerate(zip(*columns), start=row_count + 1):
+                worksheet.write_row(row, 0, values)
+        target.row_count = row_count + len(df)
+        logger.debug(
+            f"Appended {len(df)} rows to {target.file_path} "
+            f"in {time.perf_counter() - start_time:.2f} seconds"
+        )
+
+    def close(self):
+        """Wait for every queued result to be appended and close the files.
+
+        Raises:
+            Exception: The first error raised while saving a result, after every
+                other result is done.
+        """
+        try:
+            super().close()
+        finally:
+            for workbook in self.workbooks.values():
+                workbook.close()
+            self.workbooks = {}
+            for target in self.targets.values():
+                logger.info(
+                    f"Saved {target.row_count} rows to {target.file_path}"
+                    + (f" as {target.name}" if target.name else "")
+                )
+            self.targets = {}
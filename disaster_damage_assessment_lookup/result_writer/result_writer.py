@@ -0,0 +1,318 @@
+"""Helper for saving the matcher results to file in the background."""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+import geopandas as gpd
+import pandas as pd
+import xlsxwriter
+from geopandas import GeoDataFrame
+from pandas import DataFrame
+
+from disaster_damage_assessment_lookup.matcher.schema.matcher import SaveFileConfig
+from disaster_damage_assessment_lookup.result_writer.schema.result_writer import (
+    ResultWriterConfig,
+)
+from disaster_damage_assessment_lookup.utils import metrics
+from disaster_damage_assessment_lookup.utils.dataframe import (
+    stringify_mixed_type_columns,
+)
+
+logger = logging.getLogger(__name__)
+
+# file extension for each of the supported file_format
+FILE_EXTENSIONS = {
+    "excel": ".xlsx",
+    "xlsxwriter": ".xlsx",
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "gpkg": ".gpkg",
+}
+
+# file_format that can save several results into a single bundle file
+BUNDLE_FILE_FORMATS = ("excel", "xlsxwriter", "gpkg")
+
+# Excel does not allow longer sheet names
+MAX_SHEET_NAME_LENGTH = 31
+
+
+def to_excel_values(series: pd.Series) -> List:
+    """Returns the values of the column as Python objects that xlsxwriter can write,
+    with geometry as WKT and null values as None."""
+    if isinstance(series.dtype, gpd.array.GeometryDtype):
+        return [None if geometry is None else geometry.wkt for geometry in series]
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def write_excel_worksheet(
+    workbook: xlsxwriter.Workbook, sheet_name: str, df: DataFrame, include_index: bool
+):
+    """Write the DataFrame into a new worksheet of the xlsxwriter workbook.
+
+    In constant memory mode each row is flushed to disk as soon as the next row is
+    started, so the rows are written one after the other instead of column by column
+    as pandas does.
+    """
+    if include_index:
+        df = df.reset_index()
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write_row(
+        0,
+        0,
+        [str(column_name) for column_name in df.columns],
+        workbook.add_format({"bold": True}),
+    )
+    columns = [to_excel_values(df.iloc[:, position]) for position in range(df.shape[1])]
+    for row, values in enumerate(zip(*columns), start=1):
+        worksheet.write_row(row, 0, values)
+
+
+def open_xlsxwriter_workbook(file_path: str) -> xlsxwriter.Workbook:
+    """Open a new xlsxwriter workbook in constant memory mode."""
+    return xlsxwriter.Workbook(
+        file_path,
+        {
+            "constant_memory": True,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
+            "nan_inf_to_errors": True,
+        },
+    )
+
+
+def select_columns(gdf: GeoDataFrame, save_file: SaveFileConfig) -> DataFrame:
+    """Returns the view of the result to save, restricted to save_file.columns."""
+    if save_file.columns is None:
+        return gdf
+    missing_columns = [
+        column_name for column_name in save_file.columns if column_name not in gdf
+    ]
+    if missing_columns:
+        raise KeyError(
+            f"Columns {missing_columns} of {save_file.file_name} are not in the result"
+        )
+    return gdf[save_file.columns]
+
+
+def to_geopackage_layer(df: DataFrame) -> DataFrame:
+    """Returns a copy of the result that can be saved as a GeoPackage layer, which
+    only supports a single geometry column, so the other ones are saved as WKT."""
+    active_geometry_name = None
+    if isinstance(df, GeoDataFrame) and df.active_geometry_name in df:
+        active_geometry_name = df.active_geometry_name
+    df = stringify_mixed_type_columns(df)
+    for column_name in df.columns:
+        if column_name != active_geometry_name and isinstance(
+            df[column_name].dtype, gpd.array.GeometryDtype
+        ):
+            df[column_name] = gpd.GeoSeries(df[column_name]).to_wkt()
+    if active_geometry_name is not None:
+        return df
+    # Results without their active geometry column are saved as attribute only tables
+    return GeoDataFrame(pd.DataFrame(df))
+
+
+class ResultWriter:
+    """Helper class for saving the matcher results to file on a background pool, so the
+    matchers keep running while the previous results are being serialized.
+
+    Use as a context manager, or call close, to wait for every result to be saved.
+    """
+
+    def __init__(self, config: ResultWriterConfig):
+        if config.file_format not in FILE_EXTENSIONS:
+            raise ValueError(
+                f"Unsupported file_format '{config.file_format}', "
+                f"must be one of {', '.join(FILE_EXTENSIONS)}"
+            )
+        if config.bundle_file_name and config.file_format not in BUNDLE_FILE_FORMATS:
+            raise ValueError(
+                f"bundle_file_name is not supported for file_format "
+                f"'{config.file_format}', must be one of {', '.join(BUNDLE_FILE_FORMATS)}"
+            )
+        self.config = config
+        self.futures: List[Future] = []
+        self.lock = threading.Lock()
+        self.bundle_file_path: Optional[str] = None
+        self.bundle_excel_writer: Optional[pd.ExcelWriter] = None
+        self.bundle_workbook: Optional[xlsxwriter.Workbook] = None
+        self.bundle_names: List[str] = []
+
+        if config.bundle_file_name:
+            self.bundle_file_path = self.get_file_path(config.bundle_file_name)
+            Path(config.output_file_path).mkdir(parents=True, exist_ok=True)
+            if os.path.exists(self.bundle_file_path):
+                # Layers of the previous run would otherwise be kept in the GeoPackage
+                os.remove(self.bundle_file_path)
+            # Sheets and layers of a single file have to be written one at a time
+            max_workers = 1
+        else:
+            max_workers = max(config.max_workers, 1)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="result_writer"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_file_path(self, file_name: str) -> str:
+        """Returns the path of the file to save, with the extension of the file_format."""
+        return os.path.join(
+            self.config.output_file_path,
+            str(Path(file_name).with_suffix(FILE_EXTENSIONS[self.config.file_format])),
+        )
+
+    def get_bundle_name(self, file_name: str) -> str:
+        """Returns a unique sheet or layer name in the bundle file for the given
+        save file name."""
+        name = Path(file_name).stem
+        if self.config.file_format != "gpkg":
+            name = name[:MAX_SHEET_NAME_LENGTH]
+        unique_name, count = name, 1
+        while unique_name in self.bundle_names:
+            count += 1
+            suffix = f"_{count}"
+            unique_name = f"{name[: MAX_SHEET_NAME_LENGTH - len(suffix)]}{suffix}"
+        self.bundle_names.append(unique_name)
+        return unique_name
+
+    def save(self, save_file: SaveFileConfig, gdf: GeoDataFrame) -> Future:
+        """Queue the result to be saved in the background.
+
+        Args:
+            save_file: Save file configuration of the matcher.
+            gdf: Result of the matcher. It is not copied, so it must not be modified
+                in place afterward.
+
+        Returns:
+            Future done once the result is saved.
+        """
+        df = select_columns(gdf, save_file)
+        with self.lock:
+            if self.bundle_file_path is not None:
+                future = self.executor.submit(
+                    self.write_bundle,
+                    self.get_bundle_name(save_file.file_name),
+                    df,
+                    save_file,
+                )
+            else:
+                future = self.executor.submit(
+                    self.write_file,
+                    self.get_file_path(save_file.file_name),
+                    df,
+                    save_file,
+                )
+            self.futures.append(future)
+        return future
+
+    def write_file(self, file_path: str, df: DataFrame, save_file: SaveFileConfig):
+        """Save the result to its own file."""
+        with metrics.stage(f"result_writer.{Path(file_path).stem}", rows_in=len(df)):
+            start_time = time.perf_counter()
+            Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+            file_format = self.config.file_format
+            if file_format == "csv":
+                df.to_csv(file_path, index=save_file.include_index)
+            elif file_format == "parquet":
+                stringify_mixed_type_columns(df).to_parquet(
+                    file_path, index=save_file.include_index
+                )
+            elif file_format == "gpkg":
+                to_geopackage_layer(df).to_file(
+                    file_path, driver="GPKG", index=save_file.include_index
+                )
+            elif file_format == "xlsxwriter":
+                workbook = open_xlsxwriter_workbook(file_path)
+                write_excel_worksheet(
+                    workbook, save_file.sheet_name, df, save_file.include_index
+                )
+                workbook.close()
+            else:
+                df.to_excel(
+                    file_path,
+                    sheet_name=save_file.sheet_name,
+                    index=save_file.include_index,
+                )
+            logger.info(
+                f"Saved {len(df)} rows to {file_path} "
+                f"in {time.perf_counter() - start_time:.2f} seconds"
+            )
+
+    def write_bundle(self, name: str, df: DataFrame, save_file: SaveFileConfig):
+        """Save the result as a sheet or layer of the bundle file."""
+        with metrics.stage(f"result_writer.{name}", rows_in=len(df)):
+            start_time = time.perf_counter()
+            if self.config.file_format == "gpkg":
+                to_geopackage_layer(df).to_file(
+                    self.bundle_file_path,
+                    driver="GPKG",
+                    layer=name,
+                    index=save_file.include_index,
+                )
+            elif self.config.file_format == "xlsxwriter":
+                if self.bundle_workbook is None:
+                    self.bundle_workbook = open_xlsxwriter_workbook(
+                        self.bundle_file_path
+                    )
+                write_excel_worksheet(
+                    self.bundle_workbook, name, df, save_file.include_index
+                )
+            else:
+                if self.bundle_excel_writer is None:
+                    self.bundle_excel_writer = pd.ExcelWriter(self.bundle_file_path)
+                df.to_excel(
+                    self.bundle_excel_writer,
+                    sheet_name=name,
+                    index=save_file.include_index,
+                )
+            logger.info(
+                f"Saved {len(df)} rows to {self.bundle_file_path} as {name} "
+                f"in {time.perf_counter() - start_time:.2f} seconds"
+            )
+
+    def drain(self, max_pending: int = 0):
+        """Wait until at most the max_pending last queued results are left to save, so
+        the results waiting in memory stay bounded.
+
+        Raises:
+            Exception: The first error raised while saving one of the waited results.
+        """
+        with self.lock:
+            futures = self.futures[: max(len(self.futures) - max_pending, 0)]
+        for future in futures:
+            future.result()
+        with self.lock:
+            self.futures = self.futures[len(futures) :]
+
+    def close(self):
+        """Wait for every queued result to be saved.
+
+        Raises:
+            Exception: The first error raised while saving a result, after every
+                other result is done.
+        """
+        self.executor.shutdown(wait=True)
+        if self.bundle_workbook is not None:
+            self.bundle_workbook.close()
+            self.bundle_workbook = None
+        if self.bundle_excel_writer is not None:
+            self.bundle_excel_writer.close()
+            self.bundle_excel_writer = None
+
+        errors = []
+        for future in self.futures:
+            error = future.exception()
+            if error is not None:
+                logger.error(f"Failed to save result, e: {error}")
+                errors.append(error)
+        self.futures = []
+        if errors:
+            raise errors[0]
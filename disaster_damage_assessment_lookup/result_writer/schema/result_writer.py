@@ -0,0 +1,28 @@
+"""Schema definition for the result writer component."""
+
+from typing import Optional
+
+from marshmallow_dataclass import dataclass
+
+
+@dataclass
+class ResultWriterConfig:
+    """Configuration for the Result Writer component."""
+
+    output_file_path: Optional[str] = "output_data"
+    """Base file path to save all output files."""
+
+    file_format: Optional[str] = "excel"
+    """Format of the saved results, one of excel, xlsxwriter, csv, parquet or gpkg.
+    excel writes with openpyxl, xlsxwriter writes the same Excel file in constant memory
+    mode and is much faster on large results. The file extension of save_file.file_name
+    is replaced to match the file_format. Default to excel."""
+
+    max_workers: Optional[int] = 2
+    """Number of results to save at the same time in the background while the
+    matchers keep running. Default to 2."""
+
+    bundle_file_name: Optional[str] = None
+    """Name of a single file to save every result into instead of one file per result,
+    one sheet per result for the Excel formats or one layer per result for gpkg.
+    Optional and will save one file per result if omitted."""
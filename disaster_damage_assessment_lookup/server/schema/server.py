@@ -0,0 +1,17 @@
+"""Schema definition for the lookup server."""
+
+from typing import Optional
+
+from marshmallow_dataclass import dataclass
+
+
+@dataclass
+class ServerConfig:
+    """Configuration for the lookup server."""
+
+    host: Optional[str] = "127.0.0.1"
+    """Host name or address to listen on. Default to 127.0.0.1, only reachable from
+    the local machine."""
+
+    port: Optional[int] = 8080
+    """Port to listen on. Default to 8080."""
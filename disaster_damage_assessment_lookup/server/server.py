@@ -0,0 +1,348 @@
+"""Long running lookup server keeping the reference data in memory, so a single address
+or coordinate can be looked up through the configured matchers in milliseconds.
+
+Run with python -m disaster_damage_assessment_lookup.server.server, then e.g.
+GET /lookup?address=1 World Way, Los Angeles CA, GET /lookup?lat=34.19&lng=-118.13,
+or POST /reload after the reference data is refreshed.
+"""
+
+import json
+import logging
+import threading
+import time
+from dataclasses import replace
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+from dotenv import load_dotenv
+from geopandas import GeoDataFrame
+from geopandas.array import GeometryDtype
+
+from disaster_damage_assessment_lookup.data_loader.data_loader import (
+    DataLoader,
+    get_labels,
+)
+from disaster_damage_assessment_lookup.data_loader.excel import (
+    LATITUDE_COLUMN_NAME,
+    LONGITUDE_COLUMN_NAME,
+    ExcelGeoDataFrameLoader,
+)
+from disaster_damage_assessment_lookup.data_loader.schema.data_loader import (
+    DataLoaderConfig,
+)
+from disaster_damage_assessment_lookup.data_loader.schema.excel import (
+    ExcelGeoDataFrameConfig,
+)
+from disaster_damage_assessment_lookup.matcher.column_usage import get_required_columns
+from disaster_damage_assessment_lookup.matcher.dataset_registry import DatasetRegistry
+from disaster_damage_assessment_lookup.matcher.matcher import Matcher
+from disaster_damage_assessment_lookup.matcher.schema.matcher import (
+    MatcherConfigWrapper,
+)
+from disaster_damage_assessment_lookup.server.schema.server import ServerConfig
+from disaster_damage_assessment_lookup.utils.config_loader import load_himl_config
+
+logger = logging.getLogger(__name__)
+
+# value of the key_column_name of the looked up row
+LOOKUP_KEY = "lookup"
+
+# matcher_type querying the spatial index of their match_against_data
+SPATIAL_MATCHER_TYPES = ("by_fire_perimeters", "by_coordinate", "cascade")
+
+# CRS the spatial matchers project their inputs to
+MATCHER_CRS = 3857
+
+
+def to_records(gdf: GeoDataFrame, columns: Optional[List[str]] = None) -> List[Dict]:
+    """Returns the rows of the matcher result as JSON serializable dictionaries,
+    restricted to the given columns when present and without the geometry columns."""
+    if columns:
+        gdf = gdf[[column_name for column_name in columns if column_name in gdf]]
+    df = pd.DataFrame(
+        gdf.loc[:, [not isinstance(dtype, GeometryDtype) for dtype in gdf.dtypes]]
+    )
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+class LookupService:
+    """Keeps the reference data loaded by the DataLoader in memory and runs the
+    matchers on a single looked up row at a time.
+
+    Lookups are safe to run concurrently, each one runs the matchers on its own overlay
+    of the shared DatasetRegistry. A reload builds a new registry and swaps it in once
+    ready, so lookups in flight finish on the previous data.
+    """
+
+    def __init__(
+        self,
+        data_loader_config: DataLoaderConfig,
+        matcher_config: MatcherConfigWrapper,
+    ):
+        self.data_loader_config = data_loader_config
+        self.required_columns = get_required_columns(
+            matcher_config.matcher, get_labels(data_loader_config)
+        )
+        # A single row is matched faster without scheduling the matchers on threads
+        self.matcher = Matcher(
+            config=replace(
+                matcher_config, options=replace(matcher_config.options, max_workers=1)
+            )
+        )
+        self.excel_geodataframe_loader = None
+        if data_loader_config.geodataframe_loader:
+            self.excel_geodataframe_loader = ExcelGeoDataFrameLoader(
+                data_loader_config.geodataframe_loader
+            )
+        self.registry: Optional[DatasetRegistry] = None
+        self.reload_lock = threading.Lock()
+
+    def reload(self) -> Dict[str, int]:
+        """Load the reference data again and swap it in for the next lookups.
+
+        The Excel sources are not loaded, since each lookup replaces them with the
+        looked up row. The local geocoder is built again from the new data.
+
+        Returns:
+            Dictionary of the loaded label as key and the number of rows as value.
+        """
+        with self.reload_lock:
+            start_time = time.perf_counter()
+            gdf_databases = DataLoader(
+                config=replace(self.data_loader_config, excel={}),
+                required_columns=self.required_columns,
+            ).load()
+            registry = DatasetRegistry(
+                gdf_databases,
+                spatial_index_path=self.matcher.config.options.spatial_index_path,
+            )
+            for matcher in self.matcher.config.matcher.values():
+                if (
+                    matcher.matcher_type in SPATIAL_MATCHER_TYPES
+                    and matcher.match_against_data in registry
+                ):
+                    registry.get_sindex(matcher.match_against_data, MATCHER_CRS)
+            if self.excel_geodataframe_loader is not None:
+                self.excel_geodataframe_loader.load_local_geocoder(
+                    registry, reload=True
+                )
+            self.registry = registry
+            logger.info(
+                f"Loaded reference data in {time.perf_counter() - start_time:.2f} seconds"
+            )
+            return {label: len(gdf) for label, gdf in registry.items()}
+
+    def build_source(
+        self,
+        config: ExcelGeoDataFrameConfig,
+        address: Optional[str],
+        latitude: Optional[float],
+        longitude: Optional[float],
+    ) -> GeoDataFrame:
+        """Build the single row GeoDataFrame standing in for the Excel source, with the
+        columns selected by its preprocessing, geocoded like a new row of the sheet."""
+        column_names = [
+            column_name
+            for step in config.preprocessing
+            if step.processing_type == "select_column"
+            for column_name in step.data
+        ]
+        df = pd.DataFrame(
+            {column_name: [None] for column_name in dict.fromkeys(column_names)},
+            dtype=object,
+        )
+        df[config.geocode_column_name] = address
+        if config.key_column_name:
+            df[config.key_column_name] = LOOKUP_KEY
+        if latitude is not None and longitude is not None:
+            df[LATITUDE_COLUMN_NAME] = latitude
+            df[LONGITUDE_COLUMN_NAME] = longitude
+        self.excel_geodataframe_loader.geocode_new_rows(df, config)
+        return self.excel_geodataframe_loader.to_geodataframe(df, config)
+
+    def lookup(
+        self,
+        address: Optional[str] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Run the matchers on the given address, or coordinate if provided.
+
+        Returns:
+            Dictionary with the result rows of each matcher, restricted to the columns
+            of its save_file when configured.
+        """
+        registry = self.registry
+        if registry is None:
+            raise RuntimeError("Reference data is not loaded yet")
+        if self.excel_geodataframe_loader is None:
+            raise RuntimeError("geodataframe_loader must be configured for lookups")
+
+        start_time = time.perf_counter()
+        sources = {
+            label: self.build_source(config, address, latitude, longitude)
+            for label, config in self.data_loader_config.excel.items()
+        }
+        gdf_databases = registry.overlay(sources)
+        self.matcher.run(gdf_databases=gdf_databases)
+
+        results = {}
+        for name, matcher in self.matcher.config.matcher.items():
+            columns = matcher.save_file.columns if matcher.save_file else None
+            results[name] = to_records(gdf_databases[matcher.label], columns)
+        return {
+            "query": {"address": address, "lat": latitude, "lng": longitude},
+            "results": results,
+            "elapsed_ms": round((time.perf_counter() - start_time) * 1000, 2),
+        }
+
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+    """HTTP/JSON request handler for the LookupService.
+
+    GET /lookup?address=...  or  GET /lookup?lat=...&lng=...
+    POST /lookup with a JSON body {"address": ...} or {"lat": ..., "lng": ...}
+    POST /reload
+    GET /health
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/lookup":
+            parameters = {
+                key: values[-1] for key, values in parse_qs(url.query).items()
+            }
+            self.handle_lookup(parameters)
+        elif url.path == "/health":
+            self.send_json(
+                HTTPStatus.OK, {"loaded": self.server.service.registry is not None}
+            )
+        else:
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/lookup":
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                parameters = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError as e:
+                self.send_json(HTTPStatus.BAD_REQUEST, {"error": f"Invalid JSON: {e}"})
+                return
+            if not isinstance(parameters, dict):
+                self.send_json(
+                    HTTPStatus.BAD_REQUEST, {"error": "Body must be a JSON object"}
+                )
+                return
+            self.handle_lookup(parameters)
+        elif url.path == "/reload":
+            try:
+                loaded = self.server.service.reload()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.exception("Failed to reload the reference data")
+                self.send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+                return
+            self.send_json(HTTPStatus.OK, {"loaded": loaded})
+        else:
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {url.path}"})
+
+    def handle_lookup(self, parameters: Dict[str, Any]):
+        """Validate the lookup parameters and send the lookup result."""
+        address = parameters.get("address") or None
+        try:
+            latitude = (
+                None if parameters.get("lat") is None else float(parameters["lat"])
+            )
+            longitude = (
+                None if parameters.get("lng") is None else float(parameters["lng"])
+            )
+        except (TypeError, ValueError):
+            self.send_json(
+                HTTPStatus.BAD_REQUEST, {"error": "lat and lng must be numbers"}
+            )
+            return
+        if (latitude is None) != (longitude is None):
+            self.send_json(
+                HTTPStatus.BAD_REQUEST,
+                {"error": "lat and lng must be provided together"},
+            )
+            return
+        if address is None and latitude is None:
+            self.send_json(
+                HTTPStatus.BAD_REQUEST, {"error": "address or lat and lng is required"}
+            )
+            return
+
+        try:
+            result = self.server.service.lookup(
+                address=address, latitude=latitude, longitude=longitude
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.exception(f"Failed to look up {parameters}")
+            self.send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+            return
+        self.send_json(HTTPStatus.OK, result)
+
+    def send_json(self, status: HTTPStatus, body: Dict[str, Any]):
+        """Send the body as a JSON response."""
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+class LookupServer(ThreadingHTTPServer):
+    """HTTP server handling each request on its own thread with the shared service."""
+
+    daemon_threads = True
+
+    def __init__(self, config: ServerConfig, service: LookupService):
+        self.service = service
+        super().__init__((config.host, config.port), LookupRequestHandler)
+
+
+def main():
+    """Entry point for the disaster damage lookup server."""
+    logging.basicConfig()
+    logging.getLogger().setLevel(logging.INFO)
+
+    logger.info("Running Disaster Damage Assessment Lookup server")
+    load_dotenv()
+    config = load_himl_config(print_result=False)
+    logger.info("Loaded configuration")
+
+    # pylint: disable=E1101 # Suppress no member error for dynamic member
+    service = LookupService(
+        data_loader_config=DataLoaderConfig.Schema().load(config["data_loader"]),
+        matcher_config=MatcherConfigWrapper.Schema().load(
+            {
+                "matcher": config["matcher"],
+                "options": config.get("matcher_options", {}),
+            }
+        ),
+    )
+    service.reload()
+
+    # pylint: disable=E1101 # Suppress no member error for dynamic member
+    server = LookupServer(
+        config=ServerConfig.Schema().load(config.get("server", {})), service=service
+    )
+    logger.info(f"Listening on http://{server.server_address[0]}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""Schema definition for the streaming pipeline."""
+
+from typing import Optional
+
+from marshmallow_dataclass import dataclass
+
+
+@dataclass
+class StreamingConfig:
+    """Configuration for the streaming pipeline."""
+
+    label: Optional[str] = None
+    """Label of the Excel file to read chunk by chunk, the other data sources are
+    loaded in full. Optional and will use the only configured Excel file if omitted."""
+
+    chunk_size: Optional[int] = 500
+    """Number of rows of the Excel sheet to geocode and match at a time. Default
+    to 500."""
@@ -0,0 +1,216 @@
+"""Streaming pipeline reading the Excel sheet in chunks, so each chunk is geocoded,
+matched and appended to the results before the next one is read. The memory stays
+bounded by the chunk size and the reference data, and the first results are saved
+within seconds.
+
+Run with python -m disaster_damage_assessment_lookup.streaming.streaming
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Iterator, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+from disaster_damage_assessment_lookup.data_loader.data_loader import (
+    DataLoader,
+    get_labels,
+)
+from disaster_damage_assessment_lookup.data_loader.excel import ExcelGeoDataFrameLoader
+from disaster_damage_assessment_lookup.data_loader.schema.data_loader import (
+    DataLoaderConfig,
+)
+from disaster_damage_assessment_lookup.matcher.column_usage import get_required_columns
+from disaster_damage_assessment_lookup.matcher.dataset_registry import DatasetRegistry
+from disaster_damage_assessment_lookup.matcher.matcher import Matcher
+from disaster_damage_assessment_lookup.matcher.schema.matcher import (
+    MatcherConfigWrapper,
+)
+from disaster_damage_assessment_lookup.result_writer.appending_result_writer import (
+    AppendingResultWriter,
+)
+from disaster_damage_assessment_lookup.result_writer.result_writer import ResultWriter
+from disaster_damage_assessment_lookup.result_writer.schema.result_writer import (
+    ResultWriterConfig,
+)
+from disaster_damage_assessment_lookup.streaming.schema.streaming import (
+    StreamingConfig,
+)
+from disaster_damage_assessment_lookup.utils import metrics
+from disaster_damage_assessment_lookup.utils.config_loader import load_himl_config
+from disaster_damage_assessment_lookup.utils.metrics import MetricsRecorder
+from disaster_damage_assessment_lookup.utils.schema.metrics import MetricsConfig
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def prefetch(iterator: Iterator[T]) -> Iterator[T]:
+    """Yield the items of the iterator, computing the next item on a background thread
+    while the current one is being processed, e.g. geocoding the next chunk while the
+    current chunk is matched."""
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch") as executor:
+        future = executor.submit(next, iterator, None)
+        while True:
+            item = future.result()
+            if item is None:
+                return
+            future = executor.submit(next, iterator, None)
+            yield item
+
+
+class StreamingPipeline:
+    """Helper class for running the matchers on the Excel sheet one chunk at a time,
+    against the other data sources loaded once in memory."""
+
+    def __init__(
+        self,
+        data_loader_config: DataLoaderConfig,
+        matcher_config: MatcherConfigWrapper,
+        config: StreamingConfig,
+    ):
+        excel_configs = data_loader_config.excel or {}
+        label = config.label
+        if label is None:
+            if len(excel_configs) != 1:
+                raise ValueError(
+                    "streaming.label must be set when there is not exactly one "
+                    "Excel file configured"
+                )
+            label = next(iter(excel_configs))
+        if label not in excel_configs:
+            raise ValueError(
+                f"streaming.label '{label}' is not a configured Excel file"
+            )
+        if not data_loader_config.geodataframe_loader:
+            raise ValueError(
+                "geodataframe_loader must be configured in default.yaml in "
+                "order to import excel file into GeoDataFrame!"
+            )
+        if config.chunk_size < 1:
+            raise ValueError("streaming.chunk_size must be at least 1")
+
+        self.data_loader_config = data_loader_config
+        self.required_columns = get_required_columns(
+            matcher_config.matcher, get_labels(data_loader_config)
+        )
+        self.matcher = Matcher(config=matcher_config)
+        self.config = config
+        self.label = label
+
+    def load_reference_data(self) -> DatasetRegistry:
+        """Load every data source but the streamed Excel file."""
+        excel_configs = {
+            label: excel_config
+            for label, excel_config in (self.data_loader_config.excel or {}).items()
+            if label != self.label
+        }
+        gdf_databases = DataLoader(
+            config=replace(self.data_loader_config, excel=excel_configs),
+            required_columns=self.required_columns,
+        ).load()
+        return DatasetRegistry(
+            gdf_databases,
+            spatial_index_path=self.matcher.config.options.spatial_index_path,
+        )
+
+    def run(self, result_writer: Optional[ResultWriter] = None):
+        """Run the matchers on each chunk of the Excel sheet and queue the results of
+        each chunk to the result_writer.
+
+        The matchers of each chunk run on an overlay of the reference data, so the
+        reprojections and spatial indexes are built once and shared by every chunk.
+        The next chunk is geocoded while the current one is matched, and at most one
+        chunk of results waits to be saved.
+        """
+        registry = self.load_reference_data()
+        logger.info("Loaded reference data")
+
+        excel_config = self.data_loader_config.excel[self.label]
+        excel_geodataframe_loader = ExcelGeoDataFrameLoader(
+            self.data_loader_config.geodataframe_loader
+        )
+        excel_geodataframe_loader.load_local_geocoder(registry)
+        chunks = excel_geodataframe_loader.load_chunks(
+            config=excel_config,
+            input_file_path=self.data_loader_config.input_file_path,
+            chunk_size=self.config.chunk_size,
+        )
+        saves_per_chunk = sum(
+            matcher.save_file is not None
+            for matcher in self.matcher.config.matcher.values()
+        )
+
+        start_time = time.perf_counter()
+        row_count = 0
+        for chunk_number, gdf in enumerate(prefetch(chunks), start=1):
+            self.matcher.run(
+                gdf_databases=registry.overlay({self.label: gdf}),
+                result_writer=result_writer,
+            )
+            if result_writer is not None:
+                result_writer.drain(max_pending=saves_per_chunk)
+            row_count += len(gdf)
+            logger.info(
+                f"Matched chunk {chunk_number} of {len(gdf)} rows, {row_count} rows "
+                f"in {time.perf_counter() - start_time:.2f} seconds"
+            )
+
+
+def main():
+    """Entry point for the streaming disaster damage lookup."""
+    logging.basicConfig()
+    logging.getLogger().setLevel(logging.INFO)
+
+    logger.info("Running Disaster Damage Assessment Lookup in streaming mode")
+    load_dotenv()
+    config = load_himl_config(print_result=False)
+    logger.info("Loaded configuration")
+
+    # pylint: disable=E1101 # Suppress no member error for dynamic member
+    metrics_config = MetricsConfig.Schema().load(
+        {
+            "file_path": f"{config['output_data_path']}/metrics",
+            **config.get("metrics", {}),
+        }
+    )
+    recorder = MetricsRecorder.from_config(metrics_config)
+    metrics.set_recorder(recorder)
+
+    status = "failed"
+    try:
+        # pylint: disable=E1101 # Suppress no member error for dynamic member
+        pipeline = StreamingPipeline(
+            data_loader_config=DataLoaderConfig.Schema().load(config["data_loader"]),
+            matcher_config=MatcherConfigWrapper.Schema().load(
+                {
+                    "matcher": config["matcher"],
+                    "options": config.get("matcher_options", {}),
+                }
+            ),
+            config=StreamingConfig.Schema().load(config.get("streaming", {})),
+        )
+
+        # pylint: disable=E1101 # Suppress no member error for dynamic member
+        result_writer_config = ResultWriterConfig.Schema().load(
+            {
+                "output_file_path": config["output_data_path"],
+                **config.get("result_writer", {}),
+            }
+        )
+
+        with AppendingResultWriter(config=result_writer_config) as result_writer:
+            pipeline.run(result_writer=result_writer)
+            logger.info("Waiting for the results to be saved")
+        logger.info("Saved results")
+
+        status = "done"
+    finally:
+        recorder.close(status)
+
+
+if __name__ == "__main__":
+    main()
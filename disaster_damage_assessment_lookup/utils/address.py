@@ -0,0 +1,266 @@
+"""Utility for normalizing free form addresses."""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+import pandas as pd
+from unidecode import unidecode
+
+_PUNCTUATION_PATTERN = re.compile(r"[.,#;:]")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=65536)
+def transliterate(address: str) -> str:
+    """Returns the address with its non-English characters converted to English
+    characters, e.g. VÍA becomes VIA, remembering the addresses already converted."""
+    return unidecode(address)
+
+
+def normalize_address(address: str) -> str:
+    """Normalize the given address so that trivially different spellings of the same
+    address, e.g. different casing, punctuation or spacing, share the same key.
+
+    Args:
+        address: Free form address.
+
+    Returns:
+        Normalized address, e.g. "1 World Way, Los Angeles CA" becomes
+        "1 WORLD WAY LOS ANGELES CA".
+    """
+    normalized = unidecode(str(address)).upper()
+    normalized = _PUNCTUATION_PATTERN.sub(" ", normalized)
+    return _WHITESPACE_PATTERN.sub(" ", normalized).strip()
+
+
+def normalize_addresses(addresses: pd.Series) -> pd.Series:
+    """Vectorized version of normalize_address for a whole column of addresses,
+    only transliterating the distinct addresses with non-ASCII characters.
+
+    Args:
+        addresses: Series of free form addresses, without null values.
+
+    Returns:
+        Series of normalized addresses with the same index.
+    """
+    addresses = addresses.astype(str)
+    non_ascii = ~addresses.str.isascii()
+    if non_ascii.any():
+        addresses = addresses.where(
+            ~non_ascii,
+            addresses[non_ascii].map(
+                {
+                    address: transliterate(address)
+                    for address in addresses[non_ascii].unique()
+                }
+            ),
+        )
+    return (
+        addresses.str.upper()
+        .str.replace(_PUNCTUATION_PATTERN.pattern, " ", regex=True)
+        .str.replace(_WHITESPACE_PATTERN.pattern, " ", regex=True)
+        .str.strip()
+    )
+
+
+# USPS abbreviations of the street suffixes, so STREET and ST share the same key
+STREET_SUFFIX_ABBREVIATIONS = {
+    "ALLEY": "ALY",
+    "AVENUE": "AVE",
+    "BOULEVARD": "BLVD",
+    "CANYON": "CYN",
+    "CIRCLE": "CIR",
+    "COURT": "CT",
+    "DRIVE": "DR",
+    "HIGHWAY": "HWY",
+    "LANE": "LN",
+    "PARKWAY": "PKWY",
+    "PLACE": "PL",
+    "ROAD": "RD",
+    "SQUARE": "SQ",
+    "STREET": "ST",
+    "TERRACE": "TER",
+    "TRAIL": "TRL",
+}
+DIRECTIONAL_ABBREVIATIONS = {"NORTH": "N", "SOUTH": "S", "EAST": "E", "WEST": "W"}
+
+# segments of a formatted address that only name the country
+_COUNTRY_SEGMENTS = {"USA", "US", "UNITED STATES"}
+_HOUSE_NUMBER_PATTERN = re.compile(r"^(\d+)([A-Z]?)\s+(.+)$")
+UNIT_DESIGNATORS = ("UNIT", "APT", "STE", "SUITE", "SPC", "SPACE", "BLDG", "LOT")
+_UNIT_PATTERN = re.compile(rf"\s(?:{'|'.join(UNIT_DESIGNATORS)}|NO)\s+([A-Z0-9-]+)$")
+_STATE_ZIP_CODE_PATTERN = re.compile(r"^[A-Z]{2}(?:\s+\d{5}(?:\s?-?\s?\d{4})?)?$")
+_ZIP_CODE_PATTERN = re.compile(r"\b(\d{5})\b")
+# state and ZIP code at the end of the city segment, e.g. PACIFIC PALISADES CA 90272
+_TRAILING_STATE_ZIP_CODE_PATTERN = re.compile(
+    r"\s+([A-Z]{2})(?:\s+(\d{5})(?:\s?-?\s?\d{4})?)?$"
+)
+US_STATE_CODES = frozenset(
+    "AL AK AZ AR CA CO CT DE DC FL GA HI ID IL IN IA KS KY LA ME MD MA MI MN MS MO "
+    "MT NE NV NH NJ NM NY NC ND OH OK OR PA RI SC SD TN TX UT VT VA WA WV WI WY PR "
+    "GU VI AS MP".split()
+)
+
+
+@dataclass(frozen=True)
+class ParsedAddress:
+    """Components of a street address, normalized with normalize_address."""
+
+    house_number: str
+    """House number with its letter suffix if any, e.g. 12A."""
+
+    number: int
+    """Numeric part of the house number, used to interpolate along the street."""
+
+    street: str
+    """Street name with abbreviated suffix and leading directional, e.g. N LAKE AVE."""
+
+    unit: Optional[str] = None
+    """Unit, apartment or suite number if any."""
+
+    city: Optional[str] = None
+    """City if any, the segment following the street."""
+
+    zip_code: Optional[str] = None
+    """Five digit ZIP code if any."""
+
+    @property
+    def key(self) -> str:
+        """Returns the house number and street, e.g. 12 N LAKE AVE."""
+        return f"{self.house_number} {self.street}"
+
+
+def normalize_street(street: str) -> str:
+    """Abbreviate the suffix and the leading directional of a normalized street name,
+    e.g. NORTH LAKE AVENUE becomes N LAKE AVE. A directional that is the street name
+    itself, e.g. NORTH ST, is kept."""
+    tokens = street.split()
+    if tokens:
+        tokens[-1] = STREET_SUFFIX_ABBREVIATIONS.get(tokens[-1], tokens[-1])
+    if len(tokens) > 2:
+        tokens[0] = DIRECTIONAL_ABBREVIATIONS.get(tokens[0], tokens[0])
+    return " ".join(tokens)
+
+
+def parse_address(address: str) -> Optional[ParsedAddress]:
+    """Parse a comma separated street address, e.g. the SITEADDRESS of the damage
+    inspection records or the address returned by GoogleV3.
+
+    Args:
+        address: Address like "12 North Lake Avenue #3, Altadena, CA 91001, USA".
+            The city, state and ZIP code are optional, and the state and ZIP code
+            can follow the city without a comma, e.g. "Altadena CA 91001".
+
+    Returns:
+        Parsed address, e.g. house number 12, street N LAKE AVE, unit 3, city ALTADENA
+        and ZIP code 91001, or None if the address does not start with a house number.
+    """
+    segments = [
+        normalize_address(segment.replace("#", " UNIT "))
+        for segment in str(address).split(",")
+    ]
+    segments = [
+        segment for segment in segments if segment and segment not in _COUNTRY_SEGMENTS
+    ]
+    if not segments:
+        return None
+    match = _HOUSE_NUMBER_PATTERN.match(segments[0])
+    if match is None:
+        return None
+    house_number, letter, street = match.groups()
+    unit = None
+    unit_match = _UNIT_PATTERN.search(street)
+    if unit_match is not None:
+        unit = unit_match.group(1)
+        street = street[: unit_match.start()]
+
+    city = None
+    zip_code = None
+    for position, segment in enumerate(segments[1:], start=1):
+        if _STATE_ZIP_CODE_PATTERN.match(segment) or segment.isdigit():
+            zip_match = _ZIP_CODE_PATTERN.search(segment)
+            if zip_match is not None:
+                zip_code = zip_match.group(1)
+            continue
+        if position == len(segments) - 1:
+            # City, state and ZIP code without a comma before the state
+            state_match = _TRAILING_STATE_ZIP_CODE_PATTERN.search(segment)
+            if state_match is not None and state_match.group(1) in US_STATE_CODES:
+                zip_code = state_match.group(2) or zip_code
+                segment = segment[: state_match.start()]
+        if city is None:
+            city = segment
+    return ParsedAddress(
+        house_number=f"{int(house_number)}{letter}",
+        number=int(house_number),
+        street=normalize_street(street),
+        unit=unit,
+        city=city,
+        zip_code=zip_code,
+    )
+
+
+# rules rewriting a normalized address into its canonical key, applied in order
+_CANONICAL_COUNTRY_PATTERN = re.compile(r"\s(?:USA|US|UNITED STATES)$")
+_CANONICAL_ZIP_CODE_PATTERN = re.compile(r"\b(\d{5})\s?-\s?\d{4}\b")
+_CANONICAL_UNIT_PATTERN = re.compile(
+    rf"\s(?:{'|'.join(UNIT_DESIGNATORS)})\s+[A-Z0-9-]+\b"
+)
+_CANONICAL_SUFFIX_PATTERN = re.compile(
+    rf"\b(?:{'|'.join(STREET_SUFFIX_ABBREVIATIONS)})\b"
+)
+_CANONICAL_DIRECTIONAL_PATTERN = re.compile(
+    rf"\b(?:{'|'.join(DIRECTIONAL_ABBREVIATIONS)})\b"
+)
+
+
+def canonicalize_addresses(addresses: pd.Series, keep_unit: bool = False) -> pd.Series:
+    """Returns the canonical key of each address, so that differently written
+    addresses of the same parcel share the same key, e.g. "12 North Lake Avenue #3,
+    Altadena, CA 91001-1234, USA" and "12 N LAKE AVE, ALTADENA, CA 91001" both become
+    "12 N LAKE AVE ALTADENA CA 91001".
+
+    The addresses are normalized with normalize_addresses, then the country, the ZIP+4
+    extension and the unit are removed and every street suffix and directional is
+    abbreviated. A street named like a directional is abbreviated too, which still
+    gives the same key on both sides of a join. Each distinct address is only
+    canonicalized once.
+
+    Args:
+        addresses: Series of free form addresses. Null values stay null.
+        keep_unit: Whether to keep the unit, apartment or suite number.
+
+    Returns:
+        Series of canonical keys with the same index.
+    """
+    distinct_addresses = pd.Series(addresses.dropna().unique())
+    keys = normalize_addresses(
+        distinct_addresses.astype(str).str.replace("#", " UNIT ")
+    )
+    keys = keys.str.replace(_CANONICAL_COUNTRY_PATTERN, "", regex=True)
+    keys = keys.str.replace(_CANONICAL_ZIP_CODE_PATTERN, r"\1", regex=True)
+    if not keep_unit:
+        keys = keys.str.replace(_CANONICAL_UNIT_PATTERN, "", regex=True)
+    keys = keys.str.replace(
+        _CANONICAL_SUFFIX_PATTERN,
+        lambda match: STREET_SUFFIX_ABBREVIATIONS[match.group(0)],
+        regex=True,
+    )
+    keys = keys.str.replace(
+        _CANONICAL_DIRECTIONAL_PATTERN,
+        lambda match: DIRECTIONAL_ABBREVIATIONS[match.group(0)],
+        regex=True,
+    )
+    keys = keys.str.replace(_WHITESPACE_PATTERN, " ", regex=True).str.strip()
+    return addresses.map(dict(zip(distinct_addresses, keys)))
+
+
+def hash_address_keys(keys: pd.Series) -> pd.Series:
+    """Returns the 64 bit hash of each canonical key, compact and fast to join on.
+    Null keys stay null."""
+    hashed = pd.Series(pd.NA, index=keys.index, dtype="UInt64")
+    present = keys.notna()
+    hashed[present] = pd.util.hash_pandas_object(keys[present], index=False).to_numpy()
+    return hashed
@@ -0,0 +1,20 @@
+"""Utility for preparing DataFrame to be saved in a binary columnar format."""
+
+import pandas as pd
+from pandas import DataFrame
+
+
+def stringify_mixed_type_columns(df: DataFrame) -> DataFrame:
+    """Returns a copy of the DataFrame with the object columns mixing types, e.g.
+    numbers and text in a free form Remarks column, converted to text, since Arrow
+    based formats like Parquet and Feather cannot store them. Geometry and null
+    values are left as is."""
+    df = df.copy()
+    for column_name in df.columns:
+        if df[column_name].dtype != object:
+            continue
+        if pd.api.types.infer_dtype(df[column_name], skipna=True) != "string":
+            df[column_name] = df[column_name].where(
+                df[column_name].isna(), df[column_name].astype(str)
+            )
+    return df
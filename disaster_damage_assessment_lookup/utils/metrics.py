@@ -0,0 +1,408 @@
+"""Instrumentation recording the wall time, rows, counters and peak memory of each stage
+of a run, and saving them as a machine readable metrics file."""
+
+import cProfile
+import fnmatch
+import json
+import logging
+import os
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from disaster_damage_assessment_lookup.utils.schema.metrics import MetricsConfig
+
+logger = logging.getLogger(__name__)
+
+# seconds between two samples of the resident memory
+MEMORY_SAMPLE_INTERVAL_IN_SECONDS = 0.01
+
+# supported profile_type
+PROFILE_TYPES = ("cprofile", "tracemalloc")
+
+
+def get_rss_bytes() -> int:
+    """Returns the resident memory of the process, or its peak resident memory where
+    the current one cannot be read."""
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def to_mb(value_in_bytes: float) -> float:
+    """Returns the number of bytes in MB, rounded for the report."""
+    return round(value_in_bytes / 2**20, 1)
+
+
+def format_duration(seconds: float) -> str:
+    """Returns the duration as e.g. 1h02m03s, 2m03s or 3s."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m{seconds:02d}s"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+@dataclass
+class StageMetrics:
+    """Metrics of a single run of a stage, set by the instrumented code through
+    rows_in, rows_out and attributes while the stage runs."""
+
+    name: str
+    parent: Optional[str] = None
+    thread: Optional[str] = None
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start_offset_seconds: float = 0.0
+    wall_time_seconds: float = 0.0
+    start_rss_bytes: int = 0
+    peak_rss_bytes: int = 0
+    status: str = "running"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the metrics as a JSON serializable dictionary."""
+        rows = self.rows_in if self.rows_in is not None else self.rows_out
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "thread": self.thread,
+            "status": self.status,
+            "start_offset_seconds": round(self.start_offset_seconds, 4),
+            "wall_time_seconds": round(self.wall_time_seconds, 4),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_per_second": (
+                None
+                if rows is None
+                else round(rows / max(self.wall_time_seconds, 1e-9), 1)
+            ),
+            "start_rss_mb": to_mb(self.start_rss_bytes),
+            "peak_rss_mb": to_mb(self.peak_rss_bytes),
+            **self.attributes,
+        }
+
+
+class ProgressReporter:
+    """Log the progress of a long loop with its throughput and ETA, at most once every
+    interval_in_seconds. Safe to update from several threads."""
+
+    def __init__(self, description: str, total: int, interval_in_seconds: float):
+        self.description = description
+        self.total = total
+        self.interval_in_seconds = interval_in_seconds
+        self.count = 0
+        self.start_time = time.perf_counter()
+        self.last_report_time = self.start_time
+        self.lock = threading.Lock()
+
+    def update(self, count: int = 1):
+        """Add count items done, logging the progress if the interval has elapsed."""
+        with self.lock:
+            self.count += count
+            now = time.perf_counter()
+            if (
+                now - self.last_report_time < self.interval_in_seconds
+                and self.count < self.total
+            ):
+                return
+            self.last_report_time = now
+            elapsed = now - self.start_time
+            count = self.count
+        rate = count / max(elapsed, 1e-9)
+        remaining = max(self.total - count, 0)
+        eta = format_duration(remaining / rate) if rate > 0 else "unknown"
+        logger.info(
+            f"{self.description}: {count}/{self.total} "
+            f"({100 * count / max(self.total, 1):.1f}%), {rate:.1f}/s, ETA {eta}"
+        )
+
+
+class MetricsRecorder:
+    """Recorder of the stages and counters of a run.
+
+    A disabled recorder only measures the wall time of the stages for the logs and
+    keeps nothing, so the instrumented code costs nothing noticeable when the metrics
+    are not saved, e.g. in the long running lookup server.
+    When enabled, a background thread samples the resident memory to record the peak
+    of every running stage, and the stages matching profile_stages are profiled with
+    cProfile or tracemalloc.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        file_path: Optional[str] = None,
+        progress_interval_in_seconds: float = 10.0,
+        profile_stages: Optional[List[str]] = None,
+        profile_type: str = "cprofile",
+        profile_top_count: int = 20,
+    ):
+        """
+        Args:
+            enabled: Whether to sample the memory, profile and save the metrics.
+            file_path: Directory to save the metrics file and profiles to.
+            progress_interval_in_seconds: Seconds between two progress logs.
+            profile_stages: Names of the stages to profile, with fnmatch wildcards.
+            profile_type: cprofile to save a .prof file of each profiled stage, or
+                tracemalloc to record the lines allocating the most memory.
+            profile_top_count: Number of lines recorded by the tracemalloc profile.
+        """
+        if profile_type not in PROFILE_TYPES:
+            raise ValueError(
+                f"Unsupported profile_type '{profile_type}', "
+                f"must be one of {', '.join(PROFILE_TYPES)}"
+            )
+        self.enabled = enabled
+        self.file_path = file_path
+        self.progress_interval_in_seconds = progress_interval_in_seconds
+        self.profile_stages = profile_stages or []
+        self.profile_type = profile_type
+        self.profile_top_count = profile_top_count
+
+        self.run_id = (
+            f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}_{uuid.uuid4().hex[:8]}"
+        )
+        self.started_at = datetime.now(timezone.utc)
+        self.start_time = time.perf_counter()
+        self.stages: List[StageMetrics] = []
+        self.active_stages: List[StageMetrics] = []
+        self.counters: Dict[str, int] = {}
+        self.peak_rss_bytes = get_rss_bytes() if enabled else 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # Profiled stages tracing memory, tracemalloc is stopped after the last one
+        # if it was started by them
+        self.tracemalloc_users = 0
+        self.tracemalloc_started = False
+        self.stop_event = threading.Event()
+        self.sampler: Optional[threading.Thread] = None
+        if enabled:
+            self.sampler = threading.Thread(
+                target=self.sample_memory, name="metrics", daemon=True
+            )
+            self.sampler.start()
+
+    @classmethod
+    def from_config(cls, config: MetricsConfig) -> "MetricsRecorder":
+        """Create the recorder of a run from its configuration."""
+        return cls(
+            enabled=config.enabled,
+            file_path=config.file_path,
+            progress_interval_in_seconds=config.progress_interval_in_seconds,
+            profile_stages=config.profile_stages,
+            profile_type=config.profile_type,
+            profile_top_count=config.profile_top_count,
+        )
+
+    def sample_memory(self):
+        """Update the peak memory of the run and of the running stages."""
+        while not self.stop_event.wait(MEMORY_SAMPLE_INTERVAL_IN_SECONDS):
+            self.update_peak_memory()
+
+    def update_peak_memory(self):
+        rss_bytes = get_rss_bytes()
+        with self.lock:
+            self.peak_rss_bytes = max(self.peak_rss_bytes, rss_bytes)
+            for stage in self.active_stages:
+                stage.peak_rss_bytes = max(stage.peak_rss_bytes, rss_bytes)
+
+    def increment(self, name: str, value: int = 1):
+        """Add value to the counter of the given name, e.g. geocode.cache_hits."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def progress(self, description: str, total: int) -> ProgressReporter:
+        """Returns a reporter logging the progress of a loop over total items."""
+        return ProgressReporter(description, total, self.progress_interval_in_seconds)
+
+    def is_profiled(self, name: str) -> bool:
+        return self.enabled and any(
+            fnmatch.fnmatchcase(name, pattern) for pattern in self.profile_stages
+        )
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Iterator[StageMetrics]:
+        """Measure the stage run in the with block. The yielded StageMetrics can be
+        updated by the block, e.g. to set rows_out once known.
+
+        Stages can be nested, the enclosing stage of the same thread is recorded
+        as parent."""
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        metrics = StageMetrics(
+            name=name,
+            parent=stack[-1].name if stack else None,
+            thread=threading.current_thread().name,
+            rows_in=rows_in,
+            start_offset_seconds=time.perf_counter() - self.start_time,
+        )
+        stack.append(metrics)
+        if self.enabled:
+            metrics.start_rss_bytes = metrics.peak_rss_bytes = get_rss_bytes()
+            with self.lock:
+                self.active_stages.append(metrics)
+        profiler = self.start_profile(name) if self.is_profiled(name) else None
+        start_time = time.perf_counter()
+        try:
+            yield metrics
+            metrics.status = "done"
+        except BaseException:
+            metrics.status = "failed"
+            raise
+        finally:
+            metrics.wall_time_seconds = time.perf_counter() - start_time
+            if profiler is not None:
+                self.stop_profile(metrics, profiler)
+            stack.pop()
+            if self.enabled:
+                self.update_peak_memory()
+                with self.lock:
+                    self.active_stages.remove(metrics)
+                    self.stages.append(metrics)
+            logger.debug(f"Stage {name} took {metrics.wall_time_seconds:.2f} seconds")
+
+    def start_profile(self, name: str) -> Any:
+        """Start profiling the stage of the given name."""
+        if self.profile_type == "tracemalloc":
+            with self.lock:
+                if self.tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self.tracemalloc_started = True
+                self.tracemalloc_users += 1
+                # The peak is shared by the stages profiled at the same time
+                tracemalloc.reset_peak()
+            return True
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Only a single cProfile can be enabled at a time
+            logger.warning(f"Not profiling stage {name}, e: {e}")
+            return None
+        return profiler
+
+    def stop_profile(self, metrics: StageMetrics, profiler: Any):
+        """Stop profiling the stage and record the result. Errors are logged, so a
+        failed profile does not fail the stage."""
+        try:
+            if self.profile_type == "tracemalloc":
+                self.stop_tracemalloc(metrics)
+                return
+            profiler.disable()
+            profile_file_path = os.path.join(
+                self.file_path or ".",
+                f"{self.run_id}_{re.sub(r'[^A-Za-z0-9_.-]', '_', metrics.name)}.prof",
+            )
+            Path(profile_file_path).parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(profile_file_path)
+            metrics.attributes["profile_file"] = profile_file_path
+        except Exception as e:
+            logger.warning(f"Failed to profile stage {metrics.name}, e: {e}")
+
+    def stop_tracemalloc(self, metrics: StageMetrics):
+        """Record the memory traced during the stage, stopping tracemalloc once no
+        other profiled stage is running."""
+        with self.lock:
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                self.tracemalloc_users -= 1
+                if self.tracemalloc_users == 0 and self.tracemalloc_started:
+                    tracemalloc.stop()
+                    self.tracemalloc_started = False
+        metrics.attributes["tracemalloc_peak_mb"] = to_mb(peak)
+        metrics.attributes["tracemalloc_top"] = [
+            {"line": str(statistic.traceback), "size_mb": to_mb(statistic.size)}
+            for statistic in snapshot.statistics("lineno")[: self.profile_top_count]
+        ]
+
+    def to_dict(self, status: str = "done") -> Dict[str, Any]:
+        """Returns the metrics of the run as a JSON serializable dictionary."""
+        with self.lock:
+            stages = [stage.to_dict() for stage in self.stages]
+            counters = dict(sorted(self.counters.items()))
+            peak_rss_bytes = self.peak_rss_bytes
+        return {
+            "run_id": self.run_id,
+            "status": status,
+            "started_at": self.started_at.isoformat(),
+            "wall_time_seconds": round(time.perf_counter() - self.start_time, 4),
+            "peak_rss_mb": to_mb(peak_rss_bytes),
+            "counters": counters,
+            "stages": stages,
+        }
+
+    def close(self, status: str = "done") -> Optional[str]:
+        """Stop sampling the memory and save the metrics file when enabled.
+
+        Returns:
+            Path of the saved metrics file, None if not saved.
+        """
+        if self.sampler is not None:
+            self.stop_event.set()
+            self.sampler.join()
+            self.sampler = None
+        if not self.enabled or not self.file_path:
+            return None
+        self.update_peak_memory()
+        metrics_file_path = os.path.join(self.file_path, f"{self.run_id}_metrics.json")
+        Path(self.file_path).mkdir(parents=True, exist_ok=True)
+        with open(metrics_file_path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(status), file, indent=2, default=str)
+        logger.info(f"Saved run metrics to {metrics_file_path}")
+        return metrics_file_path
+
+
+# Recorder used by the instrumented code, replaced by the entry points
+recorder = MetricsRecorder()
+
+
+def get_recorder() -> MetricsRecorder:
+    """Returns the recorder of the current run."""
+    return recorder
+
+
+def set_recorder(new_recorder: MetricsRecorder) -> MetricsRecorder:
+    """Replace the recorder of the current run.
+
+    Returns:
+        The previous recorder.
+    """
+    global recorder  # pylint: disable=global-statement
+    previous, recorder = recorder, new_recorder
+    return previous
+
+
+def stage(name: str, rows_in: Optional[int] = None):
+    """Measure the stage run in the with block with the recorder of the current run."""
+    return recorder.stage(name, rows_in=rows_in)
+
+
+def increment(name: str, value: int = 1):
+    """Add value to the counter of the given name of the current run."""
+    recorder.increment(name, value)
+
+
+def progress(description: str, total: int) -> ProgressReporter:
+    """Returns a reporter logging the progress of a loop over total items."""
+    return recorder.progress(description, total)
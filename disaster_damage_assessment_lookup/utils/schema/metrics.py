@@ -0,0 +1,34 @@
+"""Schema definition for the run metrics."""
+
+from dataclasses import field
+from typing import List, Optional
+
+from marshmallow_dataclass import dataclass
+
+
+@dataclass
+class MetricsConfig:
+    """Configuration for the run metrics."""
+
+    enabled: Optional[bool] = False
+    """Whether to record the peak memory of each stage and save the metrics file of
+    the run. The wall time of the stages is always logged at debug level.
+    Default to False."""
+
+    file_path: Optional[str] = "output_data/metrics"
+    """Directory to save the metrics file of each run and the profiles to."""
+
+    progress_interval_in_seconds: Optional[float] = 10.0
+    """Seconds between two progress logs of the geocoding. Default to 10."""
+
+    profile_stages: Optional[List[str]] = field(default_factory=list)
+    """Names of the stages to profile, with fnmatch wildcards, e.g. matcher.* or
+    excel.intake_form.geocode. Optional and will not profile any stage if omitted."""
+
+    profile_type: Optional[str] = "cprofile"
+    """cprofile to save a .prof file of each profiled stage, readable with pstats or
+    snakeviz, or tracemalloc to record the lines allocating the most memory in the
+    metrics file. Default to cprofile."""
+
+    profile_top_count: Optional[int] = 20
+    """Number of lines recorded by the tracemalloc profile. Default to 20."""
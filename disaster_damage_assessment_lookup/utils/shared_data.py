@@ -0,0 +1,177 @@
+"""Reference data published once as memory mapped Arrow IPC files, so worker processes
+attach to the same pages instead of each unpickling its own copy."""
+
+import glob
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import geopandas as gpd
+import numpy as np
+import pyarrow as pa
+import shapely
+from geopandas import GeoDataFrame
+
+logger = logging.getLogger(__name__)
+
+# prefix of the store directories, followed by the id of the owning process
+STORE_DIRECTORY_PREFIX = "disaster_damage_assessment_lookup_shared_"
+
+# RAM backed directory of Linux, so the published files never hit the disk
+SHARED_MEMORY_PATH = "/dev/shm"
+
+# tables attached by the current process, by file path
+_attached_tables: Dict[str, pa.Table] = {}
+
+
+def get_default_base_path() -> str:
+    """Returns /dev/shm when available, the temporary directory otherwise."""
+    if os.path.isdir(SHARED_MEMORY_PATH) and os.access(SHARED_MEMORY_PATH, os.W_OK):
+        return SHARED_MEMORY_PATH
+    return tempfile.gettempdir()
+
+
+def is_process_alive(pid: int) -> bool:
+    """Whether a process with the given id is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def remove_stale_stores(base_path: str):
+    """Remove the store directories left by processes that are no longer running, e.g.
+    killed before they could clean up."""
+    pattern = re.compile(rf"^{STORE_DIRECTORY_PREFIX}(\d+)_")
+    for directory in glob.glob(os.path.join(base_path, f"{STORE_DIRECTORY_PREFIX}*")):
+        match = pattern.match(os.path.basename(directory))
+        if match and not is_process_alive(int(match.group(1))):
+            logger.info(f"Removing shared data {directory} left by a stopped run")
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def attach_table(file_path: str) -> pa.Table:
+    """Returns the Arrow table of the published file, memory mapped without copying.
+    Each process maps the file once."""
+    table = _attached_tables.get(file_path)
+    if table is None:
+        table = pa.ipc.open_file(pa.memory_map(file_path)).read_all()
+        _attached_tables[file_path] = table
+    return table
+
+
+@dataclass(frozen=True)
+class SharedDataset:
+    """Handle of a GeoDataFrame published to a SharedDataStore, cheap to send to
+    another process."""
+
+    file_path: str
+    geometry_column_name: str = "geometry"
+
+    def get_table(self) -> pa.Table:
+        """Returns the memory mapped Arrow table, the geometry encoded as WKB."""
+        return attach_table(self.file_path)
+
+    def get_geometries(self, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Returns the geometries at the given positions, decoding only those from
+        the memory mapped WKB. Every geometry if positions is omitted."""
+        column = self.get_table().column(self.geometry_column_name)
+        if positions is not None:
+            column = column.take(pa.array(positions))
+        return shapely.from_wkb(column.to_numpy(zero_copy_only=False))
+
+    def to_geodataframe(self) -> GeoDataFrame:
+        """Returns the published GeoDataFrame, read from the memory mapped file."""
+        return gpd.read_feather(self.file_path, memory_map=True)
+
+
+@dataclass(frozen=True)
+class SharedGeometries:
+    """Geometries at the given positions of a SharedDataset, sent to a worker
+    process instead of the geometries themselves."""
+
+    dataset: SharedDataset
+    positions: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def get_geometries(self) -> np.ndarray:
+        """Returns the geometries, decoded from the memory mapped dataset."""
+        return self.dataset.get_geometries(self.positions)
+
+
+class SharedDataStore:
+    """Directory of the GeoDataFrame published for the worker processes of a run, as
+    uncompressed Arrow IPC files that every process memory maps.
+
+    The directory is removed on close, when the store is garbage collected or when the
+    interpreter exits. Directories left by a killed run are removed by the next store
+    created in the same base path.
+    """
+
+    def __init__(self, base_path: Optional[str] = None):
+        """
+        Args:
+            base_path: Directory to create the store directory in. Optional and will
+                use /dev/shm when available, the temporary directory otherwise.
+        """
+        base_path = base_path or get_default_base_path()
+        remove_stale_stores(base_path)
+        self.path = os.path.join(
+            base_path, f"{STORE_DIRECTORY_PREFIX}{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        )
+        os.makedirs(self.path)
+        self.datasets: Dict[str, SharedDataset] = {}
+        # The matchers publish from several threads, e.g. the same data joined
+        # against by two matchers
+        self.lock = threading.Lock()
+        self.finalizer = weakref.finalize(
+            self, shutil.rmtree, self.path, ignore_errors=True
+        )
+
+    def __enter__(self) -> "SharedDataStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Remove the published files. Processes still attached keep their mapping
+        until they exit."""
+        with self.lock:
+            self.datasets.clear()
+            self.finalizer()
+
+    def publish(self, key: str, gdf: GeoDataFrame) -> SharedDataset:
+        """Publish the GeoDataFrame under the given key, only on the first call.
+
+        Returns:
+            Handle to attach to the published GeoDataFrame from any process.
+        """
+        with self.lock:
+            dataset = self.datasets.get(key)
+            if dataset is None:
+                file_path = os.path.join(
+                    self.path, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', key)}.arrow"
+                )
+                temporary_file_path = f"{file_path}.tmp"
+                # Uncompressed Arrow IPC file can be memory mapped without copying
+                gdf.to_feather(
+                    temporary_file_path, compression="uncompressed", index=False
+                )
+                os.replace(temporary_file_path, file_path)
+                dataset = SharedDataset(file_path, gdf.geometry.name)
+                self.datasets[key] = dataset
+                logger.debug(f"Published {len(gdf)} rows of {key} to {file_path}")
+        return dataset
@@ -0,0 +1,42 @@
+from disaster_damage_assessment_lookup.data_loader.local_geocoder import (
+    is_same_locality,
+)
+from disaster_damage_assessment_lookup.utils.address import ParsedAddress, parse_address
+
+
+def test_parse_address_with_state_in_its_own_segment():
+    assert parse_address("106 Pine Way, Pacific Palisades, CA 90272") == ParsedAddress(
+        house_number="106",
+        number=106,
+        street="PINE WAY",
+        city="PACIFIC PALISADES",
+        zip_code="90272",
+    )
+
+
+def test_parse_address_with_state_after_the_city():
+    assert parse_address("106 Pine Way, Pacific Palisades CA 90272") == ParsedAddress(
+        house_number="106",
+        number=106,
+        street="PINE WAY",
+        city="PACIFIC PALISADES",
+        zip_code="90272",
+    )
+    assert parse_address("12 North Lake Avenue #3, Altadena CA 91001-1234, USA") == (
+        ParsedAddress(
+            house_number="12",
+            number=12,
+            street="N LAKE AVE",
+            unit="3",
+            city="ALTADENA",
+            zip_code="91001",
+        )
+    )
+    assert parse_address("1 Main St, Altadena CA").city == "ALTADENA"
+
+
+def test_same_locality_with_and_without_comma_before_the_state():
+    assert is_same_locality(
+        parse_address("106 Pine Way, Pacific Palisades CA 90272"),
+        parse_address("106 PINE WAY, PACIFIC PALISADES, CA 90272"),
+    )
@@ -0,0 +1,113 @@
+from typing import List
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from disaster_damage_assessment_lookup.matcher.cascade import (
+    CascadeMatcher,
+    match_by_cascade,
+)
+from disaster_damage_assessment_lookup.matcher.dataset_registry import DatasetRegistry
+from disaster_damage_assessment_lookup.matcher.schema.matcher import MatcherConfig
+
+
+def get_config(strategies: List[str], **key_value) -> MatcherConfig:
+    return MatcherConfig.Schema().load(
+        {
+            "label": "matched",
+            "unmatched_label": "unmatched",
+            "matcher_type": "cascade",
+            "source_data": "source",
+            "match_against_data": "reference",
+            "matcher_data_key_list": {"strategies": strategies},
+            "matcher_data_key_value": {
+                "on_column_name": "SITEADDRESS",
+                "max_match_distance_meter": "40",
+                **key_value,
+            },
+            "save_file": None,
+            "column_suffix": {"left": "source", "right": "reference"},
+        }
+    )
+
+
+@pytest.fixture
+def gdf_databases() -> DatasetRegistry:
+    source = gpd.GeoDataFrame(
+        {"SITEADDRESS": ["1 MAIN ST", "2 OAK AVE", "3 PINE RD", None]},
+        geometry=shapely.points([[0, 0], [100, 0], [500, 500], [1000, 0]]),
+        crs=3857,
+    )
+    reference = gpd.GeoDataFrame(
+        {
+            "SITEADDRESS": ["1 MAIN ST", "9 ELM ST", "8 BIRCH LN", "7 CEDAR CT"],
+            "DAMAGE": ["Destroyed", "Affected", "Minor", "No Damage"],
+        },
+        geometry=shapely.points([[5000, 0], [110, 0], [1005, 0], [0, 20]]),
+        crs=3857,
+    )
+    return DatasetRegistry({"source": source, "reference": reference})
+
+
+def test_strategies_run_in_order_on_the_remaining_rows(gdf_databases, monkeypatch):
+    received = {}
+    for name in ("match_address", "match_coordinate"):
+        strategy = getattr(CascadeMatcher, name)
+
+        def record(self, positions, name=name, strategy=strategy):
+            received[name] = positions.tolist()
+            return strategy(self, positions)
+
+        monkeypatch.setattr(CascadeMatcher, name, record)
+
+    config = get_config(["address", "coordinate"])
+    matched, unmatched = CascadeMatcher(config, gdf_databases).run(
+        ["address", "coordinate"]
+    )
+
+    assert list(received) == ["match_address", "match_coordinate"]
+    assert received["match_address"] == [0, 1, 2, 3]
+    # The row matched by address is not handed to the next strategy
+    assert received["match_coordinate"] == [1, 2, 3]
+    assert matched.index.tolist() == [0, 1, 3]
+    assert matched["match_method"].tolist() == ["address", "coordinate", "coordinate"]
+    assert matched["DAMAGE"].tolist() == ["Destroyed", "Affected", "Minor"]
+    np.testing.assert_allclose(matched["match_confidence"], [1.0, 0.75, 0.875])
+    np.testing.assert_allclose(matched["distance"], [np.nan, 10.0, 5.0])
+    assert unmatched.index.tolist() == [2]
+
+
+def test_first_strategy_takes_precedence(gdf_databases):
+    config = get_config(["coordinate", "address"])
+    matched, unmatched = CascadeMatcher(config, gdf_databases).run(
+        ["coordinate", "address"]
+    )
+
+    # The row near a reference point of another address matches it by coordinate
+    assert matched.loc[0, "match_method"] == "coordinate"
+    assert matched.loc[0, "DAMAGE"] == "No Damage"
+    assert (matched["match_method"] == "coordinate").all()
+    assert unmatched.index.tolist() == [2]
+
+
+def test_custom_column_names(gdf_databases):
+    config = get_config(
+        ["address"],
+        method_column_name="method",
+        confidence_column_name="confidence",
+    )
+    matched, unmatched = match_by_cascade(config, gdf_databases)
+
+    assert matched["method"].tolist() == ["address"]
+    assert matched["confidence"].tolist() == [1.0]
+    assert "match_method" not in matched
+    assert unmatched.index.tolist() == [1, 2, 3]
+
+
+def test_invalid_strategies(gdf_databases):
+    with pytest.raises(ValueError, match="strategies must be added"):
+        match_by_cascade(get_config([]), gdf_databases)
+    with pytest.raises(ValueError, match="Unsupported strategy 'parcel'"):
+        match_by_cascade(get_config(["address", "parcel"]), gdf_databases)
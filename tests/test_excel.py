@@ -0,0 +1,90 @@
+import pandas as pd
+
+from disaster_damage_assessment_lookup.benchmark.fake_geocoder import FakeGeocoder
+from disaster_damage_assessment_lookup.data_loader.excel import (
+    LATITUDE_COLUMN_NAME,
+    ExcelGeoDataFrameLoader,
+)
+from disaster_damage_assessment_lookup.data_loader.schema.excel import (
+    AddressFormattingConfig,
+    ExcelGeoDataFrameConfig,
+    ExcelGeoDataFrameLoaderConfig,
+    PostProcessingConfig,
+)
+
+
+def get_response(address: str) -> dict:
+    return {
+        "formatted_address": address,
+        "geometry": {
+            "location": {"lat": 34.1, "lng": -118.1},
+            "location_type": "ROOFTOP",
+        },
+        "partial_match": False,
+    }
+
+
+def write_intake(tmp_path, keys, addresses) -> ExcelGeoDataFrameConfig:
+    pd.DataFrame({"Intake #": keys, "Address": addresses}).to_excel(
+        tmp_path / "intake.xlsx", sheet_name="Intake", index=False
+    )
+    return ExcelGeoDataFrameConfig(
+        file_name="intake.xlsx",
+        sheet_name="Intake",
+        label="intake",
+        geocode_column_name="Address",
+        load_new_data=True,
+        key_column_name="Intake #",
+        cache_format="parquet",
+        post_processing=PostProcessingConfig(
+            address_formatting=AddressFormattingConfig(
+                normalized_address_output_column_name="SITEADDRESS"
+            )
+        ),
+    )
+
+
+def get_loader(geocoder: FakeGeocoder, **kwargs) -> ExcelGeoDataFrameLoader:
+    return ExcelGeoDataFrameLoader(
+        ExcelGeoDataFrameLoaderConfig(
+            google_server_api_key="unused",
+            min_delay_between_requests_in_seconds=0,
+            **kwargs,
+        ),
+        geolocator=geocoder,
+    )
+
+
+def test_load_twice_with_mixed_type_keys_and_parquet_cache(tmp_path):
+    addresses = ["1 Main St", "2 Main St", "3 Main St"]
+    config = write_intake(tmp_path, [1, 2, "3A"], addresses)
+    geocoder = FakeGeocoder({address: get_response(address) for address in addresses})
+    loader = get_loader(geocoder)
+
+    for _ in range(3):
+        gdf = loader.load(config, str(tmp_path), str(tmp_path))
+
+    assert sorted(gdf["Intake #"].astype(str)) == ["1", "2", "3A"]
+    assert geocoder.get_stats()["requests"] == 3
+
+
+def test_load_geocodes_the_failed_rows_again(tmp_path):
+    addresses = ["1 Main St", "2 Main St"]
+    config = write_intake(tmp_path, [1, 2], addresses)
+    responses = {address: get_response(address) for address in addresses}
+
+    failing_geocoder = FakeGeocoder(responses, failure_rate=1.0)
+    gdf = get_loader(failing_geocoder, geocoder_type="concurrent", max_retries=0).load(
+        config, str(tmp_path), str(tmp_path)
+    )
+    assert gdf[LATITUDE_COLUMN_NAME].isna().all()
+
+    geocoder = FakeGeocoder(responses)
+    gdf = get_loader(geocoder).load(config, str(tmp_path), str(tmp_path))
+    assert geocoder.get_stats()["requests"] == 2
+    assert gdf[LATITUDE_COLUMN_NAME].tolist() == [34.1, 34.1]
+
+    # Nothing left to geocode on the next run
+    geocoder = FakeGeocoder(responses)
+    get_loader(geocoder).load(config, str(tmp_path), str(tmp_path))
+    assert geocoder.get_stats()["requests"] == 0
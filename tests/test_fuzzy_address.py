@@ -0,0 +1,109 @@
+import geopandas as gpd
+import pandas as pd
+import pytest
+import shapely
+
+from disaster_damage_assessment_lookup.matcher.by_fuzzy_address import (
+    FuzzyAddressIndex,
+    get_blocking_keys,
+    match_by_fuzzy_address,
+)
+from disaster_damage_assessment_lookup.matcher.dataset_registry import DatasetRegistry
+from disaster_damage_assessment_lookup.matcher.schema.matcher import (
+    ColumnSuffixConfig,
+    MatcherConfig,
+)
+from disaster_damage_assessment_lookup.utils.address import normalize_addresses
+
+ADDRESSES = [
+    "123 Main Street, Santa Rosa, CA 95401",
+    "123 Main St Santa Rosa CA 95404",
+    "123 Oak Ave, Santa Rosa, CA 95401",
+    "45 Elm St, Santa Rosa CA 95401",
+    "PO Box 12",
+]
+
+
+@pytest.fixture
+def index() -> FuzzyAddressIndex:
+    return FuzzyAddressIndex(pd.Series(ADDRESSES))
+
+
+def normalize(address: str) -> str:
+    return normalize_addresses(pd.Series([address]))[0]
+
+
+def test_get_blocking_keys():
+    assert get_blocking_keys("123 MAIN ST SANTA ROSA CA 95401-1234") == (
+        "123",
+        "95401",
+    )
+    assert get_blocking_keys("123 MAIN ST") == ("123", None)
+    assert get_blocking_keys("PO BOX 95401") == (None, "95401")
+
+
+def test_candidates_blocked_by_house_number_and_zip_code(index):
+    # Same house number and ZIP code only
+    assert index.get_candidates(normalize("123 Main St, CA 95401")) == [0, 2]
+    # No indexed address in the ZIP code, falls back to the house number
+    assert index.get_candidates(normalize("123 Main St, CA 95409")) == [0, 1, 2]
+    assert index.get_candidates(normalize("123 Main St")) == [0, 1, 2]
+    assert index.get_candidates(normalize("99 Main St")) == []
+    assert index.get_candidates(normalize("Box 12")) == [4]
+
+
+def test_find_best_match(index):
+    assert index.find_best_match(normalize("123 MAIN STREET SANTA ROSA CA 95401")) == (
+        ADDRESSES[0],
+        1.0,
+    )
+    address, score = index.find_best_match(normalize("123 Main Stret Santa Rosa 95401"))
+    assert address == ADDRESSES[0]
+    assert 0.8 < score < 1
+    # The closer address in another ZIP code is never compared
+    address, _ = index.find_best_match(normalize("123 Main St Santa Rosa CA 95401"))
+    assert address == ADDRESSES[0]
+    assert index.find_best_match(normalize("99 Main St")) == (None, 0.0)
+
+
+def test_match_by_fuzzy_address_min_similarity_score():
+    source = gpd.GeoDataFrame(
+        {
+            "SITEADDRESS": [
+                "123 Main Stret Santa Rosa CA 95401",
+                "123 Main Santa Rosa",
+                "99 Main St",
+                None,
+            ]
+        },
+        geometry=shapely.points([[0, 0], [1, 0], [2, 0], [3, 0]]),
+        crs=3857,
+    )
+    reference = pd.DataFrame({"SITEADDRESS": ADDRESSES, "DAMAGE": list("ABCDE")})
+    config = MatcherConfig(
+        label="matched",
+        unmatched_label="unmatched",
+        matcher_type="by_fuzzy_address",
+        source_data="source",
+        match_against_data="reference",
+        matcher_data_key_value={
+            "on_column_name": "SITEADDRESS",
+            "min_similarity_score": "0.8",
+        },
+        save_file=None,
+        column_suffix=ColumnSuffixConfig(left="_source", right="_reference"),
+    )
+
+    matched, unmatched = match_by_fuzzy_address(
+        config, DatasetRegistry({"source": source, "reference": reference})
+    )
+
+    assert matched["SITEADDRESS_source"].tolist() == [
+        "123 Main Stret Santa Rosa CA 95401"
+    ]
+    assert matched["DAMAGE"].tolist() == ["A"]
+    assert (matched["similarity_score"] >= 0.8).all()
+    # Below the threshold or without candidate, the row without address is dropped
+    assert unmatched["SITEADDRESS"].tolist() == ["123 Main Santa Rosa", "99 Main St"]
+    assert (unmatched["similarity_score"] < 0.8).all()
+    assert "_fuzzy_matched_address" not in unmatched
@@ -0,0 +1,79 @@
+import pytest
+
+from disaster_damage_assessment_lookup.data_loader import geocode_cache
+from disaster_damage_assessment_lookup.data_loader.geocode_cache import GeocodeCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(geocode_cache.time, "time", clock.time)
+    return clock
+
+
+def test_get_by_normalized_address(tmp_path, clock):
+    cache = GeocodeCache(str(tmp_path / "cache.sqlite"))
+    cache.put_many({"1 Main St.": "response", "2 Main St": None})
+    assert cache.get_many(["1 MAIN ST", "1 main st", "2 Main St"]) == {
+        "1 MAIN ST": "response",
+        "1 main st": "response",
+    }
+    # Empty responses are not cached, so they are requested again
+    assert len(cache) == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+    cache.close()
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    file_path = str(tmp_path / "cache.sqlite")
+    cache = GeocodeCache(file_path, ttl_in_days=1)
+    cache.put("1 Main St", "old")
+    clock.now += 12 * 60 * 60
+    cache.put("2 Main St", "new")
+    assert cache.get("1 Main St") == "old"
+
+    clock.now += 13 * 60 * 60
+    assert cache.get("1 Main St") is None
+    assert cache.get("2 Main St") == "new"
+    cache.close()
+
+    # The expired entries are purged when the cache is opened again
+    cache = GeocodeCache(file_path, ttl_in_days=1)
+    assert len(cache) == 1
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = GeocodeCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.put("1 Main St", "1")
+    clock.now += 1
+    cache.put("2 Main St", "2")
+    clock.now += 1
+    # Reading the first entry makes the second one the least recently used
+    assert cache.get("1 Main St") == "1"
+    clock.now += 1
+    cache.put("3 Main St", "3")
+    assert len(cache) == 2
+    assert cache.get_many(["1 Main St", "2 Main St", "3 Main St"]) == {
+        "1 Main St": "1",
+        "3 Main St": "3",
+    }
+    cache.close()
+
+
+def test_entries_are_kept_across_runs(tmp_path, clock):
+    file_path = str(tmp_path / "cache.sqlite")
+    cache = GeocodeCache(file_path)
+    cache.put("1 Main St", "response")
+    cache.close()
+    cache = GeocodeCache(file_path)
+    assert cache.get("1 Main St") == "response"
+    cache.close()
@@ -0,0 +1,65 @@
+from disaster_damage_assessment_lookup.data_loader.geocode_checkpoint import (
+    GeocodeCheckpoint,
+)
+
+
+def test_resume_from_the_flushed_responses(tmp_path):
+    file_path = str(tmp_path / "checkpoint" / "intake.jsonl")
+    checkpoint = GeocodeCheckpoint(
+        file_path, flush_every_rows=2, flush_interval_in_seconds=3600
+    )
+    checkpoint.add("1 Main St", "response 1")
+    assert not (tmp_path / "checkpoint").exists()
+    checkpoint.add("2 Main St", None)
+    checkpoint.add("3 Main St", "response 3")
+
+    # A new run only sees the flushed responses
+    resumed = GeocodeCheckpoint(file_path)
+    assert resumed.get_many(["1 Main St", "2 Main St", "3 Main St", None]) == {
+        "1 Main St": "response 1",
+        "2 Main St": None,
+    }
+
+    checkpoint.flush()
+    assert GeocodeCheckpoint(file_path).load() == {
+        "1 Main St": "response 1",
+        "2 Main St": None,
+        "3 Main St": "response 3",
+    }
+
+
+def test_flush_after_the_interval(tmp_path):
+    file_path = str(tmp_path / "intake.jsonl")
+    checkpoint = GeocodeCheckpoint(
+        file_path, flush_every_rows=100, flush_interval_in_seconds=0
+    )
+    checkpoint.add("1 Main St", "response 1")
+    assert GeocodeCheckpoint(file_path).load() == {"1 Main St": "response 1"}
+
+
+def test_recover_from_a_line_cut_short(tmp_path):
+    file_path = tmp_path / "intake.jsonl"
+    file_path.write_text(
+        '{"address": "1 Main St", "response": "response 1"}\n{"address": "2 Ma'
+    )
+    checkpoint = GeocodeCheckpoint(str(file_path))
+    assert checkpoint.load() == {"1 Main St": "response 1"}
+
+    # The next responses start on a new line
+    checkpoint.add("3 Main St", "response 3")
+    checkpoint.flush()
+    assert GeocodeCheckpoint(str(file_path)).load() == {
+        "1 Main St": "response 1",
+        "3 Main St": "response 3",
+    }
+
+
+def test_remove(tmp_path):
+    file_path = tmp_path / "intake.jsonl"
+    checkpoint = GeocodeCheckpoint(str(file_path), flush_every_rows=1)
+    checkpoint.add("1 Main St", "response 1")
+    assert file_path.exists()
+    checkpoint.remove()
+    assert not file_path.exists()
+    assert checkpoint.get_many(["1 Main St"]) == {}
+    checkpoint.remove()
@@ -0,0 +1,126 @@
+import json
+import time
+
+import pytest
+from geopy.exc import GeocoderQuotaExceeded, GeocoderServiceError
+from geopy.location import Location
+
+from disaster_damage_assessment_lookup.benchmark.fake_geocoder import FakeGeocoder
+from disaster_damage_assessment_lookup.data_loader.geocoder import (
+    ConcurrentGeocoder,
+    TokenBucket,
+)
+
+
+class FlakyGeocoder:
+    """Geocoder raising the given errors on the first requests, then finding every
+    address."""
+
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.request_times = []
+
+    def geocode(self, query, **kwargs):
+        self.request_times.append(time.monotonic())
+        if self.errors:
+            raise self.errors.pop(0)
+        return Location(query, (34.1, -118.1), {"formatted_address": query})
+
+
+def get_response(address: str) -> dict:
+    return {
+        "formatted_address": address,
+        "geometry": {"location": {"lat": 34.1, "lng": -118.1}},
+    }
+
+
+def test_token_bucket_paces_the_requests():
+    bucket = TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    # The first token is available right away, then one every 1 / 20 seconds
+    assert time.monotonic() - start >= 4 / 20 * 0.9
+
+
+def test_token_bucket_pause_blocks_every_worker():
+    bucket = TokenBucket(rate=100)
+    bucket.pause(0.2)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.2 * 0.9
+
+
+def test_token_bucket_requires_a_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_request_retries_throttled_requests_with_backoff():
+    geocoder = FlakyGeocoder(GeocoderQuotaExceeded(), GeocoderQuotaExceeded())
+    concurrent_geocoder = ConcurrentGeocoder(
+        geocoder.geocode,
+        requests_per_second=1000,
+        max_retries=2,
+        backoff_base_in_seconds=0.05,
+    )
+    location, completed = concurrent_geocoder.request("1 Main St")
+    assert completed
+    assert location.address == "1 Main St"
+    first, second, third = geocoder.request_times
+    # Exponential backoff with up to 50% jitter, shared through the token bucket
+    assert 0.05 * 0.9 <= second - first
+    assert 0.1 * 0.9 <= third - second
+
+
+def test_request_gives_up_after_max_retries():
+    geocoder = FlakyGeocoder(*[GeocoderQuotaExceeded()] * 3)
+    concurrent_geocoder = ConcurrentGeocoder(
+        geocoder.geocode,
+        requests_per_second=1000,
+        max_retries=2,
+        backoff_base_in_seconds=0.01,
+    )
+    assert concurrent_geocoder.request("1 Main St") == (None, False)
+    assert len(geocoder.request_times) == 3
+
+
+def test_request_does_not_retry_other_errors():
+    geocoder = FlakyGeocoder(GeocoderServiceError("REQUEST_DENIED"))
+    concurrent_geocoder = ConcurrentGeocoder(geocoder.geocode, max_retries=5)
+    assert concurrent_geocoder.request("1 Main St") == (None, False)
+    assert len(geocoder.request_times) == 1
+
+
+def test_request_tells_not_found_from_failed():
+    concurrent_geocoder = ConcurrentGeocoder(FakeGeocoder({}).geocode)
+    assert concurrent_geocoder.request("1 Main St") == (None, True)
+    assert concurrent_geocoder.geocode("1 Main St") is None
+
+
+def test_geocode_all_requests_each_address_once():
+    responses = {"1 Main St": get_response("1 Main St"), "2 Main St": None}
+    geocoder = FakeGeocoder(responses)
+    completed = []
+    result = ConcurrentGeocoder(
+        geocoder.geocode, max_concurrent_requests=4, requests_per_second=1000
+    ).geocode_all(
+        ["1 Main St", "2 Main St", "1 Main St"],
+        on_result=lambda address, response: completed.append(address),
+    )
+    assert geocoder.get_stats()["requests"] == 2
+    assert json.loads(result["1 Main St"]) == responses["1 Main St"]
+    assert result["2 Main St"] is None
+    assert sorted(completed) == ["1 Main St", "2 Main St"]
+
+
+def test_geocode_all_does_not_report_failed_requests():
+    geocoder = FakeGeocoder({"1 Main St": get_response("1 Main St")}, failure_rate=1)
+    completed = []
+    result = ConcurrentGeocoder(
+        geocoder.geocode, requests_per_second=1000, max_retries=0
+    ).geocode_all(
+        ["1 Main St"], on_result=lambda address, response: completed.append(address)
+    )
+    assert result == {"1 Main St": None}
+    assert completed == []
@@ -0,0 +1,46 @@
+import threading
+import tracemalloc
+
+from disaster_damage_assessment_lookup.utils.metrics import MetricsRecorder
+
+
+def test_overlapping_tracemalloc_stages_on_different_threads(tmp_path):
+    recorder = MetricsRecorder(
+        enabled=True,
+        file_path=str(tmp_path),
+        profile_stages=["s*"],
+        profile_type="tracemalloc",
+    )
+    started = threading.Barrier(2)
+    first_done = threading.Event()
+    errors = []
+
+    def run(name: str, wait_for_first: bool):
+        try:
+            with recorder.stage(name):
+                started.wait()
+                if wait_for_first:
+                    first_done.wait()
+                data = [bytearray(1024) for _ in range(100)]
+                del data
+        except Exception as e:
+            errors.append(e)
+        finally:
+            if not wait_for_first:
+                first_done.set()
+
+    threads = [
+        threading.Thread(target=run, args=("s1", False)),
+        threading.Thread(target=run, args=("s2", True)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.close()
+
+    assert errors == []
+    assert not tracemalloc.is_tracing()
+    stages = {stage.name: stage for stage in recorder.stages}
+    assert stages["s1"].status == stages["s2"].status == "done"
+    assert "tracemalloc_peak_mb" in stages["s2"].attributes
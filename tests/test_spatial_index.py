@@ -0,0 +1,142 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from disaster_damage_assessment_lookup.matcher.spatial_index import (
+    PackedHilbertRTree,
+    load_or_build,
+)
+from disaster_damage_assessment_lookup.matcher.tiling import sort_pairs
+
+
+@pytest.fixture
+def points() -> np.ndarray:
+    # Integer coordinates, so many inputs are equidistant from several tree points
+    rng = np.random.default_rng(0)
+    points = shapely.points(np.round(rng.uniform(0, 1000, (500, 2))))
+    points[7] = None
+    return points
+
+
+@pytest.fixture
+def tree_geometries() -> np.ndarray:
+    rng = np.random.default_rng(1)
+    geometries = np.concatenate(
+        [
+            shapely.points(np.round(rng.uniform(0, 1000, (300, 2)))),
+            shapely.buffer(shapely.points(rng.uniform(0, 1000, (20, 2))), 30),
+        ]
+    )
+    geometries[3] = None
+    return geometries
+
+
+def assert_same_pairs(actual, expected):
+    assert len(actual) == len(expected)
+    for actual_array, expected_array in zip(actual, expected):
+        np.testing.assert_array_equal(actual_array, expected_array)
+
+
+@pytest.mark.parametrize("node_size", [2, 16])
+@pytest.mark.parametrize(
+    "predicate,distance", [(None, None), ("intersects", None), ("dwithin", 25.0)]
+)
+def test_query_matches_geopandas(
+    points, tree_geometries, node_size, predicate, distance
+):
+    index = PackedHilbertRTree.build(tree_geometries, node_size=node_size)
+    sindex = gpd.GeoSeries(tree_geometries).sindex
+    kwargs = {} if distance is None else {"distance": distance}
+    assert_same_pairs(
+        index.query(points, predicate=predicate, **kwargs),
+        sort_pairs(*sindex.query(points, predicate=predicate, **kwargs)),
+    )
+
+
+@pytest.mark.parametrize("return_all", [True, False])
+@pytest.mark.parametrize("max_distance", [1.0, 10.0, 50.0])
+def test_nearest_matches_geopandas(points, tree_geometries, return_all, max_distance):
+    index = PackedHilbertRTree.build(tree_geometries, node_size=4)
+    (input_positions, tree_positions), distances = index.nearest(
+        points, return_all=return_all, max_distance=max_distance, return_distance=True
+    )
+    (expected_input, expected_tree), expected_distances = gpd.GeoSeries(
+        tree_geometries
+    ).sindex.nearest(
+        points,
+        return_all=return_all,
+        max_distance=max_distance,
+        return_distance=True,
+    )
+    if return_all:
+        assert_same_pairs(
+            (input_positions, tree_positions, distances),
+            sort_pairs(expected_input, expected_tree, expected_distances),
+        )
+    else:
+        # Any of the equidistant geometries can be returned, at the same distance
+        np.testing.assert_array_equal(input_positions, np.sort(expected_input))
+        np.testing.assert_array_equal(
+            distances, expected_distances[np.argsort(expected_input, kind="stable")]
+        )
+
+
+def test_nearest_ties_and_max_distance_edge():
+    tree_geometries = shapely.points([[0, 0], [2, 0], [0, 3]])
+    index = PackedHilbertRTree.build(tree_geometries)
+    (input_positions, tree_positions), distances = index.nearest(
+        shapely.points([[1, 0], [0, 6], [10, 10]]),
+        return_all=True,
+        max_distance=3.0,
+        return_distance=True,
+    )
+    # Both equidistant points of the first input, the point exactly max_distance
+    # away from the second, nothing for the third
+    np.testing.assert_array_equal(input_positions, [0, 0, 1])
+    np.testing.assert_array_equal(tree_positions, [0, 1, 2])
+    np.testing.assert_array_equal(distances, [1.0, 1.0, 3.0])
+
+
+def test_nearest_requires_max_distance(tree_geometries):
+    with pytest.raises(ValueError):
+        PackedHilbertRTree.build(tree_geometries).nearest(tree_geometries)
+
+
+def test_load_or_build_reuses_and_invalidates_the_saved_index(
+    tmp_path, points, tree_geometries
+):
+    index_path = str(tmp_path)
+    index = load_or_build("dins", tree_geometries, "EPSG:3857", index_path)
+    (file_name,) = os.listdir(index_path)
+
+    loaded = load_or_build("dins", tree_geometries, "EPSG:3857", index_path)
+    assert os.listdir(index_path) == [file_name]
+    np.testing.assert_array_equal(loaded.order, index.order)
+    assert_same_pairs(
+        loaded.query(points, predicate="intersects"),
+        index.query(points, predicate="intersects"),
+    )
+
+    # Moving a geometry changes the bounds, so the index is built again and the
+    # stale file removed
+    changed = tree_geometries.copy()
+    changed[0] = shapely.Point(5000, 5000)
+    rebuilt = load_or_build("dins", changed, "EPSG:3857", index_path)
+    (changed_file_name,) = os.listdir(index_path)
+    assert changed_file_name != file_name
+    assert_same_pairs(
+        rebuilt.query(points, predicate="dwithin", distance=5.0),
+        sort_pairs(
+            *gpd.GeoSeries(changed).sindex.query(
+                points, predicate="dwithin", distance=5.0
+            )
+        ),
+    )
+
+    # Another CRS is another index
+    load_or_build("dins", changed, "EPSG:4326", index_path)
+    (crs_file_name,) = os.listdir(index_path)
+    assert crs_file_name != changed_file_name
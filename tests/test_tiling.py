@@ -0,0 +1,117 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from disaster_damage_assessment_lookup.matcher.spatial_index import PackedHilbertRTree
+from disaster_damage_assessment_lookup.matcher.tiling import (
+    TilePool,
+    dwithin_tile,
+    nearest_tile,
+    sort_pairs,
+)
+
+
+@pytest.fixture(scope="module")
+def tile_pool():
+    with TilePool(max_workers=2, tile_count=5, min_rows_per_tile=100) as tile_pool:
+        yield tile_pool
+
+
+@pytest.fixture
+def points() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    points = shapely.points(np.round(rng.uniform(0, 2000, (1000, 2))))
+    points[11] = None
+    return points
+
+
+def assert_same_pairs(actual, expected):
+    assert len(actual) == len(expected)
+    for actual_array, expected_array in zip(actual, expected):
+        np.testing.assert_array_equal(actual_array, expected_array)
+
+
+def test_is_sharded():
+    tile_pool = TilePool(max_workers=2, min_rows_per_tile=100)
+    assert not tile_pool.is_sharded(150)
+    assert tile_pool.is_sharded(200)
+    assert not TilePool(max_workers=1, min_rows_per_tile=100).is_sharded(1000)
+
+
+def test_tiles_cover_every_geometry_once(tile_pool, points):
+    tiles = tile_pool.get_tiles(points)
+    assert len(tiles) == 5
+    positions = np.concatenate(tiles)
+    # Missing geometries match nothing and are left out
+    np.testing.assert_array_equal(
+        np.sort(positions), np.delete(np.arange(len(points)), 11)
+    )
+
+
+def test_tiled_nearest_matches_untiled(tile_pool, points):
+    rng = np.random.default_rng(1)
+    tree = gpd.GeoDataFrame(
+        geometry=shapely.points(np.round(rng.uniform(0, 2000, (600, 2)))),
+        crs=3857,
+    )
+    tiled = tile_pool.nearest(points, tree, "points_3857", 40.0)
+    assert_same_pairs(tiled, nearest_tile(points, tree.geometry.to_numpy(), 40.0))
+    (input_positions, tree_positions), distances = tree.sindex.nearest(
+        points, return_all=True, max_distance=40.0, return_distance=True
+    )
+    assert_same_pairs(tiled, sort_pairs(input_positions, tree_positions, distances))
+
+
+def test_tiled_dwithin_matches_untiled(tile_pool, points):
+    rng = np.random.default_rng(2)
+    tree = gpd.GeoDataFrame(
+        geometry=shapely.buffer(shapely.points(rng.uniform(0, 2000, (30, 2))), 150),
+        crs=3857,
+    )
+    tree_positions = np.flatnonzero(rng.random(len(tree)) < 0.6)
+    tiled = tile_pool.dwithin(
+        points, tree, "perimeters_3857", 100.0, tree_positions=tree_positions
+    )
+
+    input_positions, matched_positions = tree.sindex.query(
+        points, predicate="dwithin", distance=100.0
+    )
+    keep = np.isin(matched_positions, tree_positions)
+    input_positions, matched_positions = sort_pairs(
+        input_positions[keep], matched_positions[keep]
+    )
+    geometries = tree.geometry.to_numpy()
+    assert_same_pairs(
+        tiled,
+        (
+            input_positions,
+            matched_positions,
+            shapely.contains(geometries[matched_positions], points[input_positions]),
+            shapely.distance(geometries[matched_positions], points[input_positions]),
+        ),
+    )
+
+
+def test_tiled_join_without_candidates(tile_pool, points):
+    tree = gpd.GeoDataFrame(geometry=shapely.points([[100000, 100000]]), crs=3857)
+    tiled = tile_pool.dwithin(points, tree, "far_3857", 10.0)
+    assert_same_pairs(
+        tiled, dwithin_tile(points[:0], tree.geometry.to_numpy()[:0], 10.0)
+    )
+
+
+def test_sort_pairs():
+    assert_same_pairs(
+        sort_pairs(np.array([1, 0, 1]), np.array([0, 2, 1]), np.array([5, 6, 7])),
+        (np.array([0, 1, 1]), np.array([2, 0, 1]), np.array([6, 5, 7])),
+    )
+
+
+def test_packed_tree_is_used_by_the_tiles(points):
+    tree_geometries = shapely.points(np.random.default_rng(3).uniform(0, 2000, (50, 2)))
+    (input_positions, tree_positions), _ = PackedHilbertRTree.build(
+        tree_geometries
+    ).nearest(points, max_distance=50.0, return_distance=True)
+    tile_input, tile_tree, _ = nearest_tile(points, tree_geometries, 50.0)
+    assert_same_pairs((tile_input, tile_tree), (input_positions, tree_positions))